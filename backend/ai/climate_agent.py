@@ -1,51 +1,611 @@
+import asyncio
 import json
-from typing import List
-from ai.context_manager import ContextManager
-from models.chat import ChatContext, ChatResponse, MapActions, MapState, RAGResponse
-from service.ai_service import AIService, OpenAIService
-from ai.rag_query_system import ClimateRAGSystem
+import os
+import re
+from collections import Counter
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+import numpy as np
+from ai.context_manager import ContextManager, create_context_store, render_history
+from ai.data_catalog import get_data_catalog
+from ai.embedding_cache import normalize_query
+from ai.map_command_interpreter import MapCommandInterpreter
+from ai.prompts import MAP_ACTIONS_SYSTEM_PROMPT
+from ai.rag_query_system import AsyncClimateRAGSystem, RetrievedChunk
+from ai.response_cache import CorpusVersionTracker, SemanticResponseCache
+from ai.single_flight import SingleFlight
+from models.chat import (
+    ChatContext,
+    ChatResponse,
+    ChatStreamEvent,
+    MapActions,
+    MapState,
+    RAGResponse,
+)
+from service.ai_service import AsyncAIService, AsyncOpenAIService
+
+# sequential: map actions are generated from the finished answer
+# concurrent: map actions are generated from the retrieval results while the answer
+# is written
+MAP_ACTIONS_MODES = ("sequential", "concurrent")
+
+# Words that tie a query to earlier turns, making a cached answer from another
+# session wrong
+REFERENTIAL_WORDS = {
+    "it",
+    "its",
+    "that",
+    "this",
+    "those",
+    "these",
+    "they",
+    "them",
+    "more",
+    "again",
+    "previous",
+    "above",
+    "earlier",
+    "else",
+}
 
 
 class ClimateAgent:
     """Single Climate Agent Handling Climate Queries"""
 
-    def __init__(self, ai_service: AIService | None = None):
+    def __init__(
+        self,
+        ai_service: AsyncAIService | None = None,
+        rag_system: AsyncClimateRAGSystem | None = None,
+        context_manager: ContextManager | None = None,
+        map_actions_mode: str | None = None,
+        reconcile_map_actions: bool | None = None,
+        command_interpreter: MapCommandInterpreter | None = None,
+        response_cache: SemanticResponseCache | None = None,
+    ):
         # TODO: Allow other AI services to be used
-        self.ai_service = ai_service or OpenAIService()
-        self.context_manager = ContextManager()
-        self.rag_system = ClimateRAGSystem()
+        self.ai_service = ai_service or AsyncOpenAIService()
+        self.rag_system = rag_system or AsyncClimateRAGSystem()
+        # Sessions live in process or in the database (CONTEXT_STORE), sharing the
+        # RAG engine
+        self.context_manager = context_manager or ContextManager(
+            store=create_context_store(self.rag_system.engine)
+        )
+
+        self.map_actions_mode = map_actions_mode or os.getenv(
+            "MAP_ACTIONS_MODE", "concurrent"
+        )
+        if self.map_actions_mode not in MAP_ACTIONS_MODES:
+            raise ValueError(
+                f"Unknown map actions mode '{self.map_actions_mode}', "
+                f"expected one of {MAP_ACTIONS_MODES}"
+            )
+        if reconcile_map_actions is None:
+            reconcile_map_actions = os.getenv(
+                "RECONCILE_MAP_ACTIONS", "true"
+            ).lower() in ("1", "true", "yes")
+        self.reconcile_map_actions = reconcile_map_actions
+
+        # Pure map commands are answered without retrieval or LLM calls
+        self.command_interpreter = command_interpreter
+        if self.command_interpreter is None and os.getenv(
+            "FAST_PATH_ENABLED", "true"
+        ).lower() in ("1", "true", "yes"):
+            self.command_interpreter = MapCommandInterpreter()
+
+        # Answers to paraphrased questions are reused until document_chunks changes
+        self.corpus_version = CorpusVersionTracker(self.rag_system.engine)
+        self.response_cache = response_cache
+        if self.response_cache is None and os.getenv(
+            "RESPONSE_CACHE_ENABLED", "true"
+        ).lower() in ("1", "true", "yes"):
+            ttl = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+            self.response_cache = SemanticResponseCache(
+                threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+                max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+                ttl_seconds=ttl or None,
+                version_source=self.corpus_version.current,
+            )
+
+        # Identical questions arriving together share one retrieval and one answer;
+        # map actions depend on each caller's map state and are planned per request
+        self.pipeline_flights: SingleFlight[Any] = SingleFlight()
+
+    async def warm_up(self) -> None:
+        """Open database and API connections before the first query arrives"""
+        await self.rag_system.warm_up()
+        try:
+            await self.context_manager.warm_up()
+        except Exception as e:
+            print(f"⚠️ Could not set up the context store: {e}")
+        if self.response_cache is not None:
+            try:
+                tracking = await self.corpus_version.is_tracking()
+            except Exception as e:
+                print(f"⚠️ Could not check corpus version tracking: {e}")
+                tracking = False
+            if not tracking:
+                # Without the trigger, cached answers would outlive corpus updates
+                print(
+                    "⚠️ corpus_version trigger missing, response cache disabled "
+                    "(run python -m ai.vector_index ensure)"
+                )
+                self.response_cache = None
+
+    async def close(self) -> None:
+        """Release resources held by the agent"""
+        await self.context_manager.close()
+        await self.rag_system.close()
+
+    def get_stats(self) -> dict[str, Any]:
+        """Runtime counters for the optimizations in front of the LLM pipeline"""
+        stats: dict[str, Any] = {**self.rag_system.get_stats()}
+        if self.command_interpreter is not None:
+            stats["fast_path"] = self.command_interpreter.stats()
+        if self.response_cache is not None:
+            stats["response_cache"] = self.response_cache.stats()
+        stats.setdefault("single_flight", {})["pipeline"] = (
+            self.pipeline_flights.stats()
+        )
+        stats["memory"] = self.context_manager.stats()
+        return stats
+
+    def _is_context_independent(self, query: str, context: ChatContext) -> bool:
+        """Whether the answer depends only on the query, not on earlier turns"""
+        return not (
+            (context.messages or context.summary)
+            and set(re.findall(r"[a-z]+", query.lower())) & REFERENTIAL_WORDS
+        )
+
+    def _answer_scope(self, query: str, map_state: MapState) -> str:
+        """
+        Key of the retrieval filters and map-state fields the answer text depends on.
+
+        Map actions also depend on the available layers and map position, so they
+        are never shared; each request plans its own from the shared answer.
+        """
+        return json.dumps(
+            {
+                "layers": sorted(self.rag_system.detect_layers_from_query(query)),
+                "foot_increment": map_state.foot_increment,
+                "active_layers": sorted(map_state.active_layers or []),
+                "basemap": map_state.basemap_name,
+            }
+        )
+
+    async def _response_cache_key(
+        self, query: str, context: ChatContext, map_state: MapState
+    ) -> tuple[np.ndarray, str, int] | None:
+        """
+        Embedding, scope and cache generation under which the answer to this query
+        is cached.
+
+        The generation is taken before the lookup, so an answer whose pipeline
+        outlived a corpus change is not stored afterwards. Returns None when
+        caching doesn't apply, i.e. for follow-up questions that depend on the
+        conversation so far.
+        """
+        if self.response_cache is None:
+            return None
+        if not self._is_context_independent(query, context):
+            return None
+
+        await self.response_cache.ensure_fresh()
+        generation = self.response_cache.generation
+        embedding = await self.rag_system.generate_embedding(query)
+        return embedding, self._answer_scope(query, map_state), generation
+
+    async def _cached_answer(
+        self, cache_key: tuple[np.ndarray, str, int] | None, query: str, session_id: str
+    ) -> RAGResponse | None:
+        """Return a cached answer for the query and record it in the conversation"""
+        if cache_key is None or self.response_cache is None:
+            return None
+        embedding, scope, _ = cache_key
+        cached_answer = self.response_cache.lookup(embedding, scope)
+        if cached_answer is not None:
+            print("♻️ Answered from the semantic response cache")
+            await self.context_manager.update_context(
+                session_id, query, cached_answer.response
+            )
+        return cached_answer
+
+    def _complete_response_events(
+        self, response: ChatResponse, rag_response: RAGResponse | None = None
+    ) -> list[ChatStreamEvent]:
+        """Stream events for an answer that is already complete"""
+        sources = (
+            [source.model_dump() for source in rag_response.sources]
+            if rag_response is not None
+            else []
+        )
+        return [
+            ChatStreamEvent(
+                event="map_actions",
+                data={"map_actions": response.map_actions or [], "reconciled": False},
+            ),
+            ChatStreamEvent(event="token", data={"content": response.response}),
+            ChatStreamEvent(
+                event="done", data={"response": response.response, "sources": sources}
+            ),
+        ]
+
+    def _store_answer(
+        self, cache_key: tuple[np.ndarray, str, int] | None, rag_response: RAGResponse
+    ) -> None:
+        """Cache an answer unless it came back without sources"""
+        if (
+            self.response_cache is not None
+            and cache_key is not None
+            and rag_response.sources
+        ):
+            embedding, scope, generation = cache_key
+            self.response_cache.put(embedding, scope, rag_response, generation)
+
+    async def _respond_from_cache(
+        self,
+        query: str,
+        context: ChatContext,
+        map_state: MapState,
+        cached_answer: RAGResponse,
+    ) -> ChatResponse:
+        """Pair a cached answer with map actions planned for this request's map state"""
+        map_actions = await self._generate_map_actions(
+            query,
+            context,
+            map_state,
+            cached_answer.metadata.auto_detected_layers,
+            cached_answer,
+        )
+        return ChatResponse(
+            response=cached_answer.response,
+            map_actions=[action.model_dump() for action in map_actions],
+        )
 
+    def _flight_key(
+        self, query: str, context: ChatContext, map_state: MapState
+    ) -> tuple[str, str, str] | None:
+        """
+        Key under which concurrent identical questions share retrieval and answer.
+
+        The answer is written from the conversation of the caller that starts the
+        flight, so only callers with the same history (usually none) share it.
+        """
+        if not self._is_context_independent(query, context):
+            return None
+        return (
+            normalize_query(query),
+            self._answer_scope(query, map_state),
+            render_history(context),
+        )
 
-    async def process_query(self, query: str, map_state: MapState, session_id: str) -> ChatResponse:
+    async def _shared(
+        self,
+        flight_key: tuple[str, ...] | None,
+        stage: str,
+        fn: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Run fn once per flight key and stage, or directly when it can't be shared"""
+        if flight_key is None:
+            return await fn()
+        return await self.pipeline_flights.do((stage, *flight_key), fn)
+
+    async def _try_fast_path(
+        self, query: str, map_state: MapState, session_id: str
+    ) -> ChatResponse | None:
+        """Answer pure map commands deterministically, skipping the LLM entirely"""
+        if self.command_interpreter is None:
+            return None
+        response = self.command_interpreter.interpret(query, map_state)
+        if response is not None:
+            print("⚡ Answered map command without the LLM")
+            await self.context_manager.update_context(
+                session_id, query, response.response
+            )
+        return response
+
+    async def process_query(
+        self, query: str, map_state: MapState, session_id: str
+    ) -> ChatResponse:
         """Main Entry Point - Handle all queries"""
+        fast_response = await self._try_fast_path(query, map_state, session_id)
+        if fast_response is not None:
+            return fast_response
+
+        context = await self.context_manager.get_context(session_id)
+
+        cache_key = await self._response_cache_key(query, context, map_state)
+        cached_answer = await self._cached_answer(cache_key, query, session_id)
+        if cached_answer is not None:
+            return await self._respond_from_cache(
+                query, context, map_state, cached_answer
+            )
+
+        rag_response, map_actions = await self._run_pipeline(query, context, map_state)
+
+        await self.context_manager.update_context(
+            session_id, query, rag_response.response
+        )
+        self._store_answer(cache_key, rag_response)
+        return ChatResponse(
+            response=rag_response.response,
+            map_actions=[action.model_dump() for action in map_actions],
+        )
+
+    async def _run_pipeline(
+        self, query: str, context: ChatContext, map_state: MapState
+    ) -> tuple[RAGResponse, list[MapActions]]:
+        """
+        Retrieve, answer and plan map actions for a query.
+
+        Retrieval and answer are shared by concurrent duplicates.
+        """
+        flight_key = self._flight_key(query, context, map_state)
+        if self.map_actions_mode == "sequential":
+            rag_response = await self._shared(
+                flight_key,
+                "answer",
+                lambda: self.rag_system.generate_response(
+                    query=query, context=context, map_state=map_state
+                ),
+            )
+            detected_layers = rag_response.metadata.auto_detected_layers
+            map_actions = await self._generate_map_actions(
+                query, context, map_state, detected_layers, rag_response
+            )
+            return rag_response, map_actions
+
+        retrieval = await self._shared(
+            flight_key, "retrieval", lambda: self.rag_system.retrieve_for_query(query)
+        )
+        rag_response, map_actions = await asyncio.gather(
+            self._shared(
+                flight_key,
+                "answer",
+                lambda: self.rag_system.generate_answer(
+                    query, retrieval, context, map_state
+                ),
+            ),
+            self._generate_map_actions(
+                query,
+                context,
+                map_state,
+                retrieval.detected_layers,
+                chunks=retrieval.chunks,
+            ),
+        )
+        if self.reconcile_map_actions and self._contradicts(
+            rag_response, map_actions, map_state
+        ):
+            print("🔁 Answer contradicts map actions, regenerating from the answer")
+            map_actions = await self._generate_map_actions(
+                query, context, map_state, retrieval.detected_layers, rag_response
+            )
+        return rag_response, map_actions
+
+    async def stream_query(
+        self, query: str, map_state: MapState, session_id: str
+    ) -> AsyncIterator[ChatStreamEvent]:
+        """
+        Streaming entry point - yields answer tokens and map actions as each becomes
+        ready, then a done event.
+        """
+        fast_response = await self._try_fast_path(query, map_state, session_id)
+        if fast_response is not None:
+            for event in self._complete_response_events(fast_response):
+                yield event
+            return
+
         context = await self.context_manager.get_context(session_id)
-        rag_response = self.rag_system.generate_response(query=query, context=context, map_state=map_state)
-        detected_layers = rag_response.metadata.auto_detected_layers
-        map_actions = self._generate_map_actions(query, context, map_state, detected_layers, rag_response)
-        await self.context_manager.update_context(session_id, query, rag_response.response)
-        return ChatResponse(response=rag_response.response, map_actions=[action.model_dump() for action in map_actions])
-
-    def _generate_map_actions(self, query: str, context: ChatContext, map_state: MapState, detected_layers: list[str] | None, rag_response: RAGResponse) -> List[MapActions]:
-        """Generate map actions based on RAG response"""
-        prompt = self._build_map_actions_prompt(query, context, map_state, detected_layers, rag_response)
-        map_action_response = self.ai_service.get_response(prompt=prompt)
+
+        cache_key = await self._response_cache_key(query, context, map_state)
+        cached_answer = await self._cached_answer(cache_key, query, session_id)
+        if cached_answer is not None:
+            response = await self._respond_from_cache(
+                query, context, map_state, cached_answer
+            )
+            for event in self._complete_response_events(response, cached_answer):
+                yield event
+            return
+
+        retrieval = await self.rag_system.retrieve_for_query(query)
+        concurrent = self.map_actions_mode == "concurrent"
+
+        actions_task: asyncio.Task[list[MapActions]] | None = None
+        if concurrent:
+            actions_task = asyncio.create_task(
+                self._generate_map_actions(
+                    query,
+                    context,
+                    map_state,
+                    retrieval.detected_layers,
+                    chunks=retrieval.chunks,
+                )
+            )
+
+        rag_response: RAGResponse | None = None
+        map_actions: list[MapActions] | None = None
+        try:
+            async for item in self.rag_system.stream_answer(
+                query, retrieval, context, map_state
+            ):
+                if isinstance(item, RAGResponse):
+                    rag_response = item
+                    continue
+                yield ChatStreamEvent(event="token", data={"content": item})
+                if (
+                    actions_task is not None
+                    and map_actions is None
+                    and actions_task.done()
+                ):
+                    map_actions = actions_task.result()
+                    yield self._map_actions_event(map_actions)
+
+            if actions_task is not None and map_actions is None:
+                map_actions = await actions_task
+                yield self._map_actions_event(map_actions)
+        finally:
+            if actions_task is not None and not actions_task.done():
+                actions_task.cancel()
+
+        if rag_response is None:
+            return
+
+        if not concurrent:
+            map_actions = await self._generate_map_actions(
+                query, context, map_state, retrieval.detected_layers, rag_response
+            )
+            yield self._map_actions_event(map_actions)
+        elif self.reconcile_map_actions and self._contradicts(
+            rag_response, map_actions or [], map_state
+        ):
+            print("🔁 Answer contradicts map actions, regenerating from the answer")
+            map_actions = await self._generate_map_actions(
+                query, context, map_state, retrieval.detected_layers, rag_response
+            )
+            yield self._map_actions_event(map_actions, reconciled=True)
+
+        await self.context_manager.update_context(
+            session_id, query, rag_response.response
+        )
+        self._store_answer(cache_key, rag_response)
+        yield ChatStreamEvent(
+            event="done",
+            data={
+                "response": rag_response.response,
+                "sources": [source.model_dump() for source in rag_response.sources],
+            },
+        )
+
+    def _map_actions_event(
+        self, map_actions: list[MapActions], reconciled: bool = False
+    ) -> ChatStreamEvent:
+        return ChatStreamEvent(
+            event="map_actions",
+            data={
+                "map_actions": [action.model_dump() for action in map_actions],
+                "reconciled": reconciled,
+            },
+        )
+
+    def _contradicts(
+        self,
+        rag_response: RAGResponse,
+        map_actions: list[MapActions],
+        map_state: MapState,
+    ) -> bool:
+        """
+        Cheap check whether concurrently generated actions disagree with the answer.
+
+        The answer contradicts the actions when the actions add a layer the answer
+        never talks about, or when the answer talks about layers that are neither
+        added nor already displayed.
+        """
+        catalog = get_data_catalog()
+        mentioned = set(self.rag_system.detect_layers_from_query(rag_response.response))
+        added = {
+            catalog.layer_key_for(action.parameters.get("layer_name", ""))
+            for action in map_actions
+            if action.type == "add_layer"
+        } - {None}
+        if added - mentioned:
+            return True
+
+        active = {
+            catalog.layer_key_for(layer) for layer in map_state.active_layers or []
+        }
+        return bool(mentioned) and not added and not (mentioned & active)
+
+    async def _generate_map_actions(
+        self,
+        query: str,
+        context: ChatContext,
+        map_state: MapState,
+        detected_layers: list[str] | None,
+        rag_response: RAGResponse | None = None,
+        chunks: list[RetrievedChunk] | None = None,
+    ) -> list[MapActions]:
+        """
+        Generate map actions from the RAG response, or from the retrieved chunks
+        when no answer exists yet.
+        """
+        prompt = self._build_map_actions_prompt(
+            query, context, map_state, detected_layers, rag_response, chunks
+        )
+        map_action_response = await self.ai_service.get_response(
+            prompt=prompt, system_prompt=MAP_ACTIONS_SYSTEM_PROMPT
+        )
+        self.rag_system.prompt_cache.record(
+            "map_actions", getattr(map_action_response, "usage", None)
+        )
         if map_action_response:
-          try:
-            content = map_action_response.choices[0].message.content or "{}"
-            parsed_response = json.loads(content)
-            map_actions = parsed_response.get("map_actions", [])
-            return [MapActions(**action) for action in map_actions]
-          except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            return []
+            try:
+                content = map_action_response.choices[0].message.content or "{}"
+                parsed_response = json.loads(content)
+                map_actions = parsed_response.get("map_actions", [])
+                return [MapActions(**action) for action in map_actions]
+            except json.JSONDecodeError as e:
+                print(f"JSON decode error: {e}")
+                return []
         return []
 
+    def _summarize_chunks(self, chunks: list[RetrievedChunk]) -> str:
+        """Summarize the layers and locations covered by the retrieved chunks"""
+        if not chunks:
+            return "No relevant literature was retrieved."
+
+        layer_counts = Counter(
+            layer for chunk in chunks for layer in chunk.relevant_layers
+        )
+        location_counts = Counter(
+            location for chunk in chunks for location in chunk.locations
+        )
+        layers = (
+            ", ".join(
+                f"{layer} ({count})" for layer, count in layer_counts.most_common()
+            )
+            or "none"
+        )
+        locations = (
+            ", ".join(
+                f"{location} ({count})"
+                for location, count in location_counts.most_common(10)
+            )
+            or "none"
+        )
+        return (
+            f"Sources retrieved: {len(chunks)}\n"
+            f"Layers discussed (source count): {layers}\n"
+            f"Locations mentioned (source count): {locations}"
+        )
 
     def _build_map_actions_prompt(
-        self, query: str, context: ChatContext, map_state: MapState, detected_layers: list[str] | None, rag_response: RAGResponse
+        self,
+        query: str,
+        context: ChatContext,
+        map_state: MapState,
+        detected_layers: list[str] | None,
+        rag_response: RAGResponse | None,
+        chunks: list[RetrievedChunk] | None = None,
     ) -> str:
-        """Build the map actions prompt"""
-        response_info = f"Response: {rag_response.response}"
+        """
+        Build the per-request part of the map actions prompt.
+
+        The instructions are MAP_ACTIONS_SYSTEM_PROMPT.
+        """
+        if rag_response is not None:
+            response_intro = (
+                "The text response has already been generated (see RAG RESPONSE below)."
+            )
+            response_info = f"RAG RESPONSE:\nResponse: {rag_response.response}"
+        else:
+            response_intro = (
+                "The text response is being written at the same time from the "
+                "retrieved literature summarized below."
+            )
+            response_info = (
+                f"RETRIEVED LITERATURE:\n{self._summarize_chunks(chunks or [])}"
+            )
 
         sw = map_state.map_position.southwest
         ne = map_state.map_position.northeast
@@ -60,7 +620,7 @@ class ClimateAgent:
 
         center_info = f"Map Center: lat: {center_lat:.4f}, long: {center_long:.4f}"
 
-        chat_history = f"Chat History: {context.messages}"
+        chat_history = render_history(context)
 
         basemap_info = (
             f"Current Basemap: {map_state.basemap_name}"
@@ -76,23 +636,25 @@ class ClimateAgent:
             layer_info = "No data layers currently displayed."
 
         if map_state.available_layers and map_state.available_layers.increment:
-          increment_layers_info = "AVAILABLE INCREMENTAL FLOODING LAYERS (use specific foot levels):\n"
-          for layer in map_state.available_layers.increment:
-            increment_layers_info += f"- {layer}\n"
+            increment_layers_info = (
+                "AVAILABLE INCREMENTAL FLOODING LAYERS (use specific foot levels):\n"
+            )
+            for layer in map_state.available_layers.increment:
+                increment_layers_info += f"- {layer}\n"
         else:
-          increment_layers_info = "NO AVAILABLE INCREMENTAL FLOODING LAYERS."
+            increment_layers_info = "NO AVAILABLE INCREMENTAL FLOODING LAYERS."
 
         if map_state.available_layers and map_state.available_layers.normal:
-          available_normal_layers_info = "AVAILABLE NORMAL LAYERS (do not use foot levels):\n"
-          for layer in map_state.available_layers.normal:
-            available_normal_layers_info += f"- {layer}\n"
+            available_normal_layers_info = (
+                "AVAILABLE NORMAL LAYERS (do not use foot levels):\n"
+            )
+            for layer in map_state.available_layers.normal:
+                available_normal_layers_info += f"- {layer}\n"
         else:
-          available_normal_layers_info = "NO AVAILABLE NORMAL LAYERS."
+            available_normal_layers_info = "NO AVAILABLE NORMAL LAYERS."
 
-        return f"""
-You are the map action engine for the CRC Climate Viewer. The text response has already been generated (see RAG RESPONSE below) and assumes the map is acting in response to the user. Your job is to produce the map actions that fulfill that assumption—adding layers, navigating to locations, setting zoom levels, etc.—so that the map matches what the response text implies is happening.
+        return f"""{response_intro}
 
-RAG RESPONSE:
 {response_info}
 
 CURRENT MAP STATE:
@@ -102,141 +664,15 @@ CURRENT MAP STATE:
 {basemap_info}
 Current foot increment: {map_state.foot_increment} ft above MHHW (2000 baseline)
 
-SEA LEVEL RISE SCENARIO — FOOT INCREMENT TO YEAR MAPPING:
-Use this table when the user mentions a year or time horizon to pick the right SET_FOOT_INCREMENT value.
-Note: Year projections are based on local projections for Moku O Loʻe Island (Coconut Island) per the 2022 Hawaiʻi Sea Level Rise Technical Report. Timing varies slightly by location.
-
-Intermediate scenario:
-  0 ft = Baseline (2000)
-  1 ft = ~2050
-  2 ft = ~2075
-  3 ft = ~2100
-  4 ft = ~2100
-  5 ft = ~2125
-  6 ft = ~2125
-  7 ft = ~2150
-  8 ft = ~2150
-  9 ft = beyond 2150
-  10 ft = beyond 2150
-
-Intermediate-High scenario (more aggressive — dates arrive sooner):
-  0 ft = Baseline (2000)
-  1 ft = ~2040
-  2 ft = ~2060
-  3 ft = between 2060 and 2080
-  4 ft = ~2080
-  5 ft = between 2080 and 2100
-  6 ft = ~2100
-  7 ft = between 2100 and 2150
-  8 ft = between 2100 and 2150
-  9 ft = between 2100 and 2150
-  10 ft = ~2150
-
-If the user asks about a year (e.g. "by 2100"), set the foot increment to the value that corresponds to that year under the Intermediate scenario (default), unless the user specifies Intermediate-High.
-
 CONVERSATION CONTEXT:
 {chat_history}
 
 DETECTED LAYERS:
 {detected_layers}
 
-USER QUERY: "{query}"
-
-RESPONSE FORMAT:
-You MUST respond with valid JSON in this exact structure:
-
-{{
-  "map_actions": [
-    {{
-      "type": "action_type",
-      "parameters": {{}}
-    }}
-  ]
-}}
-
-AVAILABLE ACTIONS:
-
-1. ADD_LAYER - Add climate data layer
-{{
-  "type": "add_layer",
-  "parameters": {{
-    "layer_name": "layer_name",
-    "reason": "Why this layer helps answer the query"
-  }}
-}}
-
-2. REMOVE_LAYER - Remove specific layer
-{{
-  "type": "remove_layer",
-  "parameters": {{
-    "layer_name": "layer_to_remove",
-    "reason": "Why removing this layer"
-  }}
-}}
-
-3. SET_BOUNDS - Focus map on geographic area
-{{
-  "type": "set_bounds",
-  "parameters": {{
-    "bounds": {{
-      "southwest": [22.0, -157.0],
-      "northeast": [21.0, -158.0]
-    }},
-    "reason": "Why focusing on this area"
-  }}
-}}
-
-4. CLEAR_LAYERS - Remove all current layers
-{{
-  "type": "clear_layers",
-  "parameters": {{
-    "reason": "Why clearing all layers"
-  }}
-}}
-
-5. SET_ZOOM_LEVEL - Set zoom level
-{{
-  "type": "set_zoom_level",
-  "parameters": {{
-    "zoom_level": 10,
-    "reason": "Why setting this zoom level"
-  }}
-}}
-
-6. CHANGE_BASEMAP - Change basemap
-{{
-  "type": "change_basemap",
-  "parameters": {{
-    "basemap_id": "basemap_id",
-    "reason": "Why changing the basemap"
-  }}
-}}
-
-7. SET_FOOT_INCREMENT - Set foot increment
-{{
-  "type": "set_foot_increment",
-  "parameters": {{
-    "foot_increment": 4,
-    "reason": "Why changing the foot increment"
-  }}
-}}
-
 {increment_layers_info}
 
 {available_normal_layers_info}
 
-SPECIFIC LOCATIONS:
-- Koolaupoko: {{"southwest": [21.25, -157.9], "northeast": [21.35, -157.7]}}
-- Waikiki: {{"southwest": [21.26, -157.83], "northeast": [21.28, -157.81]}}
-
-COORDINATE VALIDATION:
-- Hawaii bounds: Southwest: [22.5, -154.0], Northeast: [18.5, -161.0]
-- Ensure all coordinates fall within these bounds
-
-CRITICAL RULES:
-1. Return ONLY valid JSON - no markdown formatting, no code blocks, no extra text
-2. Include 1-4 actions maximum per response
-3. Only return map_actions, no response text needed
-4. Use exact layer names from the available list
-5. Validate coordinates are within Hawaii bounds
-6. Provide clear reasons for each action"""
+USER QUERY: "{query}"
+"""
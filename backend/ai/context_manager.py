@@ -1,10 +1,23 @@
+import asyncio
 import datetime
+import os
+import time
+import uuid
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 
+from ai.prompts import SUMMARY_SYSTEM_PROMPT
 from models.chat import (
     ChatContext,
     Message,
 )
+from models.chat_session import ChatBase, ChatMessageRecord, ChatSession
+from openai import AsyncOpenAI
+from service.ai_service import chat_messages, get_async_openai_client
+from service.database import create_async_db_engine
+from sqlalchemy import delete, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
 
 class ContextStore(ABC):
@@ -22,28 +35,537 @@ class ContextStore(ABC):
     async def add_message(self, session_id: str, message: Message) -> None:
         pass
 
+    async def compact(
+        self, session_id: str, removed_ids: set[str], summary: str | None = None
+    ) -> None:
+        """
+        Remove messages from a session, optionally replacing its summary.
+
+        Args:
+            session_id: Session to compact
+            removed_ids: Ids of the messages to remove
+            summary: New summary, None keeps the current one
+        """
+        context = await self.get_context(session_id)
+        if context is None:
+            return
+        await self.save_context(
+            session_id,
+            ChatContext(
+                session_id=session_id,
+                messages=[
+                    message
+                    for message in context.messages
+                    if message.id not in removed_ids
+                ],
+                summary=context.summary if summary is None else summary,
+            ),
+        )
+
+    async def prepare(self) -> bool:
+        """Get ready for the first request; False when the store's schema is missing"""
+        return True
+
+    async def close(self) -> None:  # noqa: B027 - optional hook, most stores hold nothing
+        """Release resources held by the store"""
+
+    def stats(self) -> dict[str, int]:
+        return {}
+
 
 class InMemoryContextStore(ContextStore):
-    """Dictionary Based storage for prototyping"""
+    """
+    Dictionary based storage for a single process, with idle-session TTL and an
+    LRU size bound
+    """
+
+    def __init__(
+        self, max_sessions: int | None = None, ttl_seconds: float | None = None
+    ):
+        """
+        Args:
+            max_sessions: Sessions kept before the least recently used is evicted
+                (CONTEXT_MAX_SESSIONS)
+            ttl_seconds: Idle time after which a session expires, 0 for never
+                (CONTEXT_TTL)
+        """
+        self.max_sessions = max_sessions or int(
+            os.getenv("CONTEXT_MAX_SESSIONS", "10000")
+        )
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.getenv("CONTEXT_TTL", "86400"))
+        )
+        self.contexts: OrderedDict[str, ChatContext] = OrderedDict()
+        self._last_active: dict[str, float] = {}
+        self.evicted_sessions = 0
+
+    def _expired(self, session_id: str) -> bool:
+        return (
+            bool(self.ttl_seconds)
+            and time.monotonic() - self._last_active[session_id] > self.ttl_seconds
+        )
 
-    def __init__(self):
-        self.contexts: dict[str, ChatContext] = {}
+    def _evict(self, session_id: str) -> None:
+        del self.contexts[session_id]
+        del self._last_active[session_id]
+        self.evicted_sessions += 1
+
+    def _touch(self, session_id: str) -> None:
+        self.contexts.move_to_end(session_id)
+        self._last_active[session_id] = time.monotonic()
+        while len(self.contexts) > self.max_sessions:
+            self._evict(next(iter(self.contexts)))
 
     async def get_context(self, session_id: str) -> ChatContext | None:
-        return self.contexts.get(session_id)
+        if session_id not in self.contexts:
+            return None
+        if self._expired(session_id):
+            self._evict(session_id)
+            return None
+        self.contexts.move_to_end(session_id)
+        return self.contexts[session_id]
 
     async def save_context(self, session_id: str, context: ChatContext) -> None:
         self.contexts[session_id] = context
+        self._touch(session_id)
 
     async def add_message(self, session_id: str, message: Message) -> None:
         if session_id not in self.contexts:
             self.contexts[session_id] = ChatContext(session_id=session_id, messages=[])
-            self.contexts[session_id].messages.append(message)
+        self.contexts[session_id].messages.append(message)
+        self._touch(session_id)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "sessions": len(self.contexts),
+            "evicted_sessions": self.evicted_sessions,
+        }
+
+
+class SQLContextStore(ContextStore):
+    """
+    Sessions in the chat_sessions / chat_messages tables, shared by all workers.
+
+    A turn is appended as one message insert plus a bump of the session row's
+    version; stored history is never rewritten except to remove folded or
+    expired messages.
+    Contexts are cached in process and revalidated against that version with a
+    primary key lookup, so a turn handled by another worker is never missed and
+    the message rows are only read when the session changed. Sessions idle for
+    longer than the TTL are deleted in the background.
+
+    Works with PostgreSQL (asyncpg) and SQLite (aiosqlite, dev group) for local runs.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        ttl_seconds: float | None = None,
+        cache_size: int | None = None,
+        eviction_interval: float | None = None,
+        create_tables: bool = False,
+    ):
+        """
+        Args:
+            engine: Async engine of the database holding the chat tables
+            ttl_seconds: Idle time after which a session is deleted, 0 for never
+                (CONTEXT_TTL)
+            cache_size: Contexts kept in the in-process cache (CONTEXT_CACHE_SIZE)
+            eviction_interval: Minimum seconds between TTL eviction runs
+                (CONTEXT_EVICTION_INTERVAL)
+            create_tables: Create the chat tables on prepare; otherwise they come from
+                init.sql or python -m ai.vector_index ensure (ai.schema) and are only
+                checked
+        """
+        self.engine = engine
+        self.create_tables = create_tables
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.getenv("CONTEXT_TTL", "86400"))
+        )
+        self.cache_size = cache_size or int(os.getenv("CONTEXT_CACHE_SIZE", "1000"))
+        self.eviction_interval = eviction_interval or float(
+            os.getenv("CONTEXT_EVICTION_INTERVAL", "300")
+        )
+        self.dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+
+        # session_id -> (version, context)
+        self._cache: OrderedDict[str, tuple[int, ChatContext]] = OrderedDict()
+        self._last_eviction = time.monotonic()
+        self._eviction_task: asyncio.Task | None = None
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.evicted_sessions = 0
+
+    async def prepare(self) -> bool:
+        async with self.engine.begin() as conn:
+            if self.create_tables:
+                await conn.run_sync(ChatBase.metadata.create_all)
+                return True
+            return await conn.run_sync(
+                lambda sync_conn: all(
+                    inspect(sync_conn).has_table(name)
+                    for name in ChatBase.metadata.tables
+                )
+            )
+
+    def _remember(self, session_id: str, version: int, context: ChatContext) -> None:
+        self._cache[session_id] = (version, context)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _copy(self, context: ChatContext) -> ChatContext:
+        return context.model_copy(update={"messages": list(context.messages)})
+
+    async def _touch(
+        self,
+        conn,
+        session_id: str,
+        summary: str | None = None,
+        set_summary: bool = False,
+    ) -> int:
+        """Create or bump the session row, returning its new version"""
+        now = datetime.datetime.now(datetime.UTC)
+        values = {"session_id": session_id, "version": 1, "last_active": now}
+        update = {"version": ChatSession.version + 1, "last_active": now}
+        if set_summary:
+            values["summary"] = summary
+            update["summary"] = summary
+        statement = (
+            self.dialect.insert(ChatSession)
+            .values(**values)
+            .on_conflict_do_update(index_elements=[ChatSession.session_id], set_=update)
+            .returning(ChatSession.version)
+        )
+        return (await conn.execute(statement)).scalar_one()
+
+    async def get_context(self, session_id: str) -> ChatContext | None:
+        async with self.engine.connect() as conn:
+            row = (
+                await conn.execute(
+                    select(ChatSession.version, ChatSession.summary).where(
+                        ChatSession.session_id == session_id
+                    )
+                )
+            ).first()
+            if row is None:
+                self._cache.pop(session_id, None)
+                return None
+
+            cached = self._cache.get(session_id)
+            if cached is not None and cached[0] == row.version:
+                self._cache.move_to_end(session_id)
+                self.cache_hits += 1
+                return self._copy(cached[1])
+
+            records = (
+                await conn.execute(
+                    select(
+                        ChatMessageRecord.message_id,
+                        ChatMessageRecord.role,
+                        ChatMessageRecord.content,
+                        ChatMessageRecord.timestamp,
+                    )
+                    .where(ChatMessageRecord.session_id == session_id)
+                    .order_by(ChatMessageRecord.id)
+                )
+            ).all()
+
+        self.cache_misses += 1
+        context = ChatContext(
+            session_id=session_id,
+            messages=[
+                Message(
+                    id=record.message_id,
+                    role=record.role,
+                    content=record.content,
+                    timestamp=record.timestamp,
+                )
+                for record in records
+            ],
+            summary=row.summary,
+        )
+        self._remember(session_id, row.version, context)
+        return self._copy(context)
+
+    async def save_context(self, session_id: str, context: ChatContext) -> None:
+        """
+        Make the stored session match context: set the summary, delete and insert
+        messages as needed
+        """
+        message_ids = [message.id for message in context.messages]
+        async with self.engine.begin() as conn:
+            version = await self._touch(
+                conn, session_id, context.summary, set_summary=True
+            )
+            await conn.execute(
+                delete(ChatMessageRecord).where(
+                    ChatMessageRecord.session_id == session_id,
+                    ChatMessageRecord.message_id.not_in(message_ids),
+                )
+            )
+            if context.messages:
+                await conn.execute(
+                    self.dialect.insert(ChatMessageRecord)
+                    .values(
+                        [
+                            self._record(session_id, message)
+                            for message in context.messages
+                        ]
+                    )
+                    .on_conflict_do_nothing(
+                        index_elements=[
+                            ChatMessageRecord.session_id,
+                            ChatMessageRecord.message_id,
+                        ]
+                    )
+                )
+        self._remember(session_id, version, self._copy(context))
+
+    async def add_message(self, session_id: str, message: Message) -> None:
+        async with self.engine.begin() as conn:
+            version = await self._touch(conn, session_id)
+            await conn.execute(
+                self.dialect.insert(ChatMessageRecord).values(
+                    **self._record(session_id, message)
+                )
+            )
+
+        # Keep the cached context current when this was the only write since it was
+        # cached
+        cached = self._cache.get(session_id)
+        if cached is not None and cached[0] == version - 1:
+            cached[1].messages.append(message)
+            self._remember(session_id, version, cached[1])
+        else:
+            self._cache.pop(session_id, None)
+        self._schedule_eviction()
+
+    async def compact(
+        self, session_id: str, removed_ids: set[str], summary: str | None = None
+    ) -> None:
+        """
+        Delete only the given messages, so messages appended meanwhile by any worker
+        are kept
+        """
+        async with self.engine.begin() as conn:
+            await self._touch(
+                conn, session_id, summary, set_summary=summary is not None
+            )
+            if removed_ids:
+                await conn.execute(
+                    delete(ChatMessageRecord).where(
+                        ChatMessageRecord.session_id == session_id,
+                        ChatMessageRecord.message_id.in_(removed_ids),
+                    )
+                )
+        self._cache.pop(session_id, None)
+
+    def _record(self, session_id: str, message: Message) -> dict[str, str]:
+        return {
+            "session_id": session_id,
+            "message_id": message.id,
+            "role": message.role,
+            "content": message.content,
+            "timestamp": message.timestamp,
+        }
+
+    def _schedule_eviction(self) -> None:
+        if (
+            not self.ttl_seconds
+            or time.monotonic() - self._last_eviction < self.eviction_interval
+        ):
+            return
+        if self._eviction_task is not None and not self._eviction_task.done():
+            return
+        self._last_eviction = time.monotonic()
+        self._eviction_task = asyncio.create_task(self._evict_quietly())
+
+    async def _evict_quietly(self) -> None:
+        try:
+            await self.evict_expired()
+        except Exception as e:
+            print(f"⚠️ Chat session eviction failed: {e}")
+
+    async def evict_expired(self) -> int:
+        """
+        Delete sessions idle for longer than the TTL.
+
+        Returns:
+            Number of sessions deleted
+        """
+        if not self.ttl_seconds:
+            return 0
+        cutoff = datetime.datetime.now(datetime.UTC) - datetime.timedelta(
+            seconds=self.ttl_seconds
+        )
+        expired = select(ChatSession.session_id).where(ChatSession.last_active < cutoff)
+        async with self.engine.begin() as conn:
+            # Explicit message delete: SQLite only cascades with foreign keys enabled
+            await conn.execute(
+                delete(ChatMessageRecord).where(
+                    ChatMessageRecord.session_id.in_(expired)
+                )
+            )
+            result = await conn.execute(
+                delete(ChatSession).where(ChatSession.last_active < cutoff)
+            )
+        self.evicted_sessions += result.rowcount
+        return result.rowcount
+
+    async def close(self) -> None:
+        if self._eviction_task is not None:
+            await asyncio.gather(self._eviction_task, return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "cached_sessions": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "evicted_sessions": self.evicted_sessions,
+        }
+
+
+def create_context_store(engine: AsyncEngine | None = None) -> ContextStore:
+    """
+    Build the context store selected by CONTEXT_STORE.
+
+    "memory" keeps sessions in this process. "sql" stores them in the database
+    at CONTEXT_DATABASE_URL (e.g. sqlite+aiosqlite:///chat.db locally, with
+    aiosqlite from the dev dependency group), or in the given engine's database
+    when that is unset.
+
+    Args:
+        engine: Async engine to share for the SQL store, normally the RAG system's
+    """
+    kind = os.getenv("CONTEXT_STORE", "memory").lower()
+    if kind == "memory":
+        return InMemoryContextStore()
+    if kind != "sql":
+        raise ValueError(f"Unknown context store '{kind}', expected 'memory' or 'sql'")
+
+    database_url = os.getenv("CONTEXT_DATABASE_URL")
+    if database_url and database_url.startswith("sqlite"):
+        # Nothing else sets up a local SQLite file, so the store creates its own tables
+        return SQLContextStore(create_async_engine(database_url), create_tables=True)
+    if database_url:
+        engine = create_async_db_engine(database_url)
+    elif engine is None:
+        engine = create_async_db_engine()
+    return SQLContextStore(engine)
+
+
+def render_history(context: ChatContext) -> str:
+    """Chat history as a summary line, then one "Role: content" line per message"""
+    lines = []
+    if context.summary:
+        lines.append(f"Summary of earlier conversation: {context.summary}")
+    lines.extend(
+        f"{message.role.capitalize()}: {message.content}"
+        for message in context.messages
+    )
+    if not lines:
+        return "Chat History: (none)"
+    return "Chat History:\n" + "\n".join(lines)
+
+
+class ConversationSummarizer:
+    """Folds older messages into a running conversation summary with a small model"""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        model: str | None = None,
+        max_tokens: int | None = None,
+    ):
+        """
+        Args:
+            client: AsyncOpenAI client, defaults to the shared process client
+            model: Summary model (MEMORY_SUMMARY_MODEL)
+            max_tokens: Length limit of the summary (MEMORY_SUMMARY_MAX_TOKENS)
+        """
+        self.client = client or get_async_openai_client()
+        self.model = model or os.getenv("MEMORY_SUMMARY_MODEL", "gpt-4o-mini")
+        self.max_tokens = max_tokens or int(
+            os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300")
+        )
+
+    async def summarize(self, summary: str | None, messages: list[Message]) -> str:
+        """
+        Args:
+            summary: Summary of the conversation before messages, if any
+            messages: Messages to fold into the summary, oldest first
+
+        Returns:
+            Updated summary
+        """
+        transcript = "\n".join(
+            f"{message.role.capitalize()}: {message.content}" for message in messages
+        )
+        prompt = (
+            f"CURRENT SUMMARY:\n{summary or '(none)'}\n\nNEW MESSAGES:\n{transcript}"
+        )
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=chat_messages(prompt, SUMMARY_SYSTEM_PROMPT),
+            temperature=0.0,
+            max_tokens=self.max_tokens,
+        )
+        return (response.choices[0].message.content or "").strip()
 
 
 class ContextManager:
-    def __init__(self, store: ContextStore | None = None):
+    """
+    Bounded conversation memory.
+
+    The last recent_turns turns are kept verbatim. Once summary_batch_turns more
+    have accumulated, the oldest ones are folded into the context's summary by a
+    background task, off the request path, so prompts stay roughly the same size
+    however long a session runs. Without a summarizer, or while summaries keep
+    failing, the oldest messages beyond the limit are dropped.
+    """
+
+    def __init__(
+        self,
+        store: ContextStore | None = None,
+        summarizer: ConversationSummarizer | None = None,
+        recent_turns: int | None = None,
+        summary_batch_turns: int | None = None,
+    ):
+        """
+        Args:
+            store: Context storage backend
+            summarizer: Summarizer for older turns; created when
+                MEMORY_SUMMARY_ENABLED is true
+            recent_turns: Turns (user message + answer) kept verbatim
+                (MEMORY_RECENT_TURNS)
+            summary_batch_turns: Turns folded into the summary at a time
+                (MEMORY_SUMMARY_BATCH_TURNS)
+        """
         self.store = store or InMemoryContextStore()
+        self.summarizer = summarizer
+        if self.summarizer is None and os.getenv(
+            "MEMORY_SUMMARY_ENABLED", "true"
+        ).lower() in ("1", "true", "yes"):
+            self.summarizer = ConversationSummarizer()
+        self.recent_messages = 2 * (
+            recent_turns or int(os.getenv("MEMORY_RECENT_TURNS", "4"))
+        )
+        self.batch_messages = 2 * (
+            summary_batch_turns or int(os.getenv("MEMORY_SUMMARY_BATCH_TURNS", "2"))
+        )
+        # Hard limit when summaries fall behind or fail
+        self.max_messages = 2 * (self.recent_messages + self.batch_messages)
+
+        self._summarizing: dict[str, asyncio.Task] = {}
+        self.summaries = 0
+        self.summary_errors = 0
+        self.dropped_messages = 0
 
     async def get_context(self, session_id: str) -> ChatContext:
         context = await self.store.get_context(session_id)
@@ -58,7 +580,81 @@ class ContextManager:
 
     async def update_context(self, session_id: str, query: str, response: str):
         timestamp = str(datetime.datetime.now())
-        bot_message = Message(id="0", role="BOT", content=response, timestamp=timestamp)
-        user_message = Message(id="1", role="USER", content=query, timestamp=timestamp)
-        await self.store.add_message(session_id=session_id, message=bot_message)
+        user_message = Message(
+            id=uuid.uuid4().hex, role="user", content=query, timestamp=timestamp
+        )
+        bot_message = Message(
+            id=uuid.uuid4().hex, role="assistant", content=response, timestamp=timestamp
+        )
         await self.store.add_message(session_id=session_id, message=user_message)
+        await self.store.add_message(session_id=session_id, message=bot_message)
+        await self._compact(session_id)
+
+    async def _compact(self, session_id: str) -> None:
+        """Schedule a summary once enough turns have aged out of the recent window"""
+        context = await self.store.get_context(session_id)
+        if context is None:
+            return
+        overflow = len(context.messages) - self.recent_messages
+
+        if self.summarizer is None:
+            if overflow > 0:
+                await self._drop_oldest(context, overflow)
+            return
+
+        if len(context.messages) > self.max_messages:
+            await self._drop_oldest(context, len(context.messages) - self.max_messages)
+        if overflow >= self.batch_messages and session_id not in self._summarizing:
+            folded = context.messages[: overflow - overflow % 2]
+            task = asyncio.create_task(
+                self._summarize(session_id, context.summary, folded)
+            )
+            self._summarizing[session_id] = task
+            task.add_done_callback(lambda _: self._summarizing.pop(session_id, None))
+
+    async def _drop_oldest(self, context: ChatContext, count: int) -> None:
+        self.dropped_messages += count
+        await self.store.compact(
+            context.session_id, {message.id for message in context.messages[:count]}
+        )
+
+    async def _summarize(
+        self, session_id: str, summary: str | None, folded: list[Message]
+    ) -> None:
+        try:
+            new_summary = await self.summarizer.summarize(summary, folded)
+        except Exception as e:
+            self.summary_errors += 1
+            print(f"⚠️ Conversation summary failed for session {session_id}: {e}")
+            return
+
+        # Only the folded messages are removed; others may have arrived meanwhile
+        await self.store.compact(
+            session_id, {message.id for message in folded}, new_summary
+        )
+        self.summaries += 1
+
+    async def warm_up(self) -> None:
+        """Check the store's schema, falling back to in-memory sessions without it"""
+        if not await self.store.prepare():
+            print(
+                "⚠️ chat_sessions tables missing, keeping sessions in memory "
+                "(run python -m ai.vector_index ensure)"
+            )
+            await self.store.close()
+            self.store = InMemoryContextStore()
+
+    async def close(self) -> None:
+        """Wait for summaries still being written, then close the store"""
+        if self._summarizing:
+            await asyncio.gather(*self._summarizing.values(), return_exceptions=True)
+        await self.store.close()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "summaries": self.summaries,
+            "summary_errors": self.summary_errors,
+            "dropped_messages": self.dropped_messages,
+            "summaries_in_progress": len(self._summarizing),
+            **self.store.stats(),
+        }
@@ -0,0 +1,245 @@
+"""
+Token-budgeted context packing for the answer prompt.
+
+The dynamic part of the answer prompt holds the map state, the retrieved
+sources and the conversation history. Prompt tokens drive both cost and
+time-to-first-token, so these sections share one token budget, filled by
+priority:
+
+1. map state: small and always included
+2. sources, in rank order: full text while it fits, then a compact form with
+   truncated text, then dropped
+3. chat history, newest message first, after a small reserve is set aside for
+   it so a long source list can't crowd out the previous turn
+
+Token counts use tiktoken when it is installed and its encoding can be loaded,
+and a characters-per-token estimate otherwise.
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import Any, NamedTuple
+
+from models.chat import ChatContext, MapState
+
+# Rough average for English prose with GPT tokenizers
+CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """Counts and truncates text in model tokens"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.encoding = None
+        try:
+            import tiktoken
+
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # Not installed, or the encoding file couldn't be downloaded
+            print(f"⚠️ tiktoken unavailable, estimating tokens from characters: {e}")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens, marking the cut with an ellipsis"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is None:
+            return text[: max(0, (max_tokens - 1) * CHARS_PER_TOKEN)].rstrip() + "…"
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return self.encoding.decode(tokens[: max_tokens - 1]).rstrip() + "…"
+
+
+@lru_cache(maxsize=8)
+def get_token_counter(model: str) -> TokenCounter:
+    return TokenCounter(model)
+
+
+class PackedContext(NamedTuple):
+    """Prompt sections that fit the budget, with the tokens each one uses"""
+
+    sources: str
+    history: str
+    map_state: str
+    # Chunks that made it into the prompt, in source-number order
+    chunks: list[Any]
+    truncated_chunks: int
+    tokens: dict[str, int]
+
+
+class ContextPacker:
+    """Fits map state, sources and chat history into a token budget"""
+
+    def __init__(
+        self,
+        model: str,
+        budget: int | None = None,
+        history_min_tokens: int | None = None,
+        history_max_tokens: int | None = None,
+        min_source_tokens: int | None = None,
+    ):
+        """
+        Args:
+            model: Model the prompt is sent to, selecting the tokenizer
+            budget: Tokens shared by the dynamic sections (PROMPT_CONTEXT_TOKENS)
+            history_min_tokens: Tokens reserved for chat history when there is any
+                (PROMPT_HISTORY_MIN_TOKENS)
+            history_max_tokens: Upper bound on chat history tokens
+                (PROMPT_HISTORY_MAX_TOKENS)
+            min_source_tokens: Smallest useful compact source; below this sources are
+                dropped (PROMPT_MIN_SOURCE_TOKENS)
+        """
+        self.counter = get_token_counter(model)
+        self.budget = budget or int(os.getenv("PROMPT_CONTEXT_TOKENS", "6000"))
+        self.history_min_tokens = history_min_tokens or int(
+            os.getenv("PROMPT_HISTORY_MIN_TOKENS", "400")
+        )
+        self.history_max_tokens = history_max_tokens or int(
+            os.getenv("PROMPT_HISTORY_MAX_TOKENS", "1500")
+        )
+        self.min_source_tokens = min_source_tokens or int(
+            os.getenv("PROMPT_MIN_SOURCE_TOKENS", "150")
+        )
+
+    def render_map_state(self, map_state: MapState) -> str:
+        lines = [f"Current Basemap: {map_state.basemap_name}"]
+        if map_state.active_layers:
+            lines.append("Currently displayed layers:")
+            lines.extend(f"    {layer}" for layer in map_state.active_layers)
+        else:
+            lines.append("No layers currently displayed.")
+        return "\n".join(lines)
+
+    def _source_header(self, number: int, chunk: Any, compact: bool) -> list[str]:
+        lines = [
+            f"=== SOURCE {number} ===",
+            f"Document: {chunk.filename}",
+            f"Confidence: {chunk.confidence}",
+        ]
+        if chunk.relevant_layers:
+            lines.append(f"Relevant Layers: {', '.join(chunk.relevant_layers)}")
+        if compact:
+            return lines
+        if chunk.locations:
+            lines.append(f"Locations: {', '.join(chunk.locations)}")
+        if chunk.slr_projections:
+            lines.append(f"SLR Projections: {', '.join(chunk.slr_projections)}")
+        if chunk.measurements:
+            lines.append(f"Measurements: {', '.join(chunk.measurements)}")
+        if chunk.key_findings:
+            lines.append(f"Key Findings: {self._render_findings(chunk.key_findings)}")
+        return lines
+
+    def _render_findings(self, key_findings: Any) -> str:
+        if isinstance(key_findings, str):
+            return key_findings
+        return json.dumps(key_findings, ensure_ascii=False, separators=(", ", ": "))
+
+    def _render_source(self, number: int, chunk: Any, text: str, compact: bool) -> str:
+        lines = self._source_header(number, chunk, compact)
+        lines.append(f"\nText:\n{text}\n")
+        lines.append("-" * 80 + "\n")
+        return "\n".join(lines)
+
+    def pack_sources(
+        self, chunks: list[Any], budget: int
+    ) -> tuple[list[str], list[Any], int]:
+        """Render chunks in rank order until the budget runs out"""
+        blocks, included, truncated, used = [], [], 0, 0
+        for chunk in chunks:
+            number = len(included) + 1
+            block = self._render_source(number, chunk, chunk.text, compact=False)
+            cost = self.counter.count(block)
+            if used + cost > budget:
+                remaining = budget - used
+                if remaining < self.min_source_tokens:
+                    break
+                # Compact form: core metadata and as much text as still fits
+                overhead = self.counter.count(
+                    self._render_source(number, chunk, "", compact=True)
+                )
+                text = self.counter.truncate(chunk.text, remaining - overhead)
+                if not text:
+                    break
+                block = self._render_source(number, chunk, text, compact=True)
+                cost = self.counter.count(block)
+                truncated += 1
+            blocks.append(block)
+            included.append(chunk)
+            used += cost
+        return blocks, included, truncated
+
+    def pack_history(self, chat_context: ChatContext, budget: int) -> str:
+        """
+        Summary of earlier turns, then the most recent messages that fit the budget,
+        oldest first
+        """
+        summary = ""
+        if chat_context.summary:
+            # The summary may take up to half the budget, the rest goes to recent
+            # messages
+            summary = self.counter.truncate(
+                f"Summary of earlier conversation: {chat_context.summary}", budget // 2
+            )
+        lines: list[str] = []
+        used = self.counter.count(summary)
+        for message in reversed(chat_context.messages):
+            line = f"{message.role.capitalize()}: {message.content}"
+            cost = self.counter.count(line)
+            if used + cost > budget:
+                remaining = budget - used
+                if remaining > 20:
+                    lines.append(self.counter.truncate(line, remaining))
+                break
+            lines.append(line)
+            used += cost
+        if summary:
+            lines.append(summary)
+        if not lines:
+            return "Chat History: (none)"
+        return "Chat History:\n" + "\n".join(reversed(lines))
+
+    def pack(
+        self, chunks: list[Any], chat_context: ChatContext, map_state: MapState
+    ) -> PackedContext:
+        map_section = self.render_map_state(map_state)
+        map_tokens = self.counter.count(map_section)
+
+        has_history = bool(chat_context.messages or chat_context.summary)
+        history_reserve = self.history_min_tokens if has_history else 0
+        source_budget = max(0, self.budget - map_tokens - history_reserve)
+        blocks, included, truncated = self.pack_sources(chunks, source_budget)
+        sources = "\n".join(blocks)
+        source_tokens = self.counter.count(sources)
+
+        history_budget = min(
+            self.history_max_tokens,
+            max(history_reserve, self.budget - map_tokens - source_tokens),
+        )
+        history = self.pack_history(chat_context, history_budget)
+
+        return PackedContext(
+            sources=sources,
+            history=history,
+            map_state=map_section,
+            chunks=included,
+            truncated_chunks=truncated,
+            tokens={
+                "map_state": map_tokens,
+                "sources": source_tokens,
+                "history": self.counter.count(history),
+            },
+        )
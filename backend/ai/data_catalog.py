@@ -0,0 +1,81 @@
+"""
+Data layer catalog for the CRC Climate Viewer.
+
+Loads data/documentation.json, which describes every climate layer: its title,
+description, the WMS layer name for each foot-increment scenario and the search
+terms users are likely to type when asking for it.
+"""
+
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from pydantic import BaseModel
+
+DEFAULT_CATALOG_PATH = (
+    Path(__file__).resolve().parents[2] / "data" / "documentation.json"
+)
+
+
+class CatalogLayer(BaseModel):
+    key: str
+    title: str
+    description: str
+    base_layer_name: str
+    scenario_layers: dict[int, str]
+    terms: list[str]
+
+
+class DataCatalog:
+    """Lookup helpers over the climate layers described in documentation.json"""
+
+    def __init__(self, path: str | Path | None = None):
+        catalog_path = Path(
+            path or os.getenv("DATA_CATALOG_PATH") or DEFAULT_CATALOG_PATH
+        )
+        self.layers: dict[str, CatalogLayer] = {}
+        self._wms_to_key: dict[str, str] = {}
+
+        if not catalog_path.exists():
+            print(f"⚠️ Data catalog not found at {catalog_path}")
+            return
+
+        with open(catalog_path, encoding="utf-8") as f:
+            raw = json.load(f)
+
+        for key, value in raw.items():
+            self.layers[key] = CatalogLayer(
+                key=key,
+                title=value.get("title", key),
+                description=value.get("description", ""),
+                base_layer_name=value.get("base_layer_name", ""),
+                scenario_layers={
+                    int(ft): name
+                    for ft, name in value.get("scenario_layers", {}).items()
+                },
+                terms=value.get("terms", []),
+            )
+
+        self._wms_to_key = {
+            name: layer.key
+            for layer in self.layers.values()
+            for name in layer.scenario_layers.values()
+        }
+
+    def layer_key_for(self, wms_name: str) -> str | None:
+        """Return the catalog key (e.g. groundwater_inundation) for a WMS layer name"""
+        return self._wms_to_key.get(wms_name)
+
+    def scenario_layer(self, key: str, foot_increment: int) -> str | None:
+        """Return the WMS layer name of a layer at a given foot increment"""
+        layer = self.layers.get(key)
+        if layer is None:
+            return None
+        return layer.scenario_layers.get(foot_increment)
+
+
+@lru_cache(maxsize=1)
+def get_data_catalog() -> DataCatalog:
+    """Process-wide data catalog, loaded on first use"""
+    return DataCatalog()
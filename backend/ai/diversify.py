@@ -0,0 +1,199 @@
+"""
+Post-retrieval diversification.
+
+The nearest chunks to a query are often near-copies of each other, typically
+neighbouring chunks of the same PDF. They fill the prompt without adding
+information. Retrieval therefore over-fetches candidates together with their
+embeddings and picks the final top_k with Maximal Marginal Relevance (MMR):
+
+    score(c) = lambda * relevance(c) - (1 - lambda) * max_similarity(c, selected)
+
+Candidates whose cosine similarity to an already selected chunk reaches the
+dedup threshold are dropped outright, and an optional per-filename cap limits
+how much of the context one document can take.
+"""
+
+import os
+
+import numpy as np
+
+
+def mmr_select(
+    embeddings: np.ndarray,
+    relevance: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+    dedup_threshold: float | None = 0.95,
+    groups: np.ndarray | None = None,
+    max_per_group: int | None = None,
+) -> tuple[list[int], int]:
+    """
+    Pick k diverse, relevant rows.
+
+    Args:
+        embeddings: (n, d) candidate embeddings
+        relevance: (n,) relevance of each candidate to the query, higher is better
+        k: Number of rows to select
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+        dedup_threshold: Cosine similarity at which a candidate counts as a duplicate
+        groups: (n,) integer group per candidate (e.g. filename code) for capping
+        max_per_group: Maximum selections per group
+
+    Returns:
+        Selected row indices in selection order, and the number of candidates
+        dropped as duplicates
+    """
+    n = embeddings.shape[0]
+    if n == 0 or k <= 0:
+        return [], 0
+
+    vectors = embeddings.astype(np.float32, copy=False)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    # All pairwise similarities at once; candidate lists are small (a few hundred at
+    # most)
+    similarity = vectors @ vectors.T
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    group_counts: dict[int, int] = {}
+    selected: list[int] = []
+    duplicates = 0
+
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+
+        row = similarity[best]
+        np.maximum(max_similarity, row, out=max_similarity)
+        if dedup_threshold is not None:
+            near_copies = available & (row >= dedup_threshold)
+            duplicates += int(near_copies.sum())
+            available &= ~near_copies
+
+        if groups is not None and max_per_group:
+            group = int(groups[best])
+            group_counts[group] = group_counts.get(group, 0) + 1
+            if group_counts[group] >= max_per_group:
+                available &= groups != group
+
+    return selected, duplicates
+
+
+class Diversifier:
+    """Applies MMR, dedup and per-file caps to retrieved chunks"""
+
+    def __init__(
+        self,
+        enabled: bool | None = None,
+        lambda_mult: float | None = None,
+        dedup_threshold: float | None = None,
+        max_per_file: int | None = None,
+        candidate_factor: int | None = None,
+    ):
+        """
+        Args:
+            enabled: Whether retrieval diversifies at all (DIVERSITY_ENABLED)
+            lambda_mult: MMR relevance/diversity trade-off (MMR_LAMBDA)
+            dedup_threshold: Cosine similarity treated as a duplicate (DEDUP_THRESHOLD)
+            max_per_file: Maximum chunks per filename, 0 for no cap
+                (MAX_CHUNKS_PER_FILE)
+            candidate_factor: Candidates fetched as a multiple of top_k
+                (DIVERSITY_CANDIDATE_FACTOR)
+        """
+        if enabled is None:
+            enabled = os.getenv("DIVERSITY_ENABLED", "true").lower() in (
+                "1",
+                "true",
+                "yes",
+            )
+        self.enabled = enabled
+        self.lambda_mult = (
+            lambda_mult
+            if lambda_mult is not None
+            else float(os.getenv("MMR_LAMBDA", "0.7"))
+        )
+        self.dedup_threshold = (
+            dedup_threshold
+            if dedup_threshold is not None
+            else float(os.getenv("DEDUP_THRESHOLD", "0.95"))
+        )
+        self.max_per_file = (
+            max_per_file
+            if max_per_file is not None
+            else int(os.getenv("MAX_CHUNKS_PER_FILE", "3"))
+        )
+        self.candidate_factor = candidate_factor or int(
+            os.getenv("DIVERSITY_CANDIDATE_FACTOR", "3")
+        )
+
+        self.runs = 0
+        self.candidates_seen = 0
+        self.duplicates_removed = 0
+        self.without_embedding = 0
+
+    def candidate_count(self, top_k: int) -> int:
+        return top_k * self.candidate_factor if self.enabled else top_k
+
+    def select(self, chunks: list, top_k: int) -> list:
+        """
+        Choose top_k diverse chunks from over-fetched candidates.
+
+        MMR ranks the chunks with an embedding; relevance is the fusion score
+        for hybrid results (rescaled to [0, 1]) and the similarity score
+        otherwise. Chunks without one (e.g. lexical-only hybrid hits) fill the
+        remaining places in their original order.
+        """
+        candidates = [chunk for chunk in chunks if chunk.embedding is not None]
+        if not self.enabled or len(candidates) <= 1:
+            return chunks[:top_k]
+
+        if candidates[0].fusion_score is not None:
+            fusion = np.array(
+                [chunk.fusion_score for chunk in candidates], dtype=np.float32
+            )
+            spread = float(fusion.max() - fusion.min())
+            relevance = (
+                (fusion - fusion.min()) / spread if spread else np.ones_like(fusion)
+            )
+        else:
+            relevance = np.array(
+                [chunk.similarity_score for chunk in candidates], dtype=np.float32
+            )
+
+        filenames = {
+            name: code
+            for code, name in enumerate(
+                dict.fromkeys(chunk.filename for chunk in candidates)
+            )
+        }
+        selected, duplicates = mmr_select(
+            np.vstack([chunk.embedding for chunk in candidates]),
+            relevance,
+            top_k,
+            lambda_mult=self.lambda_mult,
+            dedup_threshold=self.dedup_threshold,
+            groups=np.array([filenames[chunk.filename] for chunk in candidates]),
+            max_per_group=self.max_per_file or None,
+        )
+
+        self.runs += 1
+        self.candidates_seen += len(candidates)
+        self.duplicates_removed += duplicates
+        result = [candidates[i] for i in selected]
+        without_embedding = [chunk for chunk in chunks if chunk.embedding is None]
+        self.without_embedding += len(without_embedding)
+        return result + without_embedding[: top_k - len(result)]
+
+    def stats(self) -> dict[str, float | int | bool]:
+        return {
+            "enabled": self.enabled,
+            "runs": self.runs,
+            "candidates_seen": self.candidates_seen,
+            "duplicates_removed": self.duplicates_removed,
+            "without_embedding": self.without_embedding,
+        }
@@ -0,0 +1,144 @@
+"""
+Cross-request micro-batching of embedding calls.
+
+The embeddings endpoint accepts many inputs per request, but every user query
+embeds a single string. The batcher collects texts that arrive within a short
+window (or until a batch fills up), sends them in one embeddings.create call and
+resolves each waiting coroutine with its own vector.
+
+The same batcher embeds large text lists for ingestion through embed_many.
+"""
+
+import asyncio
+
+import numpy as np
+from openai import AsyncOpenAI
+
+
+class EmbeddingBatcher:
+    """Collects concurrent embedding requests into batched API calls"""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 10,
+        max_concurrent_batches: int = 4,
+    ):
+        """
+        Args:
+            client: AsyncOpenAI client used for the embeddings calls
+            model: Embedding model name
+            max_batch_size: Maximum number of inputs sent in one call
+            max_wait_ms: How long the first text of a batch waits for company
+            max_concurrent_batches: Maximum number of embeddings calls in flight
+        """
+        self.client = client
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._semaphore = asyncio.Semaphore(max_concurrent_batches)
+
+        self._pending: list[tuple[str, asyncio.Future[np.ndarray]]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        self.requests = 0
+        self.batches = 0
+        self.api_errors = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text, sharing the API call with texts submitted at the same time"""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[np.ndarray] = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    async def embed_many(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed a list of texts in full batches, e.g. for ingestion.
+
+        Returns:
+            float32 array of shape (len(texts), dimensions) in input order
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        self.requests += len(texts)
+        batches = [
+            texts[i : i + self.max_batch_size]
+            for i in range(0, len(texts), self.max_batch_size)
+        ]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        return np.vstack(results)
+
+    def _flush(self) -> None:
+        """Send everything collected so far as one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = (
+            self._pending[: self.max_batch_size],
+            self._pending[self.max_batch_size :],
+        )
+        task = asyncio.ensure_future(self._resolve(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.max_wait, self._flush
+            )
+
+    async def _resolve(
+        self, batch: list[tuple[str, asyncio.Future[np.ndarray]]]
+    ) -> None:
+        """Embed a collected batch and hand each vector to its waiter"""
+        # Identical texts within the window are sent once
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = await self._embed_batch(unique_texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        rows = {text: vectors[i] for i, text in enumerate(unique_texts)}
+        for text, future in batch:
+            if not future.done():
+                future.set_result(rows[text])
+
+    async def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        """One embeddings.create call for a list of texts"""
+        async with self._semaphore:
+            self.batches += 1
+            try:
+                response = await self.client.embeddings.create(
+                    input=texts, model=self.model
+                )
+            except Exception:
+                self.api_errors += 1
+                raise
+        data = sorted(response.data, key=lambda item: item.index)
+        return np.asarray([item.embedding for item in data], dtype=np.float32)
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "api_errors": self.api_errors,
+            "avg_batch_size": round(self.requests / self.batches, 2)
+            if self.batches
+            else 0.0,
+        }
@@ -0,0 +1,294 @@
+"""
+Query embedding cache.
+
+Users ask the same questions over and over, so query embeddings are cached by
+(normalized text, embedding model). The cache has two tiers:
+
+- an in-process LRU tier holding float32 arrays, bounded by entry count and bytes
+- an optional persistent tier (Postgres) that survives restarts and is shared by
+  every worker process; expired and least recently used rows are purged as it
+  is written, so the table stays bounded
+"""
+
+import hashlib
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+EMBEDDING_CACHE_DDL = [
+    "CREATE TABLE IF NOT EXISTS query_embedding_cache ("
+    "cache_key CHAR(64) PRIMARY KEY, "
+    "model VARCHAR(100) NOT NULL, "
+    "embedding BYTEA NOT NULL, "
+    "created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(), "
+    "last_used TIMESTAMPTZ NOT NULL DEFAULT NOW())",
+    "ALTER TABLE query_embedding_cache ADD COLUMN IF NOT EXISTS "
+    "last_used TIMESTAMPTZ NOT NULL DEFAULT NOW()",
+    "CREATE INDEX IF NOT EXISTS ix_query_embedding_cache_last_used "
+    "ON query_embedding_cache (last_used)",
+]
+
+EMBEDDING_CACHE_READY_QUERY = text(
+    "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+    "WHERE table_name = 'query_embedding_cache' AND column_name = 'last_used')"
+)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize text so trivially different spellings share a cache entry"""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def cache_key(query: str, model: str) -> str:
+    """Stable key for a (normalized text, embedding model) pair"""
+    return hashlib.sha256(f"{model}\0{normalize_query(query)}".encode()).hexdigest()
+
+
+class EmbeddingStore(ABC):
+    """Abstract base class for persistent embedding storage"""
+
+    @abstractmethod
+    async def get(self, key: str) -> np.ndarray | None:
+        pass
+
+    @abstractmethod
+    async def put(self, key: str, model: str, embedding: np.ndarray) -> None:
+        pass
+
+
+class PostgresEmbeddingStore(EmbeddingStore):
+    """Embeddings stored as raw float32 bytes in the query_embedding_cache table"""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        ttl_seconds: int | None = None,
+        max_rows: int | None = 100_000,
+        purge_every: int = 500,
+    ):
+        """
+        Args:
+            engine: Async engine; the table comes from init.sql or
+                python -m ai.vector_index ensure
+            ttl_seconds: Rows older than this are ignored and purged (None keeps them)
+            max_rows: Rows kept, least recently used beyond this are purged
+                (None for no cap)
+            purge_every: Writes by this process between purges
+        """
+        self.engine = engine
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.purge_every = purge_every
+        self.writes = 0
+        self.purged = 0
+
+    async def is_ready(self) -> bool:
+        """Whether the table exists with its current columns"""
+        async with self.engine.connect() as conn:
+            return bool((await conn.execute(EMBEDDING_CACHE_READY_QUERY)).scalar())
+
+    async def get(self, key: str) -> np.ndarray | None:
+        # Only reached on in-memory misses, so touching last_used on every hit is cheap
+        query = (
+            "UPDATE query_embedding_cache SET last_used = NOW() WHERE cache_key = :key"
+        )
+        params: dict[str, object] = {"key": key}
+        if self.ttl_seconds:
+            query += " AND created_at > NOW() - make_interval(secs => :ttl)"
+            params["ttl"] = float(self.ttl_seconds)
+        query += " RETURNING embedding"
+
+        async with self.engine.begin() as conn:
+            row = (await conn.execute(text(query), params)).first()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    async def put(self, key: str, model: str, embedding: np.ndarray) -> None:
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "INSERT INTO query_embedding_cache (cache_key, model, embedding) "
+                    "VALUES (:key, :model, :embedding) "
+                    "ON CONFLICT (cache_key) DO UPDATE "
+                    "SET embedding = EXCLUDED.embedding, "
+                    "created_at = NOW(), last_used = NOW()"
+                ),
+                {
+                    "key": key,
+                    "model": model,
+                    "embedding": embedding.astype(np.float32).tobytes(),
+                },
+            )
+        self.writes += 1
+        if self.writes % self.purge_every == 0:
+            try:
+                await self.purge()
+            except Exception as e:
+                print(f"⚠️ Embedding store purge failed: {e}")
+
+    async def purge(self) -> int:
+        """Delete expired rows and the least recently used rows beyond max_rows"""
+        deleted = 0
+        async with self.engine.begin() as conn:
+            if self.ttl_seconds:
+                result = await conn.execute(
+                    text(
+                        "DELETE FROM query_embedding_cache "
+                        "WHERE created_at < NOW() - make_interval(secs => :ttl)"
+                    ),
+                    {"ttl": float(self.ttl_seconds)},
+                )
+                deleted += result.rowcount
+            if self.max_rows:
+                result = await conn.execute(
+                    text(
+                        "DELETE FROM query_embedding_cache WHERE cache_key IN ("
+                        "SELECT cache_key FROM query_embedding_cache "
+                        "ORDER BY last_used DESC OFFSET :max_rows)"
+                    ),
+                    {"max_rows": self.max_rows},
+                )
+                deleted += result.rowcount
+        self.purged += deleted
+        if deleted:
+            print(f"🧹 Purged {deleted} rows from query_embedding_cache")
+        return deleted
+
+
+class EmbeddingCache:
+    """Two-tier LRU/TTL cache for query embeddings"""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float | None = 7 * 24 * 3600,
+        store: EmbeddingStore | None = None,
+    ):
+        """
+        Args:
+            max_entries: Maximum number of embeddings kept in memory
+            max_bytes: Maximum memory used by cached arrays
+            ttl_seconds: Lifetime of an in-memory entry
+                (None keeps entries until evicted)
+            store: Optional persistent tier consulted on memory misses
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+
+        self._entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self._bytes = 0
+
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.store_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_local(self, key: str) -> np.ndarray | None:
+        """Look up the in-memory tier, refreshing LRU order on a hit"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, embedding = entry
+        if expires_at < time.monotonic():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return embedding
+
+    def put_local(self, key: str, embedding: np.ndarray) -> None:
+        """Insert into the in-memory tier, evicting least recently used entries"""
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        if key in self._entries:
+            self._evict(key)
+
+        expires_at = (
+            time.monotonic() + self.ttl_seconds if self.ttl_seconds else float("inf")
+        )
+        self._entries[key] = (expires_at, embedding)
+        self._bytes += embedding.nbytes
+
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        _, embedding = self._entries.pop(key)
+        self._bytes -= embedding.nbytes
+
+    async def get_or_compute(
+        self,
+        query: str,
+        model: str,
+        compute: Callable[[str], Awaitable[np.ndarray]],
+    ) -> np.ndarray:
+        """
+        Return the cached embedding for a query, computing and storing it on a miss.
+
+        Args:
+            query: Text to embed
+            model: Embedding model name (part of the cache key)
+            compute: Coroutine function that embeds the text
+
+        Returns:
+            float32 embedding array (read-only)
+        """
+        key = cache_key(query, model)
+
+        embedding = self.get_local(key)
+        if embedding is not None:
+            self.memory_hits += 1
+            return embedding
+
+        if self.store is not None:
+            try:
+                embedding = await self.store.get(key)
+            except Exception as e:
+                self.store_errors += 1
+                print(f"⚠️ Embedding store lookup failed: {e}")
+            if embedding is not None:
+                self.store_hits += 1
+                self.put_local(key, embedding)
+                return embedding
+
+        self.misses += 1
+        embedding = np.ascontiguousarray(await compute(query), dtype=np.float32)
+        self.put_local(key, embedding)
+
+        if self.store is not None:
+            try:
+                await self.store.put(key, model, embedding)
+            except Exception as e:
+                self.store_errors += 1
+                print(f"⚠️ Embedding store write failed: {e}")
+
+        return embedding
+
+    def stats(self) -> dict[str, float | int]:
+        lookups = self.memory_hits + self.store_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "store_errors": self.store_errors,
+            "store_purged": getattr(self.store, "purged", 0),
+            "hit_rate": round((self.memory_hits + self.store_hits) / lookups, 4)
+            if lookups
+            else 0.0,
+        }
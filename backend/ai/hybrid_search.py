@@ -0,0 +1,96 @@
+"""
+Lexical half of hybrid retrieval.
+
+Dense embeddings blur exact terms such as "MHHW", "NAVD88", "Kakaʻako" or
+"2.5 ft". document_chunks therefore carries a generated tsvector column with a
+GIN index. Retrieval fuses the full-text ranking with the vector ranking using
+reciprocal rank fusion (RRF): score = sum(1 / (k + rank)) over both lists.
+
+Okina and apostrophes are stripped on both sides, so "Kakaʻako", "Kaka'ako" and
+"Kakaako" all match.
+"""
+
+import os
+import re
+
+from sqlalchemy import text
+
+TEXT_SEARCH_CONFIG = "english"
+
+# Keep in sync with DocumentChunk.text_search and init.sql
+TEXT_SEARCH_EXPRESSION = "to_tsvector('english', translate(text, 'ʻ''', ''))"
+
+TEXT_SEARCH_DDL = [
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS text_search tsvector "
+    f"GENERATED ALWAYS AS ({TEXT_SEARCH_EXPRESSION}) STORED",
+    "CREATE INDEX IF NOT EXISTS document_chunks_text_search_idx "
+    "ON document_chunks USING gin (text_search)",
+]
+
+HAS_TEXT_SEARCH_QUERY = text(
+    "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+    "WHERE table_name = 'document_chunks' AND column_name = 'text_search')"
+)
+
+RETRIEVAL_MODES = ("hybrid", "vector")
+
+# Tokens an embedding is likely to blur: acronyms and datums (MHHW, NAVD88),
+# numbers with optional units (2.5 ft, 2100) and Hawaiian place names with okina
+EXACT_TERM_PATTERN = re.compile(
+    r"\b[A-Z]{2,}\w*\b|\b\d+(?:\.\d+)?\s*(?:ft|feet|m|cm|in|%)?(?!\w)|\w+[ʻ']\w+"
+)
+
+
+def strip_okina(query: str) -> str:
+    return query.replace("ʻ", "").replace("'", "")
+
+
+def has_exact_terms(query: str) -> bool:
+    """Whether the query contains terms better matched lexically than semantically"""
+    return bool(EXACT_TERM_PATTERN.search(query))
+
+
+def or_tsquery(query: str) -> str | None:
+    """
+    to_tsquery input matching any word of the query, for the fusion candidates.
+
+    Only word characters reach to_tsquery, so user input can't inject operators.
+    Stop words are dropped by the text search configuration.
+    """
+    words = re.findall(r"\d+(?:\.\d+)?|\w+", strip_okina(query))
+    return " | ".join(words) if words else None
+
+
+class HybridSettings:
+    """Hybrid retrieval parameters, defaulting to environment variables"""
+
+    def __init__(
+        self,
+        mode: str | None = None,
+        rrf_k: int | None = None,
+        candidate_factor: int | None = None,
+        lexical_confidence: float | None = None,
+    ):
+        """
+        Args:
+            mode: "hybrid" or "vector" (RETRIEVAL_MODE)
+            rrf_k: RRF damping constant (HYBRID_RRF_K)
+            candidate_factor: Candidates per list as a multiple of top_k
+                (HYBRID_CANDIDATE_FACTOR)
+            lexical_confidence: Normalized ts_rank_cd of the best match above which a
+                term query is answered lexically, without embedding it
+                (HYBRID_LEXICAL_CONFIDENCE)
+        """
+        self.mode = (mode or os.getenv("RETRIEVAL_MODE", "hybrid")).lower()
+        if self.mode not in RETRIEVAL_MODES:
+            raise ValueError(
+                f"Unknown retrieval mode '{self.mode}', "
+                f"expected one of {RETRIEVAL_MODES}"
+            )
+        self.rrf_k = rrf_k or int(os.getenv("HYBRID_RRF_K", "60"))
+        self.candidate_factor = candidate_factor or int(
+            os.getenv("HYBRID_CANDIDATE_FACTOR", "4")
+        )
+        self.lexical_confidence = lexical_confidence or float(
+            os.getenv("HYBRID_LEXICAL_CONFIDENCE", "0.5")
+        )
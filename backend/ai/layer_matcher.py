@@ -0,0 +1,223 @@
+"""
+Layer detection for queries and answers.
+
+Phrases come from BaseClimateRAGSystem.LAYER_KEYWORDS and from the data catalog
+(documentation.json terms, layer titles and keys). They are compiled once into a
+single regular expression on normalized text: whole words only, an optional
+plural "s"/"es", and the longest phrase winning where phrases overlap, so
+"groundwater inundation" counts once rather than also as "groundwater".
+
+Each match adds to the score of the layers its phrase belongs to: longer
+phrases score more, and phrases shared by several layers are split between
+them. Layers scoring at least LAYER_MATCH_RATIO of the best layer are detected.
+
+The catalog terms are broad ("springs", "wetlands", "coastal flooding"), so
+they only hint at a layer: match(query, hints=False) ignores them, and that is
+what retrieval filters by. Keywords, titles and keys are matched either way.
+
+When no phrase matches, an optional classifier compares the query embedding to
+per-layer centroids (the mean embedding of the chunks tagged with each layer).
+"""
+
+import os
+import re
+import unicodedata
+
+import numpy as np
+from ai.data_catalog import DataCatalog
+from sqlalchemy import text
+
+# Mean embedding of the chunks tagged with each layer
+LAYER_CENTROIDS_QUERY = text(
+    "SELECT layer, avg(embedding)::text AS centroid "
+    "FROM document_chunks, unnest(relevant_layers) AS layer "
+    "WHERE embedding IS NOT NULL "
+    "GROUP BY layer"
+)
+
+# ʻokina, curly quotes and the ASCII apostrophe used in its place
+_APOSTROPHES = str.maketrans("", "", "ʻ\u2018\u2019'")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip diacritics and ʻokina, and collapse punctuation to spaces"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    stripped = stripped.translate(_APOSTROPHES)
+    stripped = stripped.lower().replace("-", " ")
+    return re.sub(r"[^a-z0-9. ]+", " ", stripped)
+
+
+def parse_vector(value: str) -> np.ndarray:
+    """pgvector text output ('[1,2,3]') as a float32 array"""
+    return np.array(value.strip("[]").split(","), dtype=np.float32)
+
+
+class LayerMatcher:
+    """Scores layers by the phrases a text mentions, with an embedding fallback"""
+
+    def __init__(
+        self,
+        keywords: dict[str, list[str]],
+        catalog: DataCatalog | None = None,
+        match_ratio: float | None = None,
+        centroid_threshold: float | None = None,
+        centroid_margin: float | None = None,
+    ):
+        """
+        Args:
+            keywords: Layer key -> keywords, e.g. BaseClimateRAGSystem.LAYER_KEYWORDS
+            catalog: Data catalog whose titles and keys are added as phrases, and its
+                terms as hints
+            match_ratio: Fraction of the best score a layer needs to be detected
+                (LAYER_MATCH_RATIO)
+            centroid_threshold: Minimum cosine similarity to a layer centroid
+                (LAYER_CENTROID_THRESHOLD)
+            centroid_margin: Layers within this similarity of the best centroid are
+                detected too (LAYER_CENTROID_MARGIN)
+        """
+        self.match_ratio = match_ratio or float(os.getenv("LAYER_MATCH_RATIO", "0.5"))
+        self.centroid_threshold = centroid_threshold or float(
+            os.getenv("LAYER_CENTROID_THRESHOLD", "0.5")
+        )
+        self.centroid_margin = (
+            centroid_margin
+            if centroid_margin is not None
+            else float(os.getenv("LAYER_CENTROID_MARGIN", "0.02"))
+        )
+
+        # phrase -> layers it refers to, without and with the catalog terms
+        phrases: dict[str, set[str]] = {}
+        for key, layer_keywords in keywords.items():
+            for keyword in layer_keywords:
+                self._add_phrase(phrases, keyword, key)
+        if catalog is not None:
+            for key, layer in catalog.layers.items():
+                for name in (layer.title, key.replace("_", " ")):
+                    self._add_phrase(phrases, name, key)
+        hinted = {phrase: set(layers) for phrase, layers in phrases.items()}
+        if catalog is not None:
+            for key, layer in catalog.layers.items():
+                for term in layer.terms:
+                    self._add_phrase(hinted, term, key)
+
+        self.filter_phrases = {
+            phrase: sorted(layers) for phrase, layers in phrases.items()
+        }
+        self.phrases = {phrase: sorted(layers) for phrase, layers in hinted.items()}
+        self.filter_pattern = self._compile(self.filter_phrases)
+        self.pattern = self._compile(self.phrases)
+
+        self.centroid_layers: list[str] = []
+        self.centroids: np.ndarray | None = None
+
+        self.keyword_matches = 0
+        self.centroid_matches = 0
+        self.misses = 0
+
+    def _add_phrase(
+        self, phrases: dict[str, set[str]], phrase: str, layer: str
+    ) -> None:
+        normalized = " ".join(normalize(phrase).split())
+        if normalized:
+            phrases.setdefault(normalized, set()).add(layer)
+
+    def _compile(self, phrases: dict[str, list[str]]) -> re.Pattern:
+        # Longest first, so the alternation prefers the longest overlapping phrase
+        alternation = "|".join(
+            re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True)
+        )
+        return re.compile(rf"(?<![a-z0-9])({alternation})(?:e?s)?(?![a-z0-9])")
+
+    def score(self, query: str, hints: bool = True) -> dict[str, float]:
+        """
+        Layer scores from the phrases in a text.
+
+        Args:
+            query: Text to score
+            hints: Whether the catalog terms count
+
+        Returns:
+            Layer key -> score, highest first; empty when no phrase matches
+        """
+        phrases, pattern = (
+            (self.phrases, self.pattern)
+            if hints
+            else (self.filter_phrases, self.filter_pattern)
+        )
+        scores: dict[str, float] = {}
+        for match in pattern.finditer(" ".join(normalize(query).split())):
+            layers = phrases[match.group(1)]
+            weight = len(match.group(1).split()) / len(layers)
+            for layer in layers:
+                scores[layer] = scores.get(layer, 0.0) + weight
+        return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+    def match(self, query: str, hints: bool = True) -> list[str]:
+        """Layers mentioned in a text, best first; see score for hints"""
+        scores = self.score(query, hints)
+        if not scores:
+            return []
+        best = next(iter(scores.values()))
+        return [
+            layer for layer, value in scores.items() if value >= best * self.match_ratio
+        ]
+
+    def load_centroids(self, rows) -> None:
+        """Replace the centroids with LAYER_CENTROIDS_QUERY results"""
+        layers, vectors = [], []
+        for row in rows:
+            vector = (
+                parse_vector(row.centroid)
+                if isinstance(row.centroid, str)
+                else np.asarray(row.centroid, dtype=np.float32)
+            )
+            norm = float(np.linalg.norm(vector))
+            if norm:
+                layers.append(row.layer)
+                vectors.append(vector / norm)
+        self.centroid_layers = layers
+        self.centroids = np.vstack(vectors) if vectors else None
+
+    @property
+    def has_centroids(self) -> bool:
+        return self.centroids is not None
+
+    def classify(self, embedding: np.ndarray | list[float]) -> list[str]:
+        """Layers whose centroid is closest to a query embedding, if close enough"""
+        if self.centroids is None:
+            return []
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if not norm:
+            return []
+        similarity = self.centroids @ (vector / norm)
+        best = float(similarity.max())
+        if best < self.centroid_threshold:
+            return []
+        order = np.argsort(-similarity)
+        return [
+            self.centroid_layers[i]
+            for i in order
+            if similarity[i] >= best - self.centroid_margin
+        ]
+
+    def record(
+        self, keyword_layers: list[str], centroid_layers: list[str] | None = None
+    ) -> None:
+        if keyword_layers:
+            self.keyword_matches += 1
+        elif centroid_layers:
+            self.centroid_matches += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "phrases": len(self.phrases),
+            "filter_phrases": len(self.filter_phrases),
+            "centroids": len(self.centroid_layers),
+            "keyword_matches": self.keyword_matches,
+            "centroid_matches": self.centroid_matches,
+            "misses": self.misses,
+        }
@@ -0,0 +1,522 @@
+"""
+Deterministic interpreter for plain map commands.
+
+Queries such as "show groundwater inundation at 3 ft", "zoom to Waikiki",
+"switch to satellite basemap" or "clear layers" don't need retrieval or an LLM.
+The interpreter recognizes them with a small phrase grammar built from the
+layer keywords, the data catalog terms, the foot-increment/year tables and a
+gazetteer of Hawaiian places, and emits map actions directly. Anything it
+cannot explain completely is left to the LLM pipeline.
+"""
+
+import re
+
+from ai.data_catalog import DataCatalog, get_data_catalog
+from ai.layer_matcher import normalize
+from ai.rag_query_system import BaseClimateRAGSystem
+from models.chat import ChatResponse, MapActions, MapState
+
+# Approximate year reached by each foot increment (2022 Hawaiʻi SLR Technical Report)
+INTERMEDIATE_YEARS = {
+    0: 2000,
+    1: 2050,
+    2: 2075,
+    3: 2100,
+    4: 2100,
+    5: 2125,
+    6: 2125,
+    7: 2150,
+    8: 2150,
+}
+INTERMEDIATE_HIGH_YEARS = {0: 2000, 1: 2040, 2: 2060, 4: 2080, 6: 2100, 10: 2150}
+
+# Bounding boxes as ([south, west], [north, east])
+LOCATIONS: dict[str, tuple[list[float], list[float]]] = {
+    "waikiki": ([21.26, -157.83], [21.28, -157.81]),
+    "koolaupoko": ([21.25, -157.9], [21.35, -157.7]),
+    "honolulu": ([21.28, -157.89], [21.34, -157.80]),
+    "kakaako": ([21.29, -157.87], [21.30, -157.85]),
+    "ala moana": ([21.285, -157.85], [21.295, -157.835]),
+    "hawaii kai": ([21.27, -157.72], [21.31, -157.68]),
+    "kailua": ([21.38, -157.77], [21.42, -157.71]),
+    "kaneohe": ([21.38, -157.83], [21.44, -157.78]),
+    "waimanalo": ([21.32, -157.72], [21.36, -157.68]),
+    "pearl harbor": ([21.33, -158.0], [21.39, -157.93]),
+    "ewa beach": ([21.30, -158.04], [21.33, -157.99]),
+    "haleiwa": ([21.58, -158.12], [21.61, -158.09]),
+    "north shore": ([21.55, -158.15], [21.70, -157.95]),
+    "oahu": ([21.25, -158.28], [21.72, -157.64]),
+    "maui": ([20.57, -156.70], [21.04, -155.97]),
+    "lahaina": ([20.86, -156.69], [20.90, -156.66]),
+    "kahului": ([20.87, -156.49], [20.91, -156.44]),
+    "kauai": ([21.86, -159.80], [22.24, -159.28]),
+    "molokai": ([21.05, -157.32], [21.23, -156.70]),
+    "lanai": ([20.72, -157.07], [20.93, -156.80]),
+    "big island": ([18.90, -156.07], [20.28, -154.80]),
+    "hawaii island": ([18.90, -156.07], [20.28, -154.80]),
+    "hilo": ([19.69, -155.12], [19.75, -155.04]),
+    "kona": ([19.60, -156.0], [19.66, -155.96]),
+    "hawaii": ([18.86, -159.82], [22.26, -154.75]),
+    "statewide": ([18.86, -159.82], [22.26, -154.75]),
+}
+
+BASEMAP_ALIASES = {
+    "satellite streets": "hybrid",
+    "hybrid": "hybrid",
+    "satellite": "satellite",
+    "imagery": "satellite",
+    "aerial": "satellite",
+    "light": "light",
+    "street": "light",
+    "streets": "light",
+    "grayscale": "light",
+    "default": "light",
+}
+
+QUESTION_WORDS = {
+    "what",
+    "whats",
+    "why",
+    "how",
+    "when",
+    "where",
+    "which",
+    "who",
+    "whose",
+    "explain",
+    "describe",
+    "tell",
+    "mean",
+    "means",
+    "compare",
+    "difference",
+    "affect",
+    "affects",
+    "impact",
+    "impacts",
+    "risk",
+    "happen",
+    "happens",
+    "will",
+    "does",
+    "is",
+    "are",
+    "should",
+}
+
+ADD_VERBS = (
+    "turn on",
+    "show",
+    "display",
+    "add",
+    "view",
+    "see",
+    "overlay",
+    "enable",
+    "open",
+)
+# A bare "clear" names what to remove ("clear the groundwater layer"), so it is a
+# remove verb; only the explicit phrases below clear every layer
+REMOVE_VERBS = ("turn off", "hide", "remove", "disable", "drop", "clear")
+CLEAR_PHRASES = (
+    "clear all layers",
+    "clear layers",
+    "clear the map",
+    "clear map",
+    "remove all layers",
+    "hide all layers",
+    "reset the map",
+    "reset map",
+    "clear all",
+)
+NAVIGATE_PHRASES = (
+    "zoom to",
+    "zoom into",
+    "zoom in on",
+    "go to",
+    "fly to",
+    "take me to",
+    "center on",
+    "centre on",
+    "pan to",
+    "move to",
+    "navigate to",
+    "focus on",
+    "jump to",
+)
+ZOOM_PHRASES = {"zoom in": 2, "zoom out": -2}
+BASEMAP_PHRASES = (
+    "switch to",
+    "change to",
+    "switch the basemap to",
+    "change the basemap to",
+    "use",
+    "set",
+)
+
+FILLER_WORDS = {
+    "the",
+    "a",
+    "an",
+    "me",
+    "please",
+    "map",
+    "maps",
+    "layer",
+    "layers",
+    "on",
+    "to",
+    "at",
+    "in",
+    "of",
+    "for",
+    "and",
+    "with",
+    "now",
+    "can",
+    "could",
+    "would",
+    "you",
+    "i",
+    "want",
+    "like",
+    "lets",
+    "let",
+    "us",
+    "basemap",
+    "base",
+    "background",
+    "view",
+    "mode",
+    "level",
+    "levels",
+    "scenario",
+    "sea",
+    "rise",
+    "slr",
+    "above",
+    "mhhw",
+    "by",
+    "year",
+    "around",
+    "area",
+    "areas",
+    "then",
+    "also",
+    "just",
+    "zoom",
+    "data",
+    "ft",
+    "feet",
+    "foot",
+    "intermediate",
+    "high",
+    "projection",
+    "projections",
+    "under",
+    "it",
+    "this",
+    "that",
+}
+
+_WORD = r"(?<![a-z0-9]){}(?![a-z0-9])"
+
+
+class MapCommandInterpreter:
+    """Rule-based interpreter that turns pure map commands into MapActions"""
+
+    def __init__(self, catalog: DataCatalog | None = None):
+        self.catalog = catalog or get_data_catalog()
+        self.attempts = 0
+        self.hits = 0
+
+        # phrase -> layer keys it refers to, longest phrases first
+        phrases: dict[str, set[str]] = {}
+        for key, keywords in BaseClimateRAGSystem.LAYER_KEYWORDS.items():
+            for keyword in keywords:
+                phrases.setdefault(normalize(keyword).strip(), set()).add(key)
+        for key, layer in self.catalog.layers.items():
+            for term in [*layer.terms, layer.title, key.replace("_", " ")]:
+                phrases.setdefault(normalize(term).strip(), set()).add(key)
+        self.layer_phrases = sorted(
+            phrases.items(), key=lambda item: len(item[0]), reverse=True
+        )
+
+    def stats(self) -> dict[str, float | int]:
+        """Fast-path hit rate since startup"""
+        return {
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.attempts, 4) if self.attempts else 0.0,
+        }
+
+    def interpret(self, query: str, map_state: MapState) -> ChatResponse | None:
+        """
+        Interpret a query as a map command.
+
+        Args:
+            query: User's message
+            map_state: Current state of the map
+
+        Returns:
+            ChatResponse with map actions, or None when the query is not a
+            command the interpreter can handle with confidence
+        """
+        self.attempts += 1
+        result = self._interpret(query, map_state)
+        if result is not None:
+            self.hits += 1
+        return result
+
+    def _interpret(self, query: str, map_state: MapState) -> ChatResponse | None:
+        text = f" {normalize(query)} "
+        if set(text.split()) & QUESTION_WORDS:
+            return None
+
+        actions: list[MapActions] = []
+        replies: list[str] = []
+
+        clear = self._consume_first(text, CLEAR_PHRASES)
+        if clear is not None:
+            text = clear
+            actions.append(
+                MapActions(
+                    type="clear_layers", parameters={"reason": "Requested by the user"}
+                )
+            )
+            replies.append("I've cleared all layers from the map.")
+
+        remove = added = False
+        consumed = self._consume_first(text, REMOVE_VERBS)
+        if consumed is not None:
+            text, remove = consumed, True
+        else:
+            stripped = self._consume_all(text, ADD_VERBS)
+            text, added = stripped, stripped != text
+
+        text, foot_increment, scenario_note = self._parse_foot_increment(text)
+        if foot_increment is False:
+            return None
+
+        text, layer_keys = self._parse_layers(text)
+        if layer_keys is None:
+            return None
+        # A verb with no layer to act on ("hide waikiki") is not a navigation or
+        # scenario command; leave it to the model
+        if (remove or added) and not layer_keys:
+            return None
+        # After clearing, layers are only added when the user says so ("clear the
+        # map and show flooding"); anything else is left to the model
+        if clear is not None and (remove or (layer_keys and not added)):
+            return None
+
+        text, basemap_id = self._parse_basemap(text, map_state)
+        if basemap_id is False:
+            return None
+
+        text, location = self._parse_location(text)
+        text, zoom_delta = self._parse_zoom(text)
+
+        if any(word not in FILLER_WORDS for word in text.split()):
+            return None
+
+        current_foot = map_state.foot_increment
+        if isinstance(foot_increment, int) and foot_increment != current_foot:
+            actions.append(
+                MapActions(
+                    type="set_foot_increment",
+                    parameters={
+                        "foot_increment": foot_increment,
+                        "reason": "Requested sea level rise scenario",
+                    },
+                )
+            )
+            replies.append(
+                f"I've set sea level rise to {foot_increment} ft above MHHW"
+                f"{scenario_note}."
+            )
+
+        target_foot = (
+            foot_increment if isinstance(foot_increment, int) else current_foot
+        )
+        for key in layer_keys:
+            action = self._layer_action(key, target_foot, remove, map_state)
+            if action is None:
+                return None
+            actions.append(action)
+            title = (
+                self.catalog.layers[key].title
+                if key in self.catalog.layers
+                else key.replace("_", " ")
+            )
+            if remove:
+                replies.append(f"I've removed the {title} layer.")
+            else:
+                replies.append(f"I'm showing the {title} layer at {target_foot} ft.")
+
+        if basemap_id:
+            actions.append(
+                MapActions(
+                    type="change_basemap",
+                    parameters={
+                        "basemap_id": basemap_id,
+                        "reason": "Requested by the user",
+                    },
+                )
+            )
+            replies.append(f"I've switched to the {basemap_id} basemap.")
+
+        if location:
+            southwest, northeast = LOCATIONS[location]
+            actions.append(
+                MapActions(
+                    type="set_bounds",
+                    parameters={
+                        "bounds": {"southwest": southwest, "northeast": northeast},
+                        "reason": f"Focus on {location.title()}",
+                    },
+                )
+            )
+            replies.append(f"I'm zooming to {location.title()}.")
+        elif zoom_delta:
+            zoom_level = min(max(map_state.zoom_level + zoom_delta, 1), 19)
+            actions.append(
+                MapActions(
+                    type="set_zoom_level",
+                    parameters={
+                        "zoom_level": zoom_level,
+                        "reason": "Requested by the user",
+                    },
+                )
+            )
+            replies.append("I'm zooming in." if zoom_delta > 0 else "I'm zooming out.")
+
+        if not actions:
+            return None
+
+        return ChatResponse(
+            response=" ".join(replies),
+            map_actions=[action.model_dump() for action in actions],
+        )
+
+    def _consume_first(self, text: str, phrases: tuple[str, ...]) -> str | None:
+        """Remove the first phrase found, or return None if none occur"""
+        for phrase in phrases:
+            pattern = re.compile(_WORD.format(re.escape(phrase)))
+            if pattern.search(text):
+                return pattern.sub(" ", text, count=1)
+        return None
+
+    def _consume_all(self, text: str, phrases: tuple[str, ...]) -> str:
+        for phrase in phrases:
+            text = re.sub(_WORD.format(re.escape(phrase)), " ", text)
+        return text
+
+    def _parse_foot_increment(self, text: str) -> tuple[str, int | bool | None, str]:
+        """
+        Extract a foot increment from "3 ft"/"3 feet" or a year like "by 2100".
+
+        Returns False for values that are mentioned but cannot be mapped exactly
+        (fractional feet, out of range, years between table rows).
+        """
+        high = bool(re.search(_WORD.format("intermediate high"), text))
+        match = re.search(
+            r"(?<![a-z0-9.])(\d+(?:\.\d+)?)\s*(?:ft|feet|foot)(?![a-z0-9])", text
+        )
+        if match:
+            value = float(match.group(1))
+            if not value.is_integer() or not 0 <= value <= 10:
+                return text, False, ""
+            text = text[: match.start()] + " " + text[match.end() :]
+            return text, int(value), ""
+
+        match = re.search(r"(?<![a-z0-9])(20\d\d|21\d\d)(?![a-z0-9])", text)
+        if match:
+            year = int(match.group(1))
+            table = INTERMEDIATE_HIGH_YEARS if high else INTERMEDIATE_YEARS
+            feet = [ft for ft, ft_year in sorted(table.items()) if ft_year == year]
+            if not feet:
+                return text, False, ""
+            text = text[: match.start()] + " " + text[match.end() :]
+            scenario = "Intermediate-High" if high else "Intermediate"
+            return text, feet[0], f" (about {year} under the {scenario} scenario)"
+
+        return text, None, ""
+
+    def _parse_layers(self, text: str) -> tuple[str, list[str] | None]:
+        """Match layer phrases; returns None for layers that are ambiguous"""
+        keys: list[str] = []
+        for phrase, phrase_keys in self.layer_phrases:
+            pattern = re.compile(_WORD.format(re.escape(phrase)))
+            if not pattern.search(text):
+                continue
+            if len(phrase_keys) > 1:
+                return text, None
+            key = next(iter(phrase_keys))
+            if key not in keys:
+                keys.append(key)
+            text = pattern.sub(" ", text)
+        return text, keys
+
+    def _parse_basemap(
+        self, text: str, map_state: MapState
+    ) -> tuple[str, str | bool | None]:
+        for alias in sorted(BASEMAP_ALIASES, key=len, reverse=True):
+            pattern = re.compile(_WORD.format(re.escape(alias)))
+            if not pattern.search(text):
+                continue
+            basemap_id = BASEMAP_ALIASES[alias]
+            if (
+                map_state.available_basemaps
+                and basemap_id not in map_state.available_basemaps
+            ):
+                return text, False
+            text = self._consume_all(pattern.sub(" ", text), BASEMAP_PHRASES)
+            return text, basemap_id
+        return text, None
+
+    def _parse_location(self, text: str) -> tuple[str, str | None]:
+        for name in sorted(LOCATIONS, key=len, reverse=True):
+            pattern = re.compile(_WORD.format(re.escape(name)))
+            if pattern.search(text):
+                text = self._consume_all(pattern.sub(" ", text), NAVIGATE_PHRASES)
+                return text, name
+        return text, None
+
+    def _parse_zoom(self, text: str) -> tuple[str, int]:
+        for phrase, delta in ZOOM_PHRASES.items():
+            pattern = re.compile(_WORD.format(re.escape(phrase)))
+            if pattern.search(text):
+                return pattern.sub(" ", text), delta
+        return text, 0
+
+    def _layer_action(
+        self, key: str, foot_increment: int, remove: bool, map_state: MapState
+    ) -> MapActions | None:
+        """Build an add/remove action for a layer, or None if it isn't available"""
+        if remove:
+            active = [
+                name
+                for name in map_state.active_layers or []
+                if self.catalog.layer_key_for(name) == key
+            ]
+            if not active:
+                return None
+            return MapActions(
+                type="remove_layer",
+                parameters={"layer_name": active[0], "reason": "Requested by the user"},
+            )
+
+        layer_name = self.catalog.scenario_layer(key, foot_increment)
+        if layer_name is None:
+            return None
+
+        available = map_state.available_layers
+        if available is not None and (available.increment or available.normal):
+            offered = [*(available.increment or []), *(available.normal or [])]
+            if layer_name not in offered:
+                return None
+        return MapActions(
+            type="add_layer",
+            parameters={"layer_name": layer_name, "reason": "Requested by the user"},
+        )
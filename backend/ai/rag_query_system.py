@@ -1,32 +1,211 @@
 """
 RAG Query System for Climate Literature
 Uses SQLAlchemy for retrieval and GPT-4o for response synthesis
+
+Two variants share the retrieval query, prompt and response formatting:
+ClimateRAGSystem for scripts and notebooks, and AsyncClimateRAGSystem for the
+API, which never blocks the event loop while waiting on OpenAI or Postgres.
 """
 
 import os
-from typing import Any
+import sys
+from collections.abc import AsyncIterator
+from typing import Any, ClassVar, NamedTuple
 
-from openai import OpenAI
-from sqlalchemy import ARRAY, String, cast, create_engine
+import numpy as np
+from openai import AsyncOpenAI, OpenAI
+from sqlalchemy import ARRAY, Engine, Float, Select, String, cast, func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 
-# Import the DocumentChunk model
-import sys
-import os
-from models.chat import ChatContext, MapState, RAGMetadata, RAGResponse
 # Add the backend directory to the path so we can import models
-backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-sys.path.insert(0, backend_dir)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.context_packer import ContextPacker, PackedContext
+from ai.data_catalog import get_data_catalog
+from ai.diversify import Diversifier
+from ai.embedding_batcher import EmbeddingBatcher
+from ai.embedding_cache import (
+    EmbeddingCache,
+    PostgresEmbeddingStore,
+    cache_key,
+    normalize_query,
+)
+from ai.hybrid_search import (
+    HAS_TEXT_SEARCH_QUERY,
+    TEXT_SEARCH_CONFIG,
+    HybridSettings,
+    has_exact_terms,
+    or_tsquery,
+    strip_okina,
+)
+from ai.layer_matcher import LAYER_CENTROIDS_QUERY, LayerMatcher
+from ai.prompts import ANSWER_SYSTEM_PROMPT, PromptCacheStats
+from ai.retrieval_planner import (
+    CONFIDENCE_RANKS,
+    CONFIDENCE_STATS_QUERY,
+    HAS_CONFIDENCE_RANK_QUERY,
+    LAYER_STATS_QUERY,
+    RetrievalPlan,
+    RetrievalPlanner,
+)
+from ai.single_flight import SingleFlight
+from ai.vector_index import (
+    MAX_EF_SEARCH,
+    PGVECTOR_VERSION_QUERY,
+    VECTOR_INDEXES_QUERY,
+    VectorIndexSettings,
+    default_probes,
+    describe_indexes,
+    ivfflat_list_count,
+    search_settings,
+    supports_iterative_scan,
+)
+from models.chat import ChatContext, MapState, RAGMetadata, RAGResponse, RAGSource
 from models.document_chunk import DocumentChunk
+from service.ai_service import chat_messages, get_async_openai_client, get_openai_client
+from service.database import (
+    create_async_db_engine,
+    create_db_engine,
+    warm_up_async_pool,
+    warm_up_pool,
+)
+
+# Touches the vector index with a single ANN lookup so its pages are cached
+WARM_UP_QUERY = text(
+    "SELECT id FROM document_chunks "
+    "ORDER BY embedding <=> ("
+    "SELECT embedding FROM document_chunks "
+    "WHERE embedding IS NOT NULL LIMIT 1) "
+    "LIMIT 1"
+)
+
+
+# Columns read by build_context_prompt and the RAGSource output
+SUMMARY_COLUMNS = (
+    DocumentChunk.id,
+    DocumentChunk.chunk_id,
+    DocumentChunk.text,
+    DocumentChunk.filename,
+    DocumentChunk.confidence,
+    DocumentChunk.relevant_layers,
+    DocumentChunk.key_findings,
+    DocumentChunk.locations,
+    DocumentChunk.slr_projections,
+    DocumentChunk.measurements,
+)
+
+# Columns nothing on the answer path reads; fetched on request only
+DETAIL_COLUMNS = (
+    DocumentChunk.reasoning,
+    DocumentChunk.timeframes,
+    DocumentChunk.source_file,
+)
+
+
+class RetrievedChunk:
+    """
+    A retrieved chunk with the columns of SUMMARY_COLUMNS.
+
+    The DETAIL_COLUMNS fields stay None until loaded with load_details (or
+    retrieved with include_details=True).
+    """
 
+    __slots__ = (
+        "chunk_id",
+        "confidence",
+        "details_loaded",
+        "distance",
+        "embedding",
+        "filename",
+        "fusion_score",
+        "id",
+        "key_findings",
+        "locations",
+        "measurements",
+        "reasoning",
+        "relevant_layers",
+        "slr_projections",
+        "source_file",
+        "text",
+        "timeframes",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        chunk_id: str,
+        text: str,
+        filename: str,
+        confidence: str | None,
+        relevant_layers: list[str] | None,
+        key_findings: Any,
+        locations: list[str] | None,
+        slr_projections: list[str] | None,
+        measurements: list[str] | None,
+        distance: float,
+        reasoning: str | None = None,
+        timeframes: list[str] | None = None,
+        source_file: str | None = None,
+        details_loaded: bool = False,
+        fusion_score: float | None = None,
+        embedding: np.ndarray | None = None,
+    ):
+        self.id = id
+        self.chunk_id = chunk_id
+        self.text = text
+        self.filename = filename
+        self.confidence = confidence
+        self.relevant_layers = relevant_layers or []
+        self.key_findings = key_findings
+        self.locations = locations or []
+        self.slr_projections = slr_projections or []
+        self.measurements = measurements or []
+        self.distance = distance
+        self.reasoning = reasoning
+        self.timeframes = timeframes or []
+        self.source_file = source_file
+        self.details_loaded = details_loaded
+        self.fusion_score = fusion_score
+        self.embedding = embedding
+
+    @property
+    def similarity_score(self) -> float:
+        return 1 - self.distance
+
+    def __repr__(self) -> str:
+        return (
+            f"<RetrievedChunk(chunk_id='{self.chunk_id}', "
+            f"distance={self.distance:.4f})>"
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """Dictionary form, e.g. for JSON output"""
+        data = {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if name not in ("details_loaded", "embedding")
+        }
+        data["similarity_score"] = self.similarity_score
+        return data
 
-class ClimateRAGSystem:
+
+class RetrievalResult(NamedTuple):
+    """Chunks retrieved for a query together with the filters that were applied"""
+
+    chunks: list[RetrievedChunk]
+    layers: list[str] | None
+    detected_layers: list[str] | None
+    min_confidence: str
+
+
+class BaseClimateRAGSystem:
     """
-    RAG system for querying climate literature using SQLAlchemy and GPT-4o.
+    Shared retrieval and prompt logic for the sync and async RAG systems.
     """
 
     # Layer keyword mapping for automatic detection
-    LAYER_KEYWORDS = {
+    LAYER_KEYWORDS: ClassVar[dict[str, list[str]]] = {
         "passive_marine_flooding": [
             "marine inundation",
             "coastal flooding",
@@ -106,38 +285,57 @@ class ClimateRAGSystem:
         ],
     }
 
+    # Confidence level mapping
+    CONFIDENCE_LEVELS: ClassVar[dict[str, list[str]]] = {
+        "HIGH": ["HIGH"],
+        "MEDIUM": ["HIGH", "MEDIUM"],
+        "LOW": ["HIGH", "MEDIUM", "LOW"],
+    }
+
     def __init__(
         self,
-        database_url: str | None = None,
         model: str = "gpt-4o",
         embedding_model: str = "text-embedding-3-small",
     ):
         """
-        Initialize the RAG system.
-
         Args:
-            database_url: PostgreSQL connection URL (defaults to env var)
             model: GPT model for response synthesis
             embedding_model: Model for generating query embeddings
         """
-        self.database_url = database_url or os.getenv("DATABASE_URL")
-        if not self.database_url:
-            raise ValueError("DATABASE_URL not provided and not found in environment")
-
         self.model = model
         self.embedding_model = embedding_model
-        self.client = OpenAI()
-
-        # Setup database connection
-        self.engine = create_engine(self.database_url)
-        self.SessionLocal = sessionmaker(bind=self.engine)
 
-    def generate_embedding(self, text: str) -> list[float]:
-        """Generate embedding for query text."""
-        response = self.client.embeddings.create(
-            input=text, model=self.embedding_model
+        # Token budget for the sources, history and map state in the answer prompt
+        self.context_packer = ContextPacker(model)
+        # The system prompt is constant, so it is counted once
+        self.system_prompt_tokens = self.context_packer.counter.count(
+            ANSWER_SYSTEM_PROMPT
         )
-        return response.data[0].embedding
+        self.prompt_cache = PromptCacheStats()
+
+        # Recall/latency knobs applied to every ANN query
+        self.index_settings = VectorIndexSettings()
+        self.ivfflat_lists: int | None = None  # read from the catalog on warm_up
+        self.has_iterative_scan = False  # confirmed on warm_up
+
+        # Exact vs approximate search by filter selectivity
+        self.planner = RetrievalPlanner()
+        self.has_confidence_rank = False  # confirmed on warm_up
+
+        # Full-text ranking fused with the vector ranking
+        self.hybrid_settings = HybridSettings()
+        self.has_text_search = False  # confirmed on warm_up
+        self.lexical_only_answers = 0
+
+        # MMR, near-duplicate suppression and per-file caps over the candidates
+        self.diversifier = Diversifier()
+
+        # Compiled phrase matcher over LAYER_KEYWORDS and the catalog, with an
+        # optional centroid classifier for queries that name no layer
+        self.layer_matcher = LayerMatcher(self.LAYER_KEYWORDS, get_data_catalog())
+        self.layer_classifier_enabled = os.getenv(
+            "LAYER_CLASSIFIER_ENABLED", "false"
+        ).lower() in ("1", "true", "yes")
 
     def detect_layers_from_query(self, query: str) -> list[str]:
         """
@@ -147,276 +345,742 @@ class ClimateRAGSystem:
             query: User's question text
 
         Returns:
-            List of detected layer names (empty list if none detected)
+            List of detected layer names, best match first (empty list if none detected)
         """
-        query_lower = query.lower()
-        detected_layers = []
-
-        for layer, keywords in self.LAYER_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword.lower() in query_lower:
-                    if layer not in detected_layers:
-                        detected_layers.append(layer)
-                    break  # Move to next layer once we found a match
-
-        return detected_layers
+        return self.layer_matcher.match(query)
+
+    def needs_layer_classifier(self, query: str) -> bool:
+        """Whether layer detection should fall back to the query embedding"""
+        return (
+            self.layer_classifier_enabled
+            and self.layer_matcher.has_centroids
+            and not self.layer_matcher.score(query)
+        )
 
-    def retrieve_chunks(
+    def resolve_layers(
         self,
         query: str,
-        top_k: int = 10,
-        layers: list[str] | None = None,
-        min_confidence: str | None = "MEDIUM",
-    ) -> list[dict[str, Any]]:
+        layers: list[str] | None,
+        auto_detect_layers: bool,
+        query_embedding: np.ndarray | list[float] | None = None,
+    ) -> tuple[list[str] | None, list[str] | None]:
         """
-        Retrieve relevant chunks from the database.
+        Auto-detect layers if enabled and no layers were provided.
 
         Args:
             query: User's question
-            top_k: Number of chunks to retrieve
-            layers: Optional list of climate layers to filter by
-            min_confidence: Minimum confidence level (HIGH, MEDIUM, LOW)
+            layers: Explicit layer filter, which disables detection
+            auto_detect_layers: Whether to detect layers at all
+            query_embedding: Used for the centroid classifier when no phrase matches
 
         Returns:
-            List of chunk dictionaries with text and metadata
+            Tuple of (layers to filter by, auto-detected layers)
+
+        Layers matched only by catalog terms are reported as detected but don't
+        filter retrieval; "springs" should not limit the sources to one layer.
         """
-        # Generate query embedding
-        query_embedding = self.generate_embedding(query)
+        detected_layers = None
+        if auto_detect_layers and layers is None:
+            keyword_layers = self.detect_layers_from_query(query)
+            classified = []
+            if not keyword_layers and query_embedding is not None:
+                classified = self.layer_matcher.classify(query_embedding)
+            self.layer_matcher.record(keyword_layers, classified)
+            detected_layers = keyword_layers or classified
+            if detected_layers:
+                source = "keywords" if keyword_layers else "embedding"
+                layers = (
+                    self.layer_matcher.match(query, hints=False)
+                    if keyword_layers
+                    else classified
+                ) or None
+                if layers is None:
+                    source = "catalog terms, not filtering"
+                print(
+                    f"🔍 Auto-detected layers ({source}): {', '.join(detected_layers)}"
+                )
+        return layers, detected_layers
+
+    def allowed_confidences(self, min_confidence: str | None) -> list[str] | None:
+        """Confidence levels at or above min_confidence (None when unfiltered)."""
+        if not min_confidence:
+            return None
+        return self.CONFIDENCE_LEVELS.get(min_confidence, ["HIGH", "MEDIUM", "LOW"])
+
+    def result_columns(self, include_details: bool, with_embeddings: bool) -> tuple:
+        """Columns selected for RetrievedChunk rows."""
+        columns = (
+            SUMMARY_COLUMNS + DETAIL_COLUMNS if include_details else SUMMARY_COLUMNS
+        )
+        if with_embeddings:
+            # Candidates for diversification carry their vectors
+            columns += (DocumentChunk.embedding,)
+        return columns
 
-        # Confidence level mapping
-        confidence_levels = {
-            "HIGH": ["HIGH"],
-            "MEDIUM": ["HIGH", "MEDIUM"],
-            "LOW": ["HIGH", "MEDIUM", "LOW"],
-        }
+    def build_retrieval_query(
+        self,
+        query_embedding: list[float] | np.ndarray,
+        top_k: int,
+        layers: list[str] | None,
+        min_confidence: str | None,
+        include_details: bool = False,
+        exact: bool = False,
+        with_embeddings: bool = False,
+    ) -> Select:
+        """
+        Build the pgvector similarity query with layer and confidence filters.
 
-        with self.SessionLocal() as session:
-            # Build query
-            query_obj = session.query(
-                DocumentChunk,
-                DocumentChunk.embedding.cosine_distance(query_embedding).label(
-                    "distance"
-                ),
-            )
+        Only the columns used by the prompt and the sources are selected; the
+        embedding itself never leaves the database. With exact=True the vector
+        index is bypassed, so the filters run first and the matching rows are
+        ranked by exact distance.
+        """
+        columns = self.result_columns(include_details, with_embeddings)
+        distance = DocumentChunk.embedding.cosine_distance(query_embedding)
+        query_obj = self.apply_filters(
+            select(*columns, distance.label("distance")), layers, min_confidence
+        )
 
-            # Filter by layers if specified
-            if layers:
-                filter_array = cast(layers, ARRAY(String))
-                query_obj = query_obj.filter(
-                    DocumentChunk.relevant_layers.op("&&")(filter_array)
-                )
+        # "+ 0" keeps Postgres from answering the ORDER BY with the vector index
+        order = distance + 0 if exact else "distance"
+        return query_obj.order_by(order).limit(top_k)
 
-            # Filter by confidence
-            if min_confidence:
-                allowed_confidences = confidence_levels.get(
-                    min_confidence, ["HIGH", "MEDIUM", "LOW"]
-                )
-                query_obj = query_obj.filter(
+    def apply_filters(
+        self, query_obj: Select, layers: list[str] | None, min_confidence: str | None
+    ) -> Select:
+        """Add the layer and confidence filters to a document_chunks query."""
+        # Filter by layers if specified
+        if layers:
+            filter_array = cast(layers, ARRAY(String))
+            query_obj = query_obj.where(
+                DocumentChunk.relevant_layers.op("&&")(filter_array)
+            )
+
+        # Filter by confidence
+        allowed_confidences = self.allowed_confidences(min_confidence)
+        if allowed_confidences:
+            if self.has_confidence_rank:
+                min_rank = min(CONFIDENCE_RANKS[level] for level in allowed_confidences)
+                query_obj = query_obj.where(DocumentChunk.confidence_rank >= min_rank)
+            else:
+                query_obj = query_obj.where(
                     DocumentChunk.confidence.in_(allowed_confidences)
                 )
+        return query_obj
 
-            # Execute query
-            results = query_obj.order_by("distance").limit(top_k).all()
-
-            # Format results
-            chunks = []
-            for chunk, distance in results:
-                chunks.append(
-                    {
-                        "chunk_id": chunk.chunk_id,
-                        "text": chunk.text,
-                        "similarity_score": 1 - distance,
-                        "distance": distance,
-                        "filename": chunk.filename,
-                        "confidence": chunk.confidence,
-                        "relevant_layers": chunk.relevant_layers or [],
-                        "key_findings": chunk.key_findings,
-                        "locations": chunk.locations or [],
-                        "slr_projections": chunk.slr_projections or [],
-                        "measurements": chunk.measurements or [],
-                        "timeframes": chunk.timeframes or [],
-                        "reasoning": chunk.reasoning,
-                    }
+    def build_hybrid_query(
+        self,
+        query: str,
+        query_embedding: list[float] | np.ndarray,
+        top_k: int,
+        layers: list[str] | None,
+        min_confidence: str | None,
+        include_details: bool = False,
+        exact: bool = False,
+        with_embeddings: bool = False,
+    ) -> Select:
+        """
+        Fuse vector and full-text rankings with reciprocal rank fusion in one query.
+
+        Each side contributes its best top_k * candidate_factor filtered matches;
+        rows are ordered by the sum of 1 / (rrf_k + rank) over the lists they
+        appear in. Falls back to the vector query when the question has no
+        searchable words.
+        """
+        ts_input = or_tsquery(query)
+        if ts_input is None:
+            return self.build_retrieval_query(
+                query_embedding,
+                top_k,
+                layers,
+                min_confidence,
+                include_details,
+                exact,
+                with_embeddings,
+            )
+
+        candidates = top_k * self.hybrid_settings.candidate_factor
+        rrf_k = self.hybrid_settings.rrf_k
+        distance = DocumentChunk.embedding.cosine_distance(query_embedding)
+
+        vector_hits = (
+            self.apply_filters(
+                select(DocumentChunk.id, distance.label("distance")),
+                layers,
+                min_confidence,
+            )
+            .order_by(distance + 0 if exact else "distance")
+            .limit(candidates)
+            .subquery("vector_hits")
+        )
+        vector_ranked = select(
+            vector_hits.c.id,
+            func.row_number().over(order_by=vector_hits.c.distance).label("rank"),
+        ).cte("vector_ranked")
+
+        ts_query = func.to_tsquery(TEXT_SEARCH_CONFIG, ts_input)
+        lexical_rank = func.ts_rank_cd(DocumentChunk.text_search, ts_query)
+        lexical_hits = (
+            self.apply_filters(
+                select(DocumentChunk.id, lexical_rank.label("lexical_rank")).where(
+                    DocumentChunk.text_search.op("@@")(ts_query)
+                ),
+                layers,
+                min_confidence,
+            )
+            .order_by(lexical_rank.desc())
+            .limit(candidates)
+            .subquery("lexical_hits")
+        )
+        lexical_ranked = select(
+            lexical_hits.c.id,
+            func.row_number()
+            .over(order_by=lexical_hits.c.lexical_rank.desc())
+            .label("rank"),
+        ).cte("lexical_ranked")
+
+        fused = (
+            select(
+                func.coalesce(vector_ranked.c.id, lexical_ranked.c.id).label("id"),
+                cast(
+                    func.coalesce(1.0 / (rrf_k + vector_ranked.c.rank), 0.0)
+                    + func.coalesce(1.0 / (rrf_k + lexical_ranked.c.rank), 0.0),
+                    Float,
+                ).label("fusion_score"),
+            )
+            .select_from(
+                vector_ranked.join(
+                    lexical_ranked, vector_ranked.c.id == lexical_ranked.c.id, full=True
                 )
+            )
+            .cte("fused")
+        )
+
+        columns = self.result_columns(include_details, with_embeddings)
+        return (
+            select(*columns, distance.label("distance"), fused.c.fusion_score)
+            .join_from(fused, DocumentChunk, DocumentChunk.id == fused.c.id)
+            .order_by(fused.c.fusion_score.desc())
+            .limit(top_k)
+        )
+
+    def build_lexical_query(
+        self,
+        query: str,
+        top_k: int,
+        layers: list[str] | None,
+        min_confidence: str | None,
+        include_details: bool = False,
+        with_embeddings: bool = False,
+    ) -> Select:
+        """
+        Full-text-only retrieval, used before embedding term-heavy questions.
 
-            return chunks
+        The distance column is 1 - normalized ts_rank_cd, so lexical matches
+        report a similarity score like vector matches do.
+        """
+        ts_query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, strip_okina(query))
+        # Normalization 32 scales the rank to rank / (rank + 1), i.e. into [0, 1)
+        lexical_rank = func.ts_rank_cd(DocumentChunk.text_search, ts_query, 32)
+        columns = self.result_columns(include_details, with_embeddings)
+        query_obj = select(*columns, (1 - lexical_rank).label("distance")).where(
+            DocumentChunk.text_search.op("@@")(ts_query)
+        )
+        return (
+            self.apply_filters(query_obj, layers, min_confidence)
+            .order_by(lexical_rank.desc())
+            .limit(top_k)
+        )
+
+    def build_search_query(
+        self,
+        query: str,
+        query_embedding: list[float] | np.ndarray,
+        top_k: int,
+        layers: list[str] | None,
+        min_confidence: str | None,
+        include_details: bool = False,
+        exact: bool = False,
+        with_embeddings: bool = False,
+    ) -> Select:
+        """The hybrid query when full-text search is available, else the vector query"""
+        if self.use_hybrid:
+            return self.build_hybrid_query(
+                query,
+                query_embedding,
+                top_k,
+                layers,
+                min_confidence,
+                include_details,
+                exact,
+                with_embeddings,
+            )
+        return self.build_retrieval_query(
+            query_embedding,
+            top_k,
+            layers,
+            min_confidence,
+            include_details,
+            exact,
+            with_embeddings,
+        )
+
+    def lexical_match_is_confident(self, results: Any, top_k: int) -> bool:
+        """Whether lexical-only results are good enough to skip the embedding."""
+        if len(results) < top_k:
+            return False
+        best_rank = 1 - results[0].distance
+        if best_rank < self.hybrid_settings.lexical_confidence:
+            return False
+        self.lexical_only_answers += 1
+        print(
+            f"🔤 Confident full-text match (rank {best_rank:.2f}), "
+            "skipping the embedding"
+        )
+        return True
+
+    @property
+    def use_hybrid(self) -> bool:
+        return self.hybrid_settings.mode == "hybrid" and self.has_text_search
+
+    def plan_retrieval(
+        self, top_k: int, layers: list[str] | None, min_confidence: str | None
+    ) -> tuple[RetrievalPlan, list[Any]]:
+        """
+        Choose exact or approximate search for the query's filters.
+
+        Returns:
+            The plan and the SET LOCAL statements to run before the query (none
+            for exact search)
+        """
+        plan = self.planner.plan(layers, self.allowed_confidences(min_confidence))
+        if plan.exact:
+            return plan, []
+
+        settings = self.index_settings
+        lists = self.ivfflat_lists or 100
+        statements = search_settings(
+            settings,
+            filtered=bool(layers or min_confidence),
+            lists=self.ivfflat_lists,
+            ef_search=self.planner.widen(
+                settings.ef_search, top_k, plan.selectivity, MAX_EF_SEARCH
+            ),
+            probes=self.planner.widen(
+                settings.probes or default_probes(lists), 1, plan.selectivity, lists
+            ),
+            iterative_scan=self.has_iterative_scan,
+        )
+        return plan, statements
+
+    def check_pgvector_version(self, version: str | None) -> None:
+        """Enable iterative scans if the installed pgvector has them"""
+        self.has_iterative_scan = supports_iterative_scan(version)
+        if not self.has_iterative_scan and self.index_settings.iterative_scan != "off":
+            print(
+                f"⚠️ pgvector {version or 'not installed'} has no iterative scans "
+                "(0.8+), filtered queries may return fewer rows"
+            )
+
+    def needs_exact_fallback(
+        self, plan: RetrievalPlan, top_k: int, returned: int
+    ) -> bool:
+        """Whether an approximate search came back short of rows that exist."""
+        if plan.exact or returned >= top_k or returned >= plan.estimated_rows:
+            return False
+        self.planner.record_fallback()
+        print(
+            f"↩️ Approximate search returned {returned}/{top_k} rows, re-running exactly"
+        )
+        return True
+
+    def format_chunks(
+        self, results: Any, include_details: bool = False, sort_by_distance: bool = True
+    ) -> list[RetrievedChunk]:
+        """Convert projected rows into RetrievedChunk records."""
+        chunks = [
+            RetrievedChunk(**row._mapping, details_loaded=include_details)
+            for row in results
+        ]
+        # Iterative scans in relaxed_order mode may return rows slightly out of order;
+        # fused and lexical results are already in their final order
+        if sort_by_distance:
+            chunks.sort(key=lambda chunk: chunk.distance)
+        return chunks
+
+    def build_details_query(self, chunks: list[RetrievedChunk]) -> Select:
+        """Select the heavy columns for chunks retrieved without them."""
+        return select(DocumentChunk.id, *DETAIL_COLUMNS).where(
+            DocumentChunk.id.in_([chunk.id for chunk in chunks])
+        )
+
+    def apply_details(self, chunks: list[RetrievedChunk], rows: Any) -> None:
+        """Fill the heavy fields of chunks from build_details_query rows."""
+        details = {row.id: row for row in rows}
+        for chunk in chunks:
+            row = details.get(chunk.id)
+            if row is not None:
+                chunk.reasoning = row.reasoning
+                chunk.timeframes = row.timeframes or []
+                chunk.source_file = row.source_file
+            chunk.details_loaded = True
+
+    def pack_context(
+        self,
+        chunks: list[RetrievedChunk],
+        chat_context: ChatContext,
+        map_state: MapState,
+    ) -> PackedContext:
+        """Fit map state, sources and chat history into the prompt token budget."""
+        return self.context_packer.pack(chunks, chat_context, map_state)
+
+    def prepare_prompt(
+        self,
+        query: str,
+        chunks: list[RetrievedChunk],
+        chat_context: ChatContext,
+        map_state: MapState,
+    ) -> tuple[list[dict[str, str]], PackedContext]:
+        """
+        Pack the context and build the answer messages.
+
+        Returns:
+            The static system prompt followed by the per-request user message,
+            and the packed context, whose token counts are completed with the
+            fixed instructions and the prompt total
+        """
+        packed = self.pack_context(chunks, chat_context, map_state)
+        prompt = self.build_context_prompt(query, packed, map_state)
+        total = self.system_prompt_tokens + self.context_packer.counter.count(prompt)
+        packed.tokens["instructions"] = total - sum(packed.tokens.values())
+        packed.tokens["total"] = total
+        if packed.truncated_chunks or len(packed.chunks) < len(chunks):
+            print(
+                f"✂️ Packed {len(packed.chunks)}/{len(chunks)} sources into "
+                f"{total} prompt tokens "
+                f"({packed.truncated_chunks} truncated)"
+            )
+        return chat_messages(prompt, ANSWER_SYSTEM_PROMPT), packed
 
     def build_context_prompt(
-        self, query: str, chunks: list[dict[str, Any]], chat_context: ChatContext, map_state: MapState
+        self, query: str, packed: PackedContext, map_state: MapState
     ) -> str:
         """
-        Build the context prompt from retrieved chunks.
+        Build the per-request part of the answer prompt from the packed sections.
+
+        The instructions live in ANSWER_SYSTEM_PROMPT, which is sent first so
+        the provider can serve it from its prompt cache.
 
         Args:
             query: User's question
-            chunks: Retrieved document chunks
-            chat_context: Chat context
+            packed: Sources, chat history and map state fitted to the token budget
             map_state: Map state
 
         Returns:
             Formatted prompt string
         """
-        # Build context from chunks
-        context_parts = []
-        for i, chunk in enumerate(chunks, 1):
-            context_parts.append(f"=== SOURCE {i} ===")
-            context_parts.append(f"Document: {chunk['filename']}")
-            context_parts.append(f"Confidence: {chunk['confidence']}")
-            if chunk['relevant_layers']:
-                context_parts.append(
-                    f"Relevant Layers: {', '.join(chunk['relevant_layers'])}"
-                )
-            if chunk['locations']:
-                context_parts.append(f"Locations: {', '.join(chunk['locations'])}")
-            if chunk['slr_projections']:
-                context_parts.append(
-                    f"SLR Projections: {', '.join(chunk['slr_projections'])}"
-                )
-            if chunk['measurements']:
-                context_parts.append(
-                    f"Measurements: {', '.join(chunk['measurements'])}"
-                )
-            if chunk['key_findings']:
-                context_parts.append(f"Key Findings: {chunk['key_findings']}")
+        return f"""=== RETRIEVED SCIENTIFIC LITERATURE ===
+{packed.sources}
 
-            context_parts.append(f"\nText:\n{chunk['text']}\n")
-            context_parts.append("-" * 80 + "\n")
+=== CURRENT MAP STATE ===
+{packed.map_state}
+Current sea level rise increment: {map_state.foot_increment} ft above MHHW \
+(Mean Higher High Water, baseline year 2000)
 
-        context = "\n".join(context_parts)
+=== CONVERSATION CONTEXT ===
+{packed.history}
 
-        chat_history = f"Chat History: {chat_context.messages}"
-        basemap_info = f"Current Basemap: {map_state.basemap_name}"
-        if map_state.active_layers:
-            layer_info = "Currently displayed layers:\n"
-            for layer in map_state.active_layers:
-                layer_info += f"    {layer}\n"
-        else:
-            layer_info = "No layers currently displayed."
+=== YOUR ROLE ===
 
-        # Build the full prompt
-        prompt = f"""You are the built-in AI assistant for the CRC Climate Viewer—an interactive web map showing sea level rise and coastal flooding data for Hawaii. You are not a separate tool; you are part of the viewer itself. When a user asks about a flood type or location, you respond AS IF you are already acting on the map (adding layers, zooming in, etc.), and you explain the science behind what they're seeing. Your job is to make scientific research about sea level rise and coastal flooding easy to understand for everyone—from students to homeowners to policymakers.
+Answer the user's question in a friendly, conversational way: **{query}**
 
-=== RETRIEVED SCIENTIFIC LITERATURE ===
-{context}
+=== NOW ANSWER THE QUESTION ===
 
-=== CURRENT MAP STATE ===
-{basemap_info}
-{layer_info}
-Current sea level rise increment: {map_state.foot_increment} ft above MHHW (Mean Higher High Water, baseline year 2000)
-
-=== SEA LEVEL RISE SCENARIOS & FOOT INCREMENTS ===
-
-The viewer uses foot increments (above the 2000 baseline) to represent sea level rise scenarios from the 2022 Hawaiʻi Sea Level Rise Technical Report. Two scenarios are available. The year projections below are based on local projections for Moku O Loʻe Island (Coconut Island) — timing may vary slightly by location across the islands:
-
-**Intermediate Scenario:**
-| Feet above MHHW | Approximate Year |
-|-----------------|-----------------|
-| 0 ft            | Baseline (2000) |
-| 1 ft            | ~2050           |
-| 2 ft            | ~2075           |
-| 3 ft            | ~2100           |
-| 4 ft            | ~2100           |
-| 5 ft            | ~2125           |
-| 6 ft            | ~2125           |
-| 7 ft            | ~2150           |
-| 8 ft            | ~2150           |
-| 9 ft            | beyond 2150     |
-| 10 ft           | beyond 2150     |
-
-**Intermediate-High Scenario** (more aggressive — dates arrive sooner):
-| Feet above MHHW | Approximate Year       |
-|-----------------|------------------------|
-| 0 ft            | Baseline (2000)        |
-| 1 ft            | ~2040                  |
-| 2 ft            | ~2060                  |
-| 3 ft            | between 2060 and 2080  |
-| 4 ft            | ~2080                  |
-| 5 ft            | between 2080 and 2100  |
-| 6 ft            | ~2100                  |
-| 7 ft            | ~2150                  |
-| 8 ft            | between 2150 and beyond|
-| 9 ft            | beyond 2150            |
-| 10 ft           | beyond 2150            |
-
-When discussing sea level rise timing, use these tables to give accurate year estimates. If the user asks about a specific year (e.g., "by 2100"), look up the corresponding foot increment and mention it. If the user asks about a specific foot level, mention what year it corresponds to under each scenario.
-
-=== LAYER DEFINITIONS (for reference) ===
-
-**FLOODING TYPES**:
-
-1. **passive_marine_flooding** - Ocean water flooding the land as sea levels rise
-2. **groundwater_inundation** - Flooding from groundwater rising to the surface
-3. **low_lying_flooding** - Low-elevation areas vulnerable to flooding
-4. **compound_flooding** - Multiple types of flooding happening at once
-5. **drainage_backflow** - Storm drains and sewers backing up during floods
-
-**COASTAL HAZARDS**:
-
-6. **future_erosion_hazard_zone** - Areas where beaches/shorelines are eroding
-7. **annual_high_wave_flooding** - Coastal flooding from large waves
-8. **emergent_and_shallow_groundwater** - Groundwater very close to the surface
+Begin your response: """
 
-=== CONVERSATION CONTEXT ===
-{chat_history}
+    def build_rag_response(
+        self,
+        answer: str | None,
+        chunks: list[RetrievedChunk],
+        query: str,
+        layers: list[str] | None,
+        min_confidence: str,
+        detected_layers: list[str] | None,
+        packed: PackedContext | None = None,
+        cached_tokens: int | None = None,
+    ) -> RAGResponse:
+        """
+        Format the answer, sources and metadata into a RAGResponse.
 
-=== YOUR ROLE ===
+        When the prompt was packed, the sources are the chunks that made it into
+        the prompt and the metadata reports the tokens used per section.
+        """
+        metadata = RAGMetadata(
+            chunks_retrieved=len(chunks),
+            model=self.model,
+            embedding_model=self.embedding_model,
+            query=query,
+            filters={"layers": layers, "min_confidence": min_confidence},
+            auto_detected_layers=detected_layers,
+            chunks_in_prompt=len(packed.chunks) if packed else None,
+            prompt_tokens=packed.tokens if packed else None,
+            cached_prompt_tokens=cached_tokens,
+        )
+        if packed is not None:
+            chunks = packed.chunks
 
-Answer the user's question in a friendly, conversational way: **{query}**
+        if not chunks:
+            return RAGResponse(
+                response=(
+                    "No relevant information found in the database for this query."
+                ),
+                sources=[],
+                metadata=metadata,
+            )
 
-=== HOW TO RESPOND ===
+        sources = [
+            RAGSource(
+                source_number=i + 1,
+                filename=chunk.filename,
+                confidence=chunk.confidence,
+                layers=chunk.relevant_layers,
+                similarity_score=round(chunk.similarity_score, 4),
+                locations=chunk.locations,
+                measurements=chunk.measurements,
+                text_preview=chunk.text[:200] + "...",
+            )
+            for i, chunk in enumerate(chunks)
+        ]
 
-**Key principle:** You ARE the map viewer. When a user asks to see something, respond as if you are already displaying it—say "I'm showing you..." or "I've added the layer for..." rather than "go to the viewer" or "look for that tool." The map actions (layer changes, zoom, etc.) happen automatically alongside your response.
+        return RAGResponse(response=answer or "", sources=sources, metadata=metadata)
 
-**Tone & Style:**
-- Write like you're explaining to a curious friend, not writing a research paper
-- Use everyday language, but keep the science accurate
-- Break down complex ideas into simple terms
-- Be helpful and empathetic—people care about this because it affects their homes and communities
+    def build_response_from_retrieval(
+        self,
+        answer: str | None,
+        query: str,
+        retrieval: RetrievalResult,
+        packed: PackedContext | None = None,
+        cached_tokens: int | None = None,
+    ) -> RAGResponse:
+        """build_rag_response for a RetrievalResult."""
+        return self.build_rag_response(
+            answer,
+            retrieval.chunks,
+            query,
+            retrieval.layers,
+            retrieval.min_confidence,
+            retrieval.detected_layers,
+            packed,
+            cached_tokens,
+        )
 
-**Content Structure:**
-1. **Start with a direct answer** - Don't make people wait for the key information
-2. **Add supporting details** - Explain the "why" and "how" in simple terms
-3. **Include specific numbers** - Say "3 feet of flooding by 2050" not just "significant flooding"
-4. **Mention locations** - Help people understand if this affects their island/community
-5. **Be honest about uncertainty** - If scientists aren't 100% sure, say so
+    def print_response(self, result: RAGResponse):
+        """Pretty print a RAG response."""
+        print("\n" + "=" * 80)
+        print("ANSWER")
+        print("=" * 80)
+        print(result.response)
 
-**What to include:**
-✅ Specific measurements (e.g., "3.2 feet of sea level rise")
-✅ Timeframes (e.g., "by 2100" or "in the next 30 years")
-✅ Hawaiian locations (e.g., "Waikiki, Honolulu, Maui")
-✅ What this means practically (e.g., "This could affect coastal roads and buildings")
-✅ Source attribution when important (e.g., "Research from UH found that...")
+        print("\n" + "=" * 80)
+        print(f"SOURCES ({len(result.sources)} documents)")
+        print("=" * 80)
 
-**What to avoid:**
-❌ Jargon without explanation (don't say "NAVD88" unless you explain it)
-❌ Vague statements (not "significant impacts" but "flooding up to 2 feet deep")
-❌ Information not in the sources (don't make things up or guess)
-❌ Directing users to go somewhere else (e.g., "visit the climate viewer" or "open the tool")—you ARE the viewer
-❌ Referring to yourself or the map as a separate system the user needs to navigate to
+        for source in result.sources:
+            print(f"\n[{source.source_number}] {source.filename}")
+            print(f"    Confidence: {source.confidence}")
+            print(f"    Similarity: {source.similarity_score:.4f}")
+            print(f"    Layers: {', '.join(source.layers)}")
+            if source.locations:
+                print(f"    Locations: {', '.join(source.locations)}")
+            if source.measurements:
+                print(f"    Measurements: {', '.join(source.measurements[:3])}...")
 
-**If the sources don't answer the question:**
-- Be honest: "The research I have doesn't cover that specific question."
-- Offer what you do know: "But here's what I can tell you about [related topic]..."
-- Suggest clarification: "Could you ask about [specific aspect]?"
+        print("\n" + "=" * 80)
+        print("METADATA")
+        print("=" * 80)
+        print(f"Model: {result.metadata.model}")
+        print(f"Chunks Retrieved: {result.metadata.chunks_retrieved}")
+        if result.metadata.prompt_tokens:
+            print(f"Prompt Tokens: {result.metadata.prompt_tokens}")
+        if result.metadata.cached_prompt_tokens is not None:
+            print(f"Cached Prompt Tokens: {result.metadata.cached_prompt_tokens}")
+        print(f"Filters: {result.metadata.filters}")
+        if result.metadata.auto_detected_layers:
+            detected = ", ".join(result.metadata.auto_detected_layers)
+            print(f"Auto-detected Layers: {detected}")
 
-**Example good responses:**
 
-Query: "Show me groundwater inundation in Waikiki"
-Good: "I'm showing you groundwater inundation in Waikiki on the map now. This type of flooding happens when rising sea levels push the underground water table up to the surface—so the ground itself becomes waterlogged, even without rain or waves. In Waikiki, low-lying areas near the inland side of the beach are especially vulnerable. Would you like me to explain more about how groundwater inundation works or compare it to other flood types?"
+class ClimateRAGSystem(BaseClimateRAGSystem):
+    """
+    RAG system for querying climate literature using SQLAlchemy and GPT-4o.
+    """
 
-Query: "What is marine flooding?"
-Good: "I've pulled up the marine flooding layer on the map so you can see the affected areas. Marine flooding—also called passive inundation—happens when rising sea levels cause ocean water to simply overflow onto land, even without storms or waves. Think of it like a bathtub slowly filling up. Research from the University of Hawaii shows that with 3 feet of sea level rise (expected by 2060-2080), significant coastal areas in Hawaii could see regular marine flooding, especially during high tides."
+    def __init__(
+        self,
+        database_url: str | None = None,
+        model: str = "gpt-4o",
+        embedding_model: str = "text-embedding-3-small",
+        client: OpenAI | None = None,
+        engine: Engine | None = None,
+    ):
+        """
+        Initialize the RAG system.
 
-Query: "Will Waikiki flood?"
-Good: "Yes, Waikiki is vulnerable to flooding from sea level rise—I'm zooming in so you can see the affected areas. Research from the University of Hawaii shows that with 3 feet of sea level rise (expected by 2060-2080), significant parts of Waikiki could experience regular flooding, especially during high tides and storms. This includes areas near the beach and some inland streets."
+        Args:
+            database_url: PostgreSQL connection URL (defaults to env var)
+            model: GPT model for response synthesis
+            embedding_model: Model for generating query embeddings
+            client: Shared OpenAI client (defaults to the process-wide client)
+            engine: Shared SQLAlchemy engine (defaults to a new pooled engine)
+        """
+        super().__init__(model=model, embedding_model=embedding_model)
+        self.client = client or get_openai_client()
 
-=== NOW ANSWER THE QUESTION ===
+        # Setup database connection
+        self.engine = engine or create_db_engine(database_url)
+        self.SessionLocal = sessionmaker(bind=self.engine)
 
-Remember: Be clear, specific, and helpful. Your goal is to help people understand what the science says and what it means for Hawaii.
+    def warm_up(self) -> None:
+        """
+        Prepare the system for the first request.
 
-Begin your response: """
+        Fills the connection pool, pulls the vector index into shared buffers with
+        a single ANN lookup and opens the keep-alive connection to OpenAI.
+        """
+        opened = warm_up_pool(self.engine)
+        print(f"🔥 Opened {opened} database connections")
+
+        with self.engine.connect() as conn:
+            conn.execute(WARM_UP_QUERY)
+            indexes = describe_indexes(conn.execute(VECTOR_INDEXES_QUERY).all())
+            self.has_confidence_rank = bool(
+                conn.execute(HAS_CONFIDENCE_RANK_QUERY).scalar()
+            )
+            self.has_text_search = bool(conn.execute(HAS_TEXT_SEARCH_QUERY).scalar())
+            self.check_pgvector_version(conn.execute(PGVECTOR_VERSION_QUERY).scalar())
+        self.ivfflat_lists = ivfflat_list_count(indexes)
+        print("🔥 Touched document_chunks vector index")
+        self.refresh_filter_stats()
+
+        try:
+            self.client.models.retrieve(self.embedding_model)
+            print("🔥 Opened OpenAI connection")
+        except Exception as e:
+            print(f"⚠️ OpenAI warm-up failed: {e}")
+
+    def close(self) -> None:
+        """Release pooled database connections."""
+        self.engine.dispose()
+
+    def generate_embedding(self, text: str) -> list[float]:
+        """Generate embedding for query text."""
+        response = self.client.embeddings.create(input=text, model=self.embedding_model)
+        return response.data[0].embedding
+
+    def retrieve_chunks(
+        self,
+        query: str,
+        top_k: int = 10,
+        layers: list[str] | None = None,
+        min_confidence: str | None = "MEDIUM",
+        include_details: bool = False,
+    ) -> list[RetrievedChunk]:
+        """
+        Retrieve relevant chunks from the database.
+
+        Args:
+            query: User's question
+            top_k: Number of chunks to retrieve
+            layers: Optional list of climate layers to filter by
+            min_confidence: Minimum confidence level (HIGH, MEDIUM, LOW)
+            include_details: Also fetch reasoning, timeframes and source_file
 
-        return prompt
+        Returns:
+            List of RetrievedChunk records ordered by similarity
+        """
+        # Over-fetch candidates with their embeddings for diversification
+        fetch_k = self.diversifier.candidate_count(top_k)
+        with_embeddings = self.diversifier.enabled
+
+        # Term-heavy questions may be answered by full-text search alone
+        if self.use_hybrid and has_exact_terms(query):
+            with self.SessionLocal() as session:
+                statement = self.build_lexical_query(
+                    query,
+                    fetch_k,
+                    layers,
+                    min_confidence,
+                    include_details,
+                    with_embeddings,
+                )
+                results = session.execute(statement).all()
+            if self.lexical_match_is_confident(results, top_k):
+                chunks = self.format_chunks(
+                    results, include_details, sort_by_distance=False
+                )
+                return self.diversifier.select(chunks, top_k)
+
+        # Generate query embedding
+        query_embedding = self.generate_embedding(query)
+
+        if self.planner.needs_refresh():
+            self.refresh_filter_stats()
+        plan, settings = self.plan_retrieval(fetch_k, layers, min_confidence)
+
+        with self.SessionLocal() as session:
+            for setting in settings:
+                session.execute(setting)
+            statement = self.build_search_query(
+                query,
+                query_embedding,
+                fetch_k,
+                layers,
+                min_confidence,
+                include_details,
+                plan.exact,
+                with_embeddings,
+            )
+            results = session.execute(statement).all()
+
+            if self.needs_exact_fallback(plan, top_k, len(results)):
+                statement = self.build_search_query(
+                    query,
+                    query_embedding,
+                    fetch_k,
+                    layers,
+                    min_confidence,
+                    include_details,
+                    True,
+                    with_embeddings,
+                )
+                results = session.execute(statement).all()
+
+        chunks = self.format_chunks(
+            results, include_details, sort_by_distance=not self.use_hybrid
+        )
+        return self.diversifier.select(chunks, top_k)
+
+    def refresh_filter_stats(self) -> None:
+        """Reload the per-layer and per-confidence row counts used by the planner."""
+        try:
+            with self.engine.connect() as conn:
+                self.planner.load(
+                    conn.execute(LAYER_STATS_QUERY).all(),
+                    conn.execute(CONFIDENCE_STATS_QUERY).all(),
+                )
+        except Exception as e:
+            print(f"⚠️ Could not load filter statistics: {e}")
+            self.planner.load([], [])
+
+    def load_details(self, chunks: list[RetrievedChunk]) -> list[RetrievedChunk]:
+        """Fetch the heavy fields of chunks retrieved without them, in one query."""
+        missing = [chunk for chunk in chunks if not chunk.details_loaded]
+        if missing:
+            with self.SessionLocal() as session:
+                self.apply_details(
+                    missing, session.execute(self.build_details_query(missing)).all()
+                )
+        return chunks
 
     def generate_response(
         self,
@@ -435,21 +1099,18 @@ Begin your response: """
         Args:
             query: User's question
             top_k: Number of chunks to retrieve
-            layers: Optional layer filter (if None and auto_detect_layers=True, will auto-detect)
+            layers: Optional layer filter (if None and auto_detect_layers=True,
+                will auto-detect)
             min_confidence: Minimum confidence level
-            temperature: GPT temperature (0 = deterministic, best for definition/testing)
-            auto_detect_layers: If True and layers=None, automatically detect layers from query
+            temperature: GPT temperature (0 = deterministic, best for
+                definition/testing)
+            auto_detect_layers: If True and layers=None, automatically detect layers
+                from query
 
         Returns:
             Dictionary with answer, sources, and metadata
         """
-        # Auto-detect layers if enabled and no layers provided
-        detected_layers = None
-        if auto_detect_layers and layers is None:
-            detected_layers = self.detect_layers_from_query(query)
-            if detected_layers:
-                print(f"🔍 Auto-detected layers: {', '.join(detected_layers)}")
-                layers = detected_layers
+        layers, detected_layers = self.resolve_layers(query, layers, auto_detect_layers)
 
         # Step 1: Retrieve relevant chunks
         print(f"🔍 Retrieving top {top_k} chunks...")
@@ -464,89 +1125,501 @@ Begin your response: """
         )
 
         if not chunks:
-            return RAGResponse(
-                response="No relevant information found in the database for this query.",
-                sources=[],
-                metadata=RAGMetadata(
-                    chunks_retrieved=0,
-                    model=self.model,
-                    embedding_model=self.embedding_model,
-                    query=query,
-                    filters={"layers": layers, "min_confidence": min_confidence},
-                    auto_detected_layers=detected_layers
-                )
+            return self.build_rag_response(
+                None, chunks, query, layers, min_confidence, detected_layers
             )
 
         print(f"✅ Retrieved {len(chunks)} chunks")
 
         # Step 2: Build prompt with context
         print("📝 Building context prompt...")
-        prompt = self.build_context_prompt(query, chunks, context, map_state)
+        messages, packed = self.prepare_prompt(query, chunks, context, map_state)
 
         # Step 3: Generate response with GPT-4o
         print(f"🤖 Generating response with {self.model}...")
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=messages,
             temperature=temperature,
         )
 
         answer = response.choices[0].message.content
+        cached = self.prompt_cache.record("answer", response.usage)
 
         # Step 4: Format response
-        result = {
-            "answer": answer,
-            "sources": [
-                {
-                    "source_number": i + 1,
-                    "filename": chunk["filename"],
-                    "confidence": chunk["confidence"],
-                    "layers": chunk["relevant_layers"],
-                    "similarity_score": round(chunk["similarity_score"], 4),
-                    "locations": chunk["locations"],
-                    "measurements": chunk["measurements"],
-                    "text_preview": chunk["text"][:200] + "...",
-                }
-                for i, chunk in enumerate(chunks)
-            ],
-            "metadata": {
-                "chunks_retrieved": len(chunks),
-                "model": self.model,
-                "embedding_model": self.embedding_model,
-                "query": query,
-                "filters": {"layers": layers, "min_confidence": min_confidence},
-                "auto_detected_layers": detected_layers,
+        return self.build_rag_response(
+            answer,
+            chunks,
+            query,
+            layers,
+            min_confidence,
+            detected_layers,
+            packed,
+            cached,
+        )
+
+
+class AsyncClimateRAGSystem(BaseClimateRAGSystem):
+    """
+    Async RAG system using AsyncOpenAI and an asyncpg-backed AsyncEngine.
+    """
+
+    def __init__(
+        self,
+        database_url: str | None = None,
+        model: str = "gpt-4o",
+        embedding_model: str = "text-embedding-3-small",
+        client: AsyncOpenAI | None = None,
+        engine: AsyncEngine | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        embedding_batcher: EmbeddingBatcher | None = None,
+    ):
+        """
+        Initialize the async RAG system.
+
+        Args:
+            database_url: PostgreSQL connection URL (defaults to env var)
+            model: GPT model for response synthesis
+            embedding_model: Model for generating query embeddings
+            client: Shared AsyncOpenAI client (defaults to the process-wide client)
+            engine: Shared AsyncEngine (defaults to a new pooled asyncpg engine)
+            embedding_cache: Query embedding cache (defaults to one configured from
+                env vars)
+            embedding_batcher: Micro-batcher for embeddings calls (defaults to one
+                configured from env vars)
+        """
+        super().__init__(model=model, embedding_model=embedding_model)
+        self.client = client or get_async_openai_client()
+
+        # Setup database connection
+        self.engine = engine or create_async_db_engine(database_url)
+        self.SessionLocal = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        self.embedding_cache = embedding_cache or self._create_embedding_cache()
+
+        # Cache misses from concurrent requests are embedded in shared API calls
+        self.embedding_batcher = embedding_batcher or EmbeddingBatcher(
+            self.client,
+            self.embedding_model,
+            max_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+            max_wait_ms=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "10")),
+        )
+
+        # Identical concurrent embedding and retrieval calls share one execution
+        self.embedding_flights: SingleFlight[np.ndarray] = SingleFlight()
+        self.retrieval_flights: SingleFlight[list[RetrievedChunk]] = SingleFlight()
+        self.stats_flights: SingleFlight[None] = SingleFlight()
+
+    def _create_embedding_cache(self) -> EmbeddingCache:
+        """
+        Build the embedding cache from environment variables.
+
+        EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_MAX_MB and EMBEDDING_CACHE_TTL bound the
+        in-memory tier; EMBEDDING_CACHE_PERSIST enables the shared Postgres tier,
+        whose rows are capped by EMBEDDING_CACHE_STORE_MAX_ROWS and EMBEDDING_CACHE_TTL.
+        """
+        ttl = float(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+        store = None
+        if os.getenv("EMBEDDING_CACHE_PERSIST", "true").lower() in ("1", "true", "yes"):
+            store = PostgresEmbeddingStore(
+                self.engine,
+                ttl_seconds=int(ttl) or None,
+                max_rows=int(os.getenv("EMBEDDING_CACHE_STORE_MAX_ROWS", "100000"))
+                or None,
+            )
+        return EmbeddingCache(
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+            max_bytes=int(
+                float(os.getenv("EMBEDDING_CACHE_MAX_MB", "64")) * 1024 * 1024
+            ),
+            ttl_seconds=ttl or None,
+            store=store,
+        )
+
+    def get_stats(self) -> dict[str, Any]:
+        """Cache counters for the /stats endpoint."""
+        return {
+            "embedding_cache": self.embedding_cache.stats(),
+            "embedding_batcher": self.embedding_batcher.stats(),
+            "single_flight": {
+                "embeddings": self.embedding_flights.stats(),
+                "retrieval": self.retrieval_flights.stats(),
+            },
+            "retrieval_planner": self.planner.stats(),
+            "hybrid": {
+                "enabled": self.use_hybrid,
+                "lexical_only_answers": self.lexical_only_answers,
             },
+            "diversity": self.diversifier.stats(),
+            "prompt_cache": self.prompt_cache.stats(),
+            "layer_detection": self.layer_matcher.stats(),
         }
 
-        return RAGResponse(response=result["answer"], sources=result["sources"], metadata=result["metadata"])
+    async def warm_up(self) -> None:
+        """
+        Prepare the system for the first request.
 
-    def print_response(self, result: RAGResponse):
-        """Pretty print a RAG response."""
-        print("\n" + "=" * 80)
-        print("ANSWER")
-        print("=" * 80)
-        print(result.response)
+        Fills the connection pool, pulls the vector index into shared buffers with
+        a single ANN lookup and opens the keep-alive connection to OpenAI.
+        """
+        opened = await warm_up_async_pool(self.engine)
+        print(f"🔥 Opened {opened} database connections")
+
+        async with self.engine.connect() as conn:
+            await conn.execute(WARM_UP_QUERY)
+            indexes = describe_indexes((await conn.execute(VECTOR_INDEXES_QUERY)).all())
+            self.has_confidence_rank = bool(
+                (await conn.execute(HAS_CONFIDENCE_RANK_QUERY)).scalar()
+            )
+            self.has_text_search = bool(
+                (await conn.execute(HAS_TEXT_SEARCH_QUERY)).scalar()
+            )
+            self.check_pgvector_version(
+                (await conn.execute(PGVECTOR_VERSION_QUERY)).scalar()
+            )
+            if self.layer_classifier_enabled:
+                self.layer_matcher.load_centroids(
+                    (await conn.execute(LAYER_CENTROIDS_QUERY)).all()
+                )
+        self.ivfflat_lists = ivfflat_list_count(indexes)
+        print("🔥 Touched document_chunks vector index")
+        await self.refresh_filter_stats()
+
+        if isinstance(self.embedding_cache.store, PostgresEmbeddingStore):
+            try:
+                ready = await self.embedding_cache.store.is_ready()
+            except Exception as e:
+                print(f"⚠️ Could not check query_embedding_cache: {e}")
+                ready = False
+            if not ready:
+                print(
+                    "⚠️ query_embedding_cache missing or outdated, using the "
+                    "in-memory tier only (run python -m ai.vector_index ensure)"
+                )
+                self.embedding_cache.store = None
 
-        print("\n" + "=" * 80)
-        print(f"SOURCES ({len(result.sources)} documents)")
-        print("=" * 80)
+        try:
+            await self.client.models.retrieve(self.embedding_model)
+            print("🔥 Opened OpenAI connection")
+        except Exception as e:
+            print(f"⚠️ OpenAI warm-up failed: {e}")
 
-        for source in result.sources:
-            print(f"\n[{source.source_number}] {source.filename}")
-            print(f"    Confidence: {source.confidence}")
-            print(f"    Similarity: {source.similarity_score:.4f}")
-            print(f"    Layers: {', '.join(source.layers)}")
-            if source.locations:
-                print(f"    Locations: {', '.join(source.locations)}")
-            if source.measurements:
-                print(f"    Measurements: {', '.join(source.measurements[:3])}...")
+    async def close(self) -> None:
+        """Release pooled database connections."""
+        await self.engine.dispose()
 
-        print("\n" + "=" * 80)
-        print("METADATA")
-        print("=" * 80)
-        print(f"Model: {result.metadata.model}")
-        print(f"Chunks Retrieved: {result.metadata.chunks_retrieved}")
-        print(f"Filters: {result.metadata.filters}")
-        if result.metadata.auto_detected_layers:
-            print(f"Auto-detected Layers: {', '.join(result.metadata.auto_detected_layers)}")
+    async def generate_embedding(self, text: str) -> np.ndarray:
+        """
+        Generate embedding for query text, served from the cache when possible.
+
+        Concurrent requests for the same text wait on a single cache lookup, so a
+        burst of identical queries makes at most one embeddings API call.
+        """
+        return await self.embedding_flights.do(
+            cache_key(text, self.embedding_model),
+            lambda: self.embedding_cache.get_or_compute(
+                text, self.embedding_model, self._create_embedding
+            ),
+        )
+
+    async def _create_embedding(self, text: str) -> np.ndarray:
+        """Call the OpenAI embeddings API, batched with concurrent requests."""
+        return await self.embedding_batcher.embed(text)
+
+    async def retrieve_chunks(
+        self,
+        query: str,
+        top_k: int = 10,
+        layers: list[str] | None = None,
+        min_confidence: str | None = "MEDIUM",
+        include_details: bool = False,
+    ) -> list[RetrievedChunk]:
+        """
+        Retrieve relevant chunks from the database.
+
+        Args:
+            query: User's question
+            top_k: Number of chunks to retrieve
+            layers: Optional list of climate layers to filter by
+            min_confidence: Minimum confidence level (HIGH, MEDIUM, LOW)
+            include_details: Also fetch reasoning, timeframes and source_file
+
+        Returns:
+            List of RetrievedChunk records ordered by similarity
+        """
+        # Over-fetch candidates with their embeddings for diversification
+        fetch_k = self.diversifier.candidate_count(top_k)
+        with_embeddings = self.diversifier.enabled
+
+        # Term-heavy questions may be answered by full-text search alone
+        if self.use_hybrid and has_exact_terms(query):
+            async with self.SessionLocal() as session:
+                statement = self.build_lexical_query(
+                    query,
+                    fetch_k,
+                    layers,
+                    min_confidence,
+                    include_details,
+                    with_embeddings,
+                )
+                results = (await session.execute(statement)).all()
+            if self.lexical_match_is_confident(results, top_k):
+                chunks = self.format_chunks(
+                    results, include_details, sort_by_distance=False
+                )
+                return self.diversifier.select(chunks, top_k)
+
+        query_embedding = await self.generate_embedding(query)
+
+        if self.planner.needs_refresh():
+            await self.stats_flights.do("filter_stats", self.refresh_filter_stats)
+        plan, settings = self.plan_retrieval(fetch_k, layers, min_confidence)
+
+        async with self.SessionLocal() as session:
+            for setting in settings:
+                await session.execute(setting)
+            statement = self.build_search_query(
+                query,
+                query_embedding,
+                fetch_k,
+                layers,
+                min_confidence,
+                include_details,
+                plan.exact,
+                with_embeddings,
+            )
+            results = (await session.execute(statement)).all()
+
+            if self.needs_exact_fallback(plan, top_k, len(results)):
+                statement = self.build_search_query(
+                    query,
+                    query_embedding,
+                    fetch_k,
+                    layers,
+                    min_confidence,
+                    include_details,
+                    True,
+                    with_embeddings,
+                )
+                results = (await session.execute(statement)).all()
+
+        chunks = self.format_chunks(
+            results, include_details, sort_by_distance=not self.use_hybrid
+        )
+        return self.diversifier.select(chunks, top_k)
+
+    async def refresh_filter_stats(self) -> None:
+        """Reload the per-layer and per-confidence row counts used by the planner."""
+        try:
+            async with self.engine.connect() as conn:
+                layer_rows = (await conn.execute(LAYER_STATS_QUERY)).all()
+                confidence_rows = (await conn.execute(CONFIDENCE_STATS_QUERY)).all()
+            self.planner.load(layer_rows, confidence_rows)
+        except Exception as e:
+            print(f"⚠️ Could not load filter statistics: {e}")
+            self.planner.load([], [])
+
+    async def load_details(self, chunks: list[RetrievedChunk]) -> list[RetrievedChunk]:
+        """Fetch the heavy fields of chunks retrieved without them, in one query."""
+        missing = [chunk for chunk in chunks if not chunk.details_loaded]
+        if missing:
+            async with self.SessionLocal() as session:
+                result = await session.execute(self.build_details_query(missing))
+                self.apply_details(missing, result.all())
+        return chunks
+
+    async def retrieve_for_query(
+        self,
+        query: str,
+        top_k: int = 10,
+        layers: list[str] | None = None,
+        min_confidence: str = "MEDIUM",
+        auto_detect_layers: bool = True,
+    ) -> RetrievalResult:
+        """
+        Run layer detection and retrieval, the steps shared by every answer path.
+
+        Args:
+            query: User's question
+            top_k: Number of chunks to retrieve
+            layers: Optional layer filter (if None and auto_detect_layers=True,
+                will auto-detect)
+            min_confidence: Minimum confidence level
+            auto_detect_layers: If True and layers=None, automatically detect layers
+                from query
+
+        Returns:
+            RetrievalResult with the chunks and the filters that produced them
+        """
+        query_embedding = None
+        if auto_detect_layers and layers is None and self.needs_layer_classifier(query):
+            # Cached, so retrieve_chunks reuses it
+            query_embedding = await self.generate_embedding(query)
+        layers, detected_layers = self.resolve_layers(
+            query, layers, auto_detect_layers, query_embedding
+        )
+
+        flight_key = (
+            normalize_query(query),
+            top_k,
+            tuple(sorted(layers)) if layers else None,
+            min_confidence,
+        )
+        chunks = await self.retrieval_flights.do(
+            flight_key,
+            lambda: self.retrieve_chunks(
+                query=query,
+                top_k=top_k,
+                layers=layers,
+                min_confidence=min_confidence,
+            ),
+        )
+        if chunks:
+            print(f"✅ Retrieved {len(chunks)} chunks")
+
+        return RetrievalResult(
+            chunks=chunks,
+            layers=layers,
+            detected_layers=detected_layers,
+            min_confidence=min_confidence,
+        )
+
+    async def generate_answer(
+        self,
+        query: str,
+        retrieval: RetrievalResult,
+        context: ChatContext,
+        map_state: MapState,
+        temperature: float = 0.0,
+    ) -> RAGResponse:
+        """Synthesize an answer from already retrieved chunks."""
+        if not retrieval.chunks:
+            return self.build_response_from_retrieval(None, query, retrieval)
+
+        messages, packed = self.prepare_prompt(
+            query, retrieval.chunks, context, map_state
+        )
+
+        print(f"🤖 Generating response with {self.model}...")
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+        )
+
+        answer = response.choices[0].message.content
+        cached = self.prompt_cache.record("answer", response.usage)
+        return self.build_response_from_retrieval(
+            answer, query, retrieval, packed, cached
+        )
+
+    async def stream_answer(
+        self,
+        query: str,
+        retrieval: RetrievalResult,
+        context: ChatContext,
+        map_state: MapState,
+        temperature: float = 0.0,
+    ) -> AsyncIterator[str | RAGResponse]:
+        """
+        Stream an answer from already retrieved chunks.
+
+        Yields answer text deltas as they arrive from the model, then a final
+        RAGResponse holding the full answer, sources and metadata.
+        """
+        if not retrieval.chunks:
+            rag_response = self.build_response_from_retrieval(None, query, retrieval)
+            yield rag_response.response
+            yield rag_response
+            return
+
+        messages, packed = self.prepare_prompt(
+            query, retrieval.chunks, context, map_state
+        )
+
+        print(f"🤖 Streaming response with {self.model}...")
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            # The final event carries the usage, including cached prompt tokens
+            stream_options={"include_usage": True},
+        )
+
+        answer_parts = []
+        usage = None
+        async for event in stream:
+            if event.usage is not None:
+                usage = event.usage
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta.content
+            if delta:
+                answer_parts.append(delta)
+                yield delta
+
+        cached = self.prompt_cache.record("answer", usage)
+        yield self.build_response_from_retrieval(
+            "".join(answer_parts), query, retrieval, packed, cached
+        )
+
+    async def generate_response(
+        self,
+        query: str,
+        context: ChatContext,
+        map_state: MapState,
+        top_k: int = 10,
+        layers: list[str] | None = None,
+        min_confidence: str = "MEDIUM",
+        temperature: float = 0.0,
+        auto_detect_layers: bool = True,
+    ) -> RAGResponse:
+        """
+        Generate a RAG response to a user query without blocking the event loop.
+
+        Args:
+            query: User's question
+            top_k: Number of chunks to retrieve
+            layers: Optional layer filter (if None and auto_detect_layers=True,
+                will auto-detect)
+            min_confidence: Minimum confidence level
+            temperature: GPT temperature (0 = deterministic, best for
+                definition/testing)
+            auto_detect_layers: If True and layers=None, automatically detect layers
+                from query
+
+        Returns:
+            RAGResponse with answer, sources, and metadata
+        """
+        retrieval = await self.retrieve_for_query(
+            query, top_k, layers, min_confidence, auto_detect_layers
+        )
+        return await self.generate_answer(
+            query, retrieval, context, map_state, temperature
+        )
+
+    async def stream_response(
+        self,
+        query: str,
+        context: ChatContext,
+        map_state: MapState,
+        top_k: int = 10,
+        layers: list[str] | None = None,
+        min_confidence: str = "MEDIUM",
+        temperature: float = 0.0,
+        auto_detect_layers: bool = True,
+    ) -> AsyncIterator[str | RAGResponse]:
+        """
+        Stream a RAG response token by token.
+
+        Takes the same arguments as generate_response and yields the same items
+        as stream_answer.
+        """
+        retrieval = await self.retrieve_for_query(
+            query, top_k, layers, min_confidence, auto_detect_layers
+        )
+        async for item in self.stream_answer(
+            query, retrieval, context, map_state, temperature
+        ):
+            yield item
@@ -0,0 +1,256 @@
+"""
+Semantic response cache.
+
+Paraphrased questions ("what's groundwater inundation", "explain groundwater
+flooding") produce nearly identical query embeddings. The cache keeps past
+answers together with their query embedding and a scope (retrieval filters and
+the map-state fields that influence the answer) and returns a stored answer when
+a new query in the same scope is similar enough. Only the answer (text and
+sources) is stored: map actions depend on the requesting client's layers,
+basemap and position, so they are planned for every request.
+
+Entries live in one preallocated float32 matrix so a lookup is a single
+matrix-vector product. The whole cache is dropped when document_chunks changes,
+detected through a trigger-maintained corpus version number. Every drop starts a
+new generation, and answers computed in an earlier generation are not stored.
+"""
+
+import time
+from collections.abc import Awaitable, Callable
+
+import numpy as np
+from models.chat import RAGResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+CORPUS_VERSION_DDL = [
+    "CREATE TABLE IF NOT EXISTS corpus_version ("
+    "id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1), "
+    "version BIGINT NOT NULL DEFAULT 0, "
+    "updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW())",
+    "INSERT INTO corpus_version (id) VALUES (1) ON CONFLICT DO NOTHING",
+    "CREATE OR REPLACE FUNCTION bump_corpus_version() RETURNS trigger AS $$ "
+    "BEGIN "
+    "UPDATE corpus_version SET version = version + 1, updated_at = NOW() WHERE id = 1; "
+    "RETURN NULL; "
+    "END; $$ LANGUAGE plpgsql",
+    # Created only when missing, so rerunning takes no lock on document_chunks
+    "DO $$ BEGIN "
+    "IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'document_chunks_version' "
+    "AND tgrelid = 'document_chunks'::regclass) THEN "
+    "CREATE TRIGGER document_chunks_version "
+    "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON document_chunks "
+    "FOR EACH STATEMENT EXECUTE FUNCTION bump_corpus_version(); "
+    "END IF; END $$",
+]
+
+CORPUS_VERSION_TRACKED_QUERY = text(
+    "SELECT to_regclass('corpus_version') IS NOT NULL AND EXISTS ("
+    "SELECT 1 FROM pg_trigger WHERE tgname = 'document_chunks_version' "
+    "AND tgrelid = 'document_chunks'::regclass)"
+)
+
+
+class CorpusVersionTracker:
+    """Reads the version number bumped by every write to document_chunks"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    async def is_tracking(self) -> bool:
+        """
+        Whether the version table and trigger exist.
+
+        They are created by init.sql or python -m ai.vector_index ensure, never
+        by the API, which may lack DDL rights and shouldn't lock document_chunks.
+        """
+        async with self.engine.connect() as conn:
+            return bool((await conn.execute(CORPUS_VERSION_TRACKED_QUERY)).scalar())
+
+    async def current(self) -> int | None:
+        async with self.engine.connect() as conn:
+            return (
+                await conn.execute(
+                    text("SELECT version FROM corpus_version WHERE id = 1")
+                )
+            ).scalar()
+
+
+class SemanticResponseCache:
+    """Bounded cache of RAGResponses looked up by query embedding similarity"""
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl_seconds: float | None = 3600,
+        version_source: Callable[[], Awaitable[int | None]] | None = None,
+        version_check_interval: float = 30,
+    ):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a cached answer to be reused
+            max_entries: Maximum number of cached answers
+            ttl_seconds: Lifetime of an entry (None keeps entries until evicted)
+            version_source: Coroutine returning the corpus version; a change clears the
+                cache
+            version_check_interval: Seconds between corpus version checks
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_source = version_source
+        self.version_check_interval = version_check_interval
+
+        # Allocated on first insert, once the dimension is known
+        self._vectors: np.ndarray | None = None
+        # -1 marks an empty slot
+        self._scopes = np.full(max_entries, -1, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._responses: list[RAGResponse | None] = [None] * max_entries
+        # Scopes with at least one slot; a code is dropped with its last slot
+        self._scope_codes: dict[str, int] = {}
+        self._scope_names: dict[int, str] = {}
+        self._next_code = 0
+        # Bumped by invalidate(); puts from an older generation are rejected
+        self.generation = 0
+
+        self._corpus_version: int | None = None
+        self._last_version_check = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def __len__(self) -> int:
+        return int((self._scopes >= 0).sum())
+
+    def invalidate(self) -> None:
+        """Drop every cached answer"""
+        self._scopes.fill(-1)
+        self._responses = [None] * self.max_entries
+        self._scope_codes.clear()
+        self._scope_names.clear()
+        self.generation += 1
+        self.invalidations += 1
+
+    async def ensure_fresh(self) -> None:
+        """Clear the cache if the corpus changed since the last check"""
+        if self.version_source is None:
+            return
+        now = time.monotonic()
+        if now - self._last_version_check < self.version_check_interval:
+            return
+        self._last_version_check = now
+
+        try:
+            version = await self.version_source()
+        except Exception as e:
+            print(f"⚠️ Corpus version check failed: {e}")
+            return
+        if self._corpus_version is not None and version != self._corpus_version:
+            print("🧹 document_chunks changed, clearing response cache")
+            self.invalidate()
+        self._corpus_version = version
+
+    def lookup(self, embedding: np.ndarray, scope: str) -> RAGResponse | None:
+        """
+        Find a cached answer for a similar query in the same scope.
+
+        Args:
+            embedding: Query embedding
+            scope: Key of the filters and map-state fields the answer depends on
+
+        Returns:
+            Cached RAGResponse, or None on a miss
+        """
+        code = self._scope_codes.get(scope)
+        if code is None or self._vectors is None:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        candidates = np.flatnonzero((self._scopes == code) & (self._expires > now))
+        if candidates.size == 0:
+            self.misses += 1
+            return None
+
+        similarities = self._vectors[candidates] @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        slot = int(candidates[best])
+        self._last_used[slot] = now
+        self.hits += 1
+        return self._responses[slot]
+
+    def put(
+        self,
+        embedding: np.ndarray,
+        scope: str,
+        response: RAGResponse,
+        generation: int | None = None,
+    ) -> None:
+        """
+        Store an answer, replacing an empty, expired or least recently used slot.
+
+        Args:
+            embedding: Query embedding
+            scope: Key of the filters and map-state fields the answer depends on
+            response: Answer to store
+            generation: The cache's generation when the answer's lookup missed;
+                answers built before an invalidation are dropped
+        """
+        if generation is not None and generation != self.generation:
+            self.stale_puts += 1
+            return
+        vector = self._normalize(embedding)
+        if self._vectors is None:
+            self._vectors = np.zeros(
+                (self.max_entries, vector.shape[0]), dtype=np.float32
+            )
+
+        now = time.monotonic()
+        free = np.flatnonzero((self._scopes < 0) | (self._expires <= now))
+        slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+
+        self._release_scope(slot)
+        code = self._scope_codes.get(scope)
+        if code is None:
+            code = self._scope_codes[scope] = self._next_code
+            self._scope_names[code] = scope
+            self._next_code += 1
+
+        self._vectors[slot] = vector
+        self._scopes[slot] = code
+        self._expires[slot] = now + self.ttl_seconds if self.ttl_seconds else np.inf
+        self._last_used[slot] = now
+        self._responses[slot] = response
+
+    def _release_scope(self, slot: int) -> None:
+        """Forget the scope of a slot about to be overwritten unless another uses it"""
+        code = int(self._scopes[slot])
+        if code >= 0 and int((self._scopes == code).sum()) == 1:
+            del self._scope_codes[self._scope_names.pop(code)]
+        self._scopes[slot] = -1
+
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def stats(self) -> dict[str, float | int]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+            "scopes": len(self._scope_codes),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,175 @@
+"""
+Filter-aware retrieval planning.
+
+With an approximate index, the layer and confidence filters are applied after
+the index scan. A selective filter such as drainage_backflow discards most of
+the candidates the index returns, so a query either comes back short or makes
+the iterative scan walk far through the index. The planner estimates how many
+rows match a query's filters from per-(layer, confidence) counts and picks:
+
+- exact search when the filtered subset is small: the filters are applied first
+  and the few matching rows are ranked by exact distance
+- approximate search otherwise, with ef_search/probes widened in proportion to
+  how much of the corpus the filters discard
+
+Approximate plans that still return fewer than top_k rows are re-run exactly.
+"""
+
+import math
+import os
+import time
+from typing import Any, NamedTuple
+
+from sqlalchemy import text
+
+# Numeric confidence so "at least MEDIUM" is a range filter
+CONFIDENCE_RANKS = {"HIGH": 3, "MEDIUM": 2, "LOW": 1}
+
+CONFIDENCE_RANK_DDL = [
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS confidence_rank SMALLINT "
+    "GENERATED ALWAYS AS (CASE confidence "
+    "WHEN 'HIGH' THEN 3 WHEN 'MEDIUM' THEN 2 WHEN 'LOW' THEN 1 ELSE 0 END) STORED",
+    "CREATE INDEX IF NOT EXISTS document_chunks_confidence_rank_idx "
+    "ON document_chunks (confidence_rank)",
+]
+
+HAS_CONFIDENCE_RANK_QUERY = text(
+    "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+    "WHERE table_name = 'document_chunks' AND column_name = 'confidence_rank')"
+)
+
+LAYER_STATS_QUERY = text(
+    "SELECT layer, confidence, count(*) AS rows "
+    "FROM document_chunks, unnest(relevant_layers) AS layer "
+    "WHERE embedding IS NOT NULL "
+    "GROUP BY layer, confidence"
+)
+
+CONFIDENCE_STATS_QUERY = text(
+    "SELECT confidence, count(*) AS rows "
+    "FROM document_chunks "
+    "WHERE embedding IS NOT NULL "
+    "GROUP BY confidence"
+)
+
+
+class RetrievalPlan(NamedTuple):
+    """How a retrieval query should be executed"""
+
+    exact: bool
+    estimated_rows: int
+    # Fraction of the corpus the filters keep, used to widen the ANN scan
+    selectivity: float
+
+
+class RetrievalPlanner:
+    """Chooses exact or approximate search from filter selectivity"""
+
+    def __init__(
+        self,
+        exact_max_rows: int | None = None,
+        refresh_interval: float | None = None,
+    ):
+        """
+        Args:
+            exact_max_rows: Filtered subsets up to this size are searched exactly
+                (EXACT_SEARCH_MAX_ROWS)
+            refresh_interval: Seconds between reloads of the filter counts
+                (FILTER_STATS_REFRESH)
+        """
+        self.exact_max_rows = exact_max_rows or int(
+            os.getenv("EXACT_SEARCH_MAX_ROWS", "10000")
+        )
+        self.refresh_interval = refresh_interval or float(
+            os.getenv("FILTER_STATS_REFRESH", "300")
+        )
+
+        self._layer_counts: dict[tuple[str, str | None], int] = {}
+        self._confidence_counts: dict[str | None, int] = {}
+        self._total_rows = 0
+        self._loaded_at: float | None = None
+
+        self.exact_plans = 0
+        self.ann_plans = 0
+        self.exact_fallbacks = 0
+
+    def needs_refresh(self) -> bool:
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > self.refresh_interval
+        )
+
+    def load(self, layer_rows: Any, confidence_rows: Any) -> None:
+        """Replace the counts with LAYER_STATS_QUERY / CONFIDENCE_STATS_QUERY results"""
+        self._layer_counts = {
+            (row.layer, row.confidence): row.rows for row in layer_rows
+        }
+        self._confidence_counts = {row.confidence: row.rows for row in confidence_rows}
+        self._total_rows = sum(self._confidence_counts.values())
+        self._loaded_at = time.monotonic()
+
+    def estimate_rows(
+        self, layers: list[str] | None, allowed_confidences: list[str] | None
+    ) -> int:
+        """
+        Upper bound on the rows matching the filters.
+
+        Chunks tagged with several of the requested layers are counted once per
+        layer, which only errs toward approximate search.
+        """
+        if not layers:
+            if not allowed_confidences:
+                return self._total_rows
+            return sum(
+                rows
+                for confidence, rows in self._confidence_counts.items()
+                if confidence in allowed_confidences
+            )
+        return sum(
+            rows
+            for (layer, confidence), rows in self._layer_counts.items()
+            if layer in layers
+            and (not allowed_confidences or confidence in allowed_confidences)
+        )
+
+    def plan(
+        self, layers: list[str] | None, allowed_confidences: list[str] | None
+    ) -> RetrievalPlan:
+        """Pick the search strategy for a query's filters"""
+        if self._loaded_at is None or not self._total_rows:
+            # No statistics yet: keep the plain ANN query
+            self.ann_plans += 1
+            return RetrievalPlan(
+                exact=False, estimated_rows=self._total_rows, selectivity=1.0
+            )
+
+        estimated = self.estimate_rows(layers, allowed_confidences)
+        selectivity = (
+            min(1.0, estimated / self._total_rows) if self._total_rows else 1.0
+        )
+        exact = estimated <= self.exact_max_rows
+        if exact:
+            self.exact_plans += 1
+        else:
+            self.ann_plans += 1
+        return RetrievalPlan(
+            exact=exact, estimated_rows=estimated, selectivity=selectivity
+        )
+
+    def widen(self, base: int, top_k: int, selectivity: float, limit: int) -> int:
+        """Scale an ef_search/probes value so about top_k candidates pass the filters"""
+        if selectivity >= 1.0:
+            return base
+        needed = math.ceil(base / max(selectivity, 1e-6))
+        return max(base, min(limit, max(needed, top_k)))
+
+    def record_fallback(self) -> None:
+        self.exact_fallbacks += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "total_rows": self._total_rows,
+            "exact_plans": self.exact_plans,
+            "ann_plans": self.ann_plans,
+            "exact_fallbacks": self.exact_fallbacks,
+        }
@@ -0,0 +1,48 @@
+"""
+Schema objects the API relies on besides document_chunks and its vector index.
+
+- confidence_rank and text_search: generated columns (and their indexes) used by
+  the retrieval planner and hybrid search
+- corpus_version and its trigger: invalidate the semantic response cache
+- query_embedding_cache: persistent tier of the embedding cache
+- chat_sessions / chat_messages: conversations of the SQL context store
+
+init.sql creates all of them for new databases. Existing databases are brought
+up to date by ensure_schema, which the ensure command of ai.vector_index runs
+before checking the index. The API itself only checks for them at startup, which
+keeps DDL (and its locks on document_chunks) out of every worker's warm-up.
+"""
+
+from ai.embedding_cache import EMBEDDING_CACHE_DDL
+from ai.hybrid_search import TEXT_SEARCH_DDL
+from ai.response_cache import CORPUS_VERSION_DDL
+from ai.retrieval_planner import CONFIDENCE_RANK_DDL
+from models.chat_session import ChatBase
+from sqlalchemy import Engine, text
+
+
+def ensure_search_columns(engine: Engine) -> None:
+    """Add the generated columns and indexes used by the planner and hybrid search"""
+    with engine.begin() as conn:
+        for statement in CONFIDENCE_RANK_DDL + TEXT_SEARCH_DDL:
+            conn.execute(text(statement))
+
+
+def ensure_cache_schema(engine: Engine) -> None:
+    """Create the tables and trigger of the response and embedding caches"""
+    with engine.begin() as conn:
+        for statement in CORPUS_VERSION_DDL + EMBEDDING_CACHE_DDL:
+            conn.execute(text(statement))
+
+
+def ensure_chat_schema(engine: Engine) -> None:
+    """Create the chat_sessions and chat_messages tables"""
+    with engine.begin() as conn:
+        ChatBase.metadata.create_all(conn)
+
+
+def ensure_schema(engine: Engine) -> None:
+    """Create every schema object above that is missing"""
+    ensure_search_columns(engine)
+    ensure_cache_schema(engine)
+    ensure_chat_schema(engine)
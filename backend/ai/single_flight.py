@@ -0,0 +1,65 @@
+"""
+Single-flight request coalescing.
+
+When several coroutines ask for the same work at the same time, only the first
+one runs it; the others wait for that execution and receive the same result.
+The shared work runs in its own task, so it keeps going for the remaining
+waiters even if the request that started it is cancelled.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Deduplicates concurrent calls that share a key"""
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Future[T]] = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Args:
+            key: Identity of the work; callers with equal keys share one execution
+            fn: Zero-argument coroutine function doing the work
+
+        Returns:
+            The result of the shared execution (exceptions are shared as well)
+        """
+        self.calls += 1
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done, key=key: self._finish(key, done))
+        else:
+            self.deduplicated += 1
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future[T]) -> None:
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            # Mark the exception as retrieved when every waiter has gone away
+            future.exception()
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+            "in_flight": self.in_flight,
+            "dedup_rate": round(self.deduplicated / self.calls, 4)
+            if self.calls
+            else 0.0,
+        }
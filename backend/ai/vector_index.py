@@ -0,0 +1,333 @@
+"""
+Vector index management for document_chunks.embedding.
+
+Keeps one approximate index on the embedding column. Its type (HNSW or
+IVFFlat) and build parameters come from configuration, and IVFFlat lists are
+sized from the row count. The module also produces the per-query SET LOCAL
+statements that trade recall for latency:
+
+- hnsw.ef_search / ivfflat.probes control how much of the index a query visits
+- hnsw.iterative_scan / ivfflat.iterative_scan (pgvector >= 0.8) keep scanning
+  when the layer and confidence filters discard candidates, so filtered queries
+  still return top_k rows; on older extensions the setting doesn't exist and is
+  skipped
+
+Usage (from backend/):
+    python -m ai.vector_index status
+    python -m ai.vector_index ensure      # also creates missing ai.schema objects
+    python -m ai.vector_index rebuild --type hnsw
+"""
+
+import argparse
+import math
+import os
+import re
+
+from sqlalchemy import Engine, text
+from sqlalchemy.sql.elements import TextClause
+
+INDEX_TYPES = ("hnsw", "ivfflat")
+# Largest ef_search pgvector accepts
+MAX_EF_SEARCH = 1000
+ITERATIVE_SCAN_MODES = ("off", "relaxed_order", "strict_order")
+INDEX_NAME = "document_chunks_embedding_idx"
+# First pgvector release with the iterative_scan settings
+ITERATIVE_SCAN_MIN_VERSION = (0, 8)
+
+PGVECTOR_VERSION_QUERY = text(
+    "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+)
+
+VECTOR_INDEXES_QUERY = text(
+    "SELECT i.relname AS name, am.amname AS method, i.reloptions AS options "
+    "FROM pg_index x "
+    "JOIN pg_class i ON i.oid = x.indexrelid "
+    "JOIN pg_class t ON t.oid = x.indrelid "
+    "JOIN pg_am am ON am.oid = i.relam "
+    "WHERE t.relname = 'document_chunks' AND am.amname IN ('hnsw', 'ivfflat')"
+)
+
+
+class VectorIndexSettings:
+    """Index build and search parameters, defaulting to environment variables"""
+
+    def __init__(
+        self,
+        index_type: str | None = None,
+        hnsw_m: int | None = None,
+        hnsw_ef_construction: int | None = None,
+        ef_search: int | None = None,
+        probes: int | None = None,
+        iterative_scan: str | None = None,
+    ):
+        """
+        Args:
+            index_type: "hnsw" or "ivfflat" (VECTOR_INDEX_TYPE)
+            hnsw_m: Graph connections per node (HNSW_M)
+            hnsw_ef_construction: Candidate list size while building
+                (HNSW_EF_CONSTRUCTION)
+            ef_search: HNSW candidate list size per query (HNSW_EF_SEARCH)
+            probes: IVFFlat lists visited per query (IVFFLAT_PROBES, default
+                sqrt(lists))
+            iterative_scan: pgvector iterative scan mode for filtered queries
+                (VECTOR_ITERATIVE_SCAN)
+        """
+        self.index_type = (index_type or os.getenv("VECTOR_INDEX_TYPE", "hnsw")).lower()
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(
+                f"Unknown vector index type '{self.index_type}', "
+                f"expected one of {INDEX_TYPES}"
+            )
+
+        self.hnsw_m = hnsw_m or int(os.getenv("HNSW_M", "16"))
+        self.hnsw_ef_construction = hnsw_ef_construction or int(
+            os.getenv("HNSW_EF_CONSTRUCTION", "64")
+        )
+        self.ef_search = ef_search or int(os.getenv("HNSW_EF_SEARCH", "100"))
+        probes_env = os.getenv("IVFFLAT_PROBES")
+        self.probes = probes or (int(probes_env) if probes_env else None)
+
+        self.iterative_scan = (
+            iterative_scan or os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+        ).lower()
+        if self.iterative_scan not in ITERATIVE_SCAN_MODES:
+            raise ValueError(
+                f"Unknown iterative scan mode '{self.iterative_scan}', "
+                f"expected one of {ITERATIVE_SCAN_MODES}"
+            )
+
+
+def describe_indexes(rows) -> list[dict[str, object]]:
+    """Turn VECTOR_INDEXES_QUERY rows into dicts with the reloptions parsed"""
+    indexes = []
+    for row in rows:
+        options = dict(option.split("=", 1) for option in (row.options or []))
+        indexes.append({"name": row.name, "method": row.method, "options": options})
+    return indexes
+
+
+def ivfflat_list_count(indexes: list[dict[str, object]]) -> int | None:
+    """List count of the IVFFlat index among describe_indexes output, if any"""
+    for index in indexes:
+        if index["method"] == "ivfflat":
+            return int(index["options"].get("lists", 100))
+    return None
+
+
+def ivfflat_lists(row_count: int) -> int:
+    """pgvector's recommended list count: rows / 1000 up to 1M rows, sqrt(rows) above"""
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+def default_probes(lists: int) -> int:
+    """sqrt(lists) probes is pgvector's suggested starting point"""
+    return max(1, int(math.sqrt(lists)))
+
+
+def supports_iterative_scan(version: str | None) -> bool:
+    """Whether a pgvector extversion (e.g. "0.7.4") has the iterative_scan settings"""
+    if not version:
+        return False
+    parts = re.findall(r"\d+", version)[:2]
+    return tuple(int(part) for part in parts) >= ITERATIVE_SCAN_MIN_VERSION
+
+
+def search_settings(
+    settings: VectorIndexSettings,
+    filtered: bool,
+    lists: int | None = None,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    iterative_scan: bool = True,
+) -> list[TextClause]:
+    """
+    SET LOCAL statements to run in the retrieval transaction before the ANN query.
+
+    Args:
+        settings: Index settings
+        filtered: Whether the query filters on layers or confidence
+        lists: Current IVFFlat list count, used for the default probes
+        ef_search: Override of settings.ef_search for this query
+        probes: Override of settings.probes for this query
+        iterative_scan: Whether the installed pgvector has iterative scans
+
+    Returns:
+        Statements to execute in order (SET cannot take bind parameters, so the
+        values are validated integers and known mode names)
+    """
+    statements = []
+    if settings.index_type == "hnsw":
+        statements.append(
+            text(f"SET LOCAL hnsw.ef_search = {int(ef_search or settings.ef_search)}")
+        )
+    else:
+        probes = probes or settings.probes or default_probes(lists or 100)
+        statements.append(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+
+    if filtered and iterative_scan and settings.iterative_scan != "off":
+        statements.append(
+            text(
+                f"SET LOCAL {settings.index_type}.iterative_scan = "
+                f"{settings.iterative_scan}"
+            )
+        )
+    return statements
+
+
+class VectorIndexManager:
+    """Inspects and (re)builds the approximate index on document_chunks.embedding"""
+
+    def __init__(self, engine: Engine, settings: VectorIndexSettings | None = None):
+        self.engine = engine
+        self.settings = settings or VectorIndexSettings()
+
+    def row_count(self) -> int:
+        with self.engine.connect() as conn:
+            return (
+                conn.execute(
+                    text(
+                        "SELECT count(*) FROM document_chunks "
+                        "WHERE embedding IS NOT NULL"
+                    )
+                ).scalar()
+                or 0
+            )
+
+    def current_indexes(self) -> list[dict[str, object]]:
+        """Approximate indexes on document_chunks, with their build options"""
+        with self.engine.connect() as conn:
+            return describe_indexes(conn.execute(VECTOR_INDEXES_QUERY).all())
+
+    def needs_rebuild(self) -> str | None:
+        """Reason the index should be rebuilt, or None if it matches the settings"""
+        indexes = self.current_indexes()
+        if not indexes:
+            return "no vector index"
+        if len(indexes) > 1:
+            return f"{len(indexes)} vector indexes"
+
+        index = indexes[0]
+        if index["method"] != self.settings.index_type:
+            return f"index is {index['method']}, configured {self.settings.index_type}"
+
+        if index["method"] == "ivfflat":
+            lists = int(index["options"].get("lists", 100))
+            target = ivfflat_lists(self.row_count())
+            # Lists only need rebuilding when the corpus grew or shrank substantially
+            if not target / 2 <= lists <= target * 2:
+                return (
+                    f"ivfflat has {lists} lists, "
+                    f"{target} recommended for the current row count"
+                )
+        else:
+            m = int(index["options"].get("m", 16))
+            ef_construction = int(index["options"].get("ef_construction", 64))
+            if (m, ef_construction) != (
+                self.settings.hnsw_m,
+                self.settings.hnsw_ef_construction,
+            ):
+                return f"hnsw built with m={m}, ef_construction={ef_construction}"
+        return None
+
+    def index_definition(self, name: str) -> str:
+        if self.settings.index_type == "hnsw":
+            options = (
+                f"m = {int(self.settings.hnsw_m)}, "
+                f"ef_construction = {int(self.settings.hnsw_ef_construction)}"
+            )
+        else:
+            options = f"lists = {ivfflat_lists(self.row_count())}"
+        return (
+            f"CREATE INDEX CONCURRENTLY {name} ON document_chunks "
+            f"USING {self.settings.index_type} (embedding vector_cosine_ops) "
+            f"WITH ({options})"
+        )
+
+    def rebuild(self, maintenance_work_mem: str | None = None) -> None:
+        """
+        Build the configured index next to the existing ones, then swap it in.
+
+        The build runs CONCURRENTLY so retrieval keeps working meanwhile, and the
+        old index is only dropped once the new one is ready.
+        """
+        maintenance_work_mem = maintenance_work_mem or os.getenv(
+            "VECTOR_INDEX_BUILD_MEMORY"
+        )
+        if maintenance_work_mem and not re.fullmatch(
+            r"\d+(kB|MB|GB)", maintenance_work_mem
+        ):
+            raise ValueError(f"Invalid maintenance_work_mem '{maintenance_work_mem}'")
+
+        old_indexes = self.current_indexes()
+        new_name = f"{INDEX_NAME}_new"
+
+        with self.engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as conn:
+            if maintenance_work_mem:
+                conn.execute(
+                    text(f"SET maintenance_work_mem = '{maintenance_work_mem}'")
+                )
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {new_name}"))
+            print(
+                f"🏗️ Building {self.settings.index_type} index "
+                "on document_chunks.embedding..."
+            )
+            conn.execute(text(self.index_definition(new_name)))
+
+            for index in old_indexes:
+                if index["name"] != new_name:
+                    conn.execute(
+                        text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index["name"]}"')
+                    )
+            conn.execute(text(f"ALTER INDEX {new_name} RENAME TO {INDEX_NAME}"))
+            conn.execute(text("ANALYZE document_chunks"))
+        print(f"✅ Built {INDEX_NAME} ({self.settings.index_type})")
+
+    def ensure(self) -> bool:
+        """Rebuild the index if it doesn't match the settings; returns whether it did"""
+        reason = self.needs_rebuild()
+        if reason is None:
+            print("✅ Vector index is up to date")
+            return False
+        print(f"🔧 Rebuilding vector index: {reason}")
+        self.rebuild()
+        return True
+
+
+def main():
+    from ai.schema import ensure_schema
+    from service.database import create_db_engine
+
+    parser = argparse.ArgumentParser(
+        description="Manage the document_chunks vector index"
+    )
+    parser.add_argument("command", choices=("status", "ensure", "rebuild"))
+    parser.add_argument(
+        "--type", choices=INDEX_TYPES, help="Index type (defaults to VECTOR_INDEX_TYPE)"
+    )
+    parser.add_argument(
+        "--maintenance-work-mem", help="e.g. 1GB, speeds up large builds"
+    )
+    args = parser.parse_args()
+
+    manager = VectorIndexManager(
+        create_db_engine(), VectorIndexSettings(index_type=args.type)
+    )
+    if args.command == "status":
+        print(f"Rows with embeddings: {manager.row_count()}")
+        for index in manager.current_indexes():
+            print(f"  {index['name']}: {index['method']} {index['options']}")
+        print(f"Rebuild needed: {manager.needs_rebuild() or 'no'}")
+    elif args.command == "ensure":
+        ensure_schema(manager.engine)
+        manager.ensure()
+    else:
+        manager.rebuild(args.maintenance_work_mem)
+    manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
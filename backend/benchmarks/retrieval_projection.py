@@ -0,0 +1,123 @@
+"""
+Benchmark: full DocumentChunk rows vs. the column-projected retrieval query.
+
+For each sample query the script runs the old query shape, which loads whole
+ORM entities including the 1536-dim embedding, and the projected query used by
+the RAG systems. It reports the median latency and the bytes of column data per
+query. Byte counts come from pg_column_size over the returned rows, so they
+approximate what crosses the wire.
+
+Usage (from backend/, with DATABASE_URL and OPENAI_API_KEY set):
+    python benchmarks/retrieval_projection.py --repeat 20 --top-k 10
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import func, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.rag_query_system import SUMMARY_COLUMNS, ClimateRAGSystem
+from models.document_chunk import DocumentChunk
+
+SAMPLE_QUERIES = [
+    "What is groundwater inundation?",
+    "How much will sea level rise in Waikiki by 2100?",
+    "Which areas of Honolulu are affected by drainage backflow?",
+    "Explain compound flooding",
+    "How fast are beaches eroding on Maui?",
+]
+
+
+def column_bytes(session, columns, ids: list[int]) -> int:
+    """Total pg_column_size of the given columns over the given rows"""
+    if not ids:
+        return 0
+    size = sum(func.coalesce(func.pg_column_size(column), 0) for column in columns)
+    return (
+        session.execute(
+            select(func.sum(size)).where(DocumentChunk.id.in_(ids))
+        ).scalar()
+        or 0
+    )
+
+
+def time_query(session, statement, repeat: int) -> tuple[float, list]:
+    """Median latency in ms of executing a statement and materializing its rows"""
+    timings = []
+    rows = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = session.execute(statement).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Executions per query and variant"
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=10, help="Rows retrieved per query"
+    )
+    args = parser.parse_args()
+
+    rag = ClimateRAGSystem()
+    full_columns = list(DocumentChunk.__table__.columns)
+
+    print(f"{'query':<60} {'full ms':>8} {'slim ms':>8} {'full KB':>8} {'slim KB':>8}")
+    totals = {"full_ms": 0.0, "slim_ms": 0.0, "full_bytes": 0, "slim_bytes": 0}
+
+    with rag.SessionLocal() as session:
+        for query in SAMPLE_QUERIES:
+            embedding = rag.generate_embedding(query)
+            layers, _ = rag.resolve_layers(query, None, True)
+
+            slim = rag.build_retrieval_query(embedding, args.top_k, layers, "MEDIUM")
+            full = slim.with_only_columns(
+                DocumentChunk,
+                DocumentChunk.embedding.cosine_distance(embedding).label("distance"),
+            )
+
+            full_ms, full_rows = time_query(session, full, args.repeat)
+            slim_ms, slim_rows = time_query(session, slim, args.repeat)
+            full_bytes = column_bytes(
+                session, full_columns, [chunk.id for chunk, _ in full_rows]
+            )
+            slim_bytes = column_bytes(
+                session, SUMMARY_COLUMNS, [row.id for row in slim_rows]
+            )
+
+            totals["full_ms"] += full_ms
+            totals["slim_ms"] += slim_ms
+            totals["full_bytes"] += full_bytes
+            totals["slim_bytes"] += slim_bytes
+            print(
+                f"{query[:60]:<60} {full_ms:>8.2f} {slim_ms:>8.2f} "
+                f"{full_bytes / 1024:>8.1f} {slim_bytes / 1024:>8.1f}"
+            )
+
+    n = len(SAMPLE_QUERIES)
+    print("-" * 96)
+    print(
+        f"{'average per query':<60} "
+        f"{totals['full_ms'] / n:>8.2f} {totals['slim_ms'] / n:>8.2f} "
+        f"{totals['full_bytes'] / n / 1024:>8.1f} "
+        f"{totals['slim_bytes'] / n / 1024:>8.1f}"
+    )
+    if totals["full_bytes"]:
+        saved = 1 - totals["slim_bytes"] / totals["full_bytes"]
+        print(f"Projection saves {saved:.0%} of column bytes per query")
+
+    rag.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Measure recall@k and latency of the vector index against an exact scan.
+
+Stored chunk embeddings serve as query vectors. For each one the exact top_k
+comes from a sequential scan (index scans disabled), and the approximate top_k
+is measured at several ef_search (HNSW) or probes (IVFFlat) values, with the
+same layer and confidence filters the retrieval path uses. The output shows
+where recall stops improving, which is the operating point to configure in
+HNSW_EF_SEARCH / IVFFLAT_PROBES.
+
+Usage (from backend/, with DATABASE_URL set):
+    python benchmarks/vector_recall.py --samples 100 --top-k 10
+    python benchmarks/vector_recall.py --layer drainage_backflow --iterative-scan off
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.rag_query_system import BaseClimateRAGSystem
+from ai.vector_index import (
+    VectorIndexManager,
+    VectorIndexSettings,
+    default_probes,
+    ivfflat_list_count,
+    search_settings,
+)
+from models.document_chunk import DocumentChunk
+from service.database import create_db_engine
+
+EF_SEARCH_VALUES = [10, 20, 40, 80, 100, 200, 400]
+
+
+def probe_values(lists: int) -> list[int]:
+    values = {1, 2, 4, 8, 16, 32, 64, default_probes(lists), lists}
+    return sorted(value for value in values if value <= lists)
+
+
+def run_query(
+    session, rag, embedding, query_id, top_k, layers, min_confidence, settings
+) -> tuple[list[int], float]:
+    """Chunk ids returned for a query vector and the latency in ms"""
+    statement = rag.build_retrieval_query(embedding, top_k, layers, min_confidence)
+    statement = statement.where(DocumentChunk.id != query_id)
+
+    start = time.perf_counter()
+    for setting in settings:
+        session.execute(setting)
+    ids = [row.id for row in session.execute(statement)]
+    elapsed = (time.perf_counter() - start) * 1000
+    session.rollback()  # ends the transaction, resetting the SET LOCAL values
+    return ids, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--samples", type=int, default=100, help="Number of query vectors"
+    )
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--layer", action="append", help="Layer filter (repeatable)")
+    parser.add_argument(
+        "--min-confidence", default="MEDIUM", help="HIGH, MEDIUM, LOW or 'none'"
+    )
+    parser.add_argument(
+        "--iterative-scan",
+        choices=("off", "relaxed_order", "strict_order"),
+        help="Defaults to VECTOR_ITERATIVE_SCAN",
+    )
+    args = parser.parse_args()
+
+    min_confidence = (
+        None if args.min_confidence.lower() == "none" else args.min_confidence.upper()
+    )
+    engine = create_db_engine()
+    session_factory = sessionmaker(bind=engine)
+    rag = BaseClimateRAGSystem()
+
+    indexes = VectorIndexManager(engine).current_indexes()
+    if not indexes:
+        print("❌ No vector index on document_chunks.embedding")
+        return
+    index_type = indexes[0]["method"]
+    print(f"Index: {indexes[0]['name']} ({index_type}) {indexes[0]['options']}")
+
+    with session_factory() as session:
+        samples = session.execute(
+            select(DocumentChunk.id, DocumentChunk.embedding)
+            .where(DocumentChunk.embedding.is_not(None))
+            .order_by(text("random()"))
+            .limit(args.samples)
+        ).all()
+        session.rollback()
+        if not samples:
+            print("❌ No embeddings in document_chunks")
+            return
+
+        # Ground truth: exact nearest neighbours from a sequential scan
+        exact = {}
+        for query_id, embedding in samples:
+            ids, _ = run_query(
+                session,
+                rag,
+                embedding,
+                query_id,
+                args.top_k,
+                args.layer,
+                min_confidence,
+                [text("SET LOCAL enable_indexscan = off")],
+            )
+            exact[query_id] = set(ids)
+
+        if index_type == "hnsw":
+            sweep = [
+                VectorIndexSettings(
+                    "hnsw", ef_search=value, iterative_scan=args.iterative_scan
+                )
+                for value in EF_SEARCH_VALUES
+            ]
+            label = "ef_search"
+        else:
+            lists = ivfflat_list_count(indexes) or 100
+            sweep = [
+                VectorIndexSettings(
+                    "ivfflat", probes=value, iterative_scan=args.iterative_scan
+                )
+                for value in probe_values(lists)
+            ]
+            label = "probes"
+
+        print(
+            f"\n{label:>10} {'recall@k':>9} {'min':>6} {'short':>6} "
+            f"{'p50 ms':>8} {'p95 ms':>8}"
+        )
+        filtered = bool(args.layer or min_confidence)
+        for settings in sweep:
+            recalls, timings, short = [], [], 0
+            for query_id, embedding in samples:
+                expected = exact[query_id]
+                ids, elapsed = run_query(
+                    session,
+                    rag,
+                    embedding,
+                    query_id,
+                    args.top_k,
+                    args.layer,
+                    min_confidence,
+                    search_settings(settings, filtered),
+                )
+                timings.append(elapsed)
+                if len(ids) < len(expected):
+                    short += 1
+                if expected:
+                    recalls.append(len(expected & set(ids)) / len(expected))
+
+            value = settings.ef_search if index_type == "hnsw" else settings.probes
+            p95 = (
+                statistics.quantiles(timings, n=20)[-1]
+                if len(timings) > 1
+                else timings[0]
+            )
+            print(
+                f"{value:>10} {statistics.mean(recalls) if recalls else 1.0:>9.3f} "
+                f"{min(recalls) if recalls else 1.0:>6.2f} {short:>6} "
+                f"{statistics.median(timings):>8.2f} {p95:>8.2f}"
+            )
+
+    print("\nshort = queries that returned fewer rows than the exact scan")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
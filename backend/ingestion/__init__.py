@@ -0,0 +1,5 @@
+"""
+Offline ingestion of the literature corpus into document_chunks.
+
+Run the modules from backend/, e.g. python -m ingestion.load_chunks.
+"""
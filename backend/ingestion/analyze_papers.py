@@ -0,0 +1,375 @@
+"""
+Relevance and metadata extraction for sanitized papers.
+
+Ports the notebook's Gemini analysis (the source of DocumentChunk's relevant,
+confidence, relevant_layers, reasoning, key_findings, locations,
+slr_projections, measurements and timeframes) onto LLMJobRunner, so it runs
+within the request and token quotas, writes each paper's result as soon as it
+is validated, and resumes where an interrupted run stopped.
+
+export_cleaned writes cleaned_analysis_results.json in the notebook's format
+(relevant papers only, layers without supporting keywords removed) for the
+chunking step.
+
+Usage (from backend/; Gemini through its OpenAI-compatible endpoint by default):
+    python -m ingestion.analyze_papers notebooks/outputs/cleaned_full_text_v2 \
+        notebooks/outputs/analysis_results.jsonl
+    python -m ingestion.analyze_papers papers/ out.jsonl \
+        --base-url http://localhost:8000/v1 --api-key-env OPENAI_API_KEY
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from collections.abc import Iterator
+from enum import StrEnum
+from pathlib import Path
+from typing import Any
+
+from ingestion.llm_jobs import LLMJob, LLMJobRunner, load_results
+from ingestion.rate_limit import RateLimiter
+from openai import AsyncOpenAI
+from pydantic import BaseModel, Field, field_validator
+
+GEMINI_OPENAI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+
+class ConfidenceLevel(StrEnum):
+    HIGH = "HIGH"
+    MEDIUM = "MEDIUM"
+    LOW = "LOW"
+
+
+# Keywords that must appear in a paper for an assigned layer to be kept
+LAYER_EVIDENCE_KEYWORDS = {
+    "passive_marine_flooding": [
+        "marine inundation",
+        "coastal flooding",
+        "inundation zone",
+        "bathtub model",
+        "mhhw",
+        "hydrologically connected",
+    ],
+    "groundwater_inundation": [
+        "modflow",
+        "groundwater",
+        "water table rise",
+        "subsurface flooding",
+        "flood depth",
+        "aquifer",
+    ],
+    "low_lying_flooding": [
+        "critical elevation",
+        "elevation threshold",
+        "low-lying",
+        "not hydrologically connected",
+        "dem analysis",
+    ],
+    "compound_flooding": [
+        "compound flooding",
+        "combined effects",
+        "multiple flood",
+        "concurrent flooding",
+    ],
+    "drainage_backflow": [
+        "storm drain",
+        "drainage backflow",
+        "sewer flooding",
+        "drainage network",
+    ],
+    "future_erosion_hazard_zone": [
+        "erosion rate",
+        "m/year",
+        "shoreline change",
+        "coastal retreat",
+        "shoreline retreat",
+    ],
+    "annual_high_wave_flooding": [
+        "bosz",
+        "wave runup",
+        "wave-driven flooding",
+        "extreme wave",
+        "overwash",
+        "gev",
+    ],
+    "emergent_and_shallow_groundwater": [
+        "shallow groundwater",
+        "water table depth",
+        "groundwater level",
+        "subsurface water",
+    ],
+}
+
+
+class PaperAnalysis(BaseModel):
+    """Validated analysis of one paper"""
+
+    relevant: bool
+    confidence: ConfidenceLevel
+    relevant_layers: list[str] = Field(default_factory=list, max_length=2)
+    reasoning: str
+    key_findings: list[str] | None = Field(default_factory=list)
+    quantitative_data: dict[str, Any] = Field(default_factory=dict)
+
+    model_config = {"use_enum_values": True}
+
+    @field_validator("relevant_layers")
+    @classmethod
+    def validate_layers(cls, v):
+        """Drop layers outside the known set"""
+        return [layer for layer in v if layer in LAYER_EVIDENCE_KEYWORDS]
+
+
+ANALYSIS_SYSTEM_PROMPT = """**SYSTEM INSTRUCTION: Geospatial Database Analyst (Strict JSON Output)**
+
+Your role is to act as a specialized data analyst indexing scientific papers for the 'Hawaiian Sea Level Rise Database.'
+You MUST adhere to all rules below and return ONLY a single, valid JSON object.
+Do not include any text outside the JSON structure.
+
+**FEW-SHOT EXAMPLES:**
+
+Example 1 - HIGH Confidence:
+Paper: "Sea level rise impacts on groundwater inundation in Honolulu"
+Abstract mentions: "MODFLOW modeling of Oahu aquifer shows 0.5m SLR causes water table rise of 0.3-0.4m in urban Honolulu,
+affecting 2,500 properties by 2050."
+Classification: HIGH confidence, relevant=true, layers=["groundwater_inundation"]
+Reasoning: Hawaii-specific location (Honolulu, Oahu), quantitative projections (0.5m SLR, 2,500 properties, 2050),
+specific methodology (MODFLOW).
+
+Example 2 - MEDIUM Confidence:
+Paper: "Beach erosion patterns in tropical island environments"
+Abstract mentions: "Study of 15 tropical islands including Hawaii shows erosion rates correlate with wave exposure.
+Framework applicable to Pacific islands."
+Classification: MEDIUM confidence, relevant=true, layers=["future_erosion_hazard_zone"]
+Reasoning: Hawaii mentioned but broader geographic focus, methodology applicable to Hawaii but not Hawaii-specific data.
+
+Example 3 - LOW Confidence:
+Paper: "Global sea level rise projections for the 21st century"
+Abstract mentions: "IPCC AR6 scenarios project 0.5-1.0m global SLR by 2100. Hawaii tide gauge data referenced briefly."
+Classification: LOW confidence, relevant=false, layers=[]
+Reasoning: Hawaii only mentioned in passing, global focus without Hawaii-specific findings or actionable local data.
+
+=== CORE EXECUTION STEPS ===
+1.  **Review:** Scan the full text, prioritizing the **Methods, Results, and Discussion** sections.
+2.  **Identify:** Extract all specific Hawaiian locations, quantitative measurements, and time projections.
+3.  **Classify Confidence:** Determine the **Final Confidence** (HIGH/MEDIUM/LOW) using the **CONFIDENCE CRITERIA** table below.
+4.  **Assign Layers:** Select the **1 or 2 MOST RELEVANT** layers from the **LAYER DEFINITIONS** table, based ONLY on quantitative findings in the Results/Discussion. **DO NOT** select layers based solely on methodology.
+5.  **Extract Data:** Pull out specific quantitative data (measurements, rates, dates, locations) into the quantitative_data object.
+6.  **Justify:** Write clear reasoning explaining your classification.
+
+=== CONFIDENCE CRITERIA (Reference Table) ===
+
+| Level | Requirement |
+| :--- | :--- |
+| **HIGH** | Focuses specifically on Hawaiian locations **AND** contains quantitative data/projections **AND** includes clear, Hawaii-specific methodology. |
+| **MEDIUM** | Methodology is applicable to Hawaii but not Hawaii-specific data **OR** mentions Hawaii but focuses on broader Pacific/global context **OR** findings are qualitative/conceptual. |
+| **LOW** | Hawaii mentioned only in passing, no actionable data, or methodology is irrelevant to the Hawaiian context. |
+
+=== LAYER DEFINITIONS (Max 2 Layers) ===
+
+| Layer ID | Mechanism/Focus | Keywords & Evidence (MUST be present in Results/Discussion) |
+| :--- | :--- | :--- |
+| **passive_marine_flooding** | Direct ocean water inundation (marine connected) | "marine inundation", "coastal flooding", "inundation zone", "bathtub model", "MHHW datum", "hydrologically connected" |
+| **groundwater_inundation** | Flooding from rising groundwater table | "**MODFLOW**", "groundwater", "water table rise", "subsurface flooding", "flood depths", "aquifer" |
+| **low_lying_flooding** | Low elevation areas (not marine connected) | "critical elevation", "below [X]m/ft", "elevation threshold", "low-lying areas", "not hydrologically connected", "DEM analysis" |
+| **compound_flooding** | Multiple simultaneous flood mechanisms | "compound flooding", "combined effects", "rainfall + high tide", "storm surge + rain", "concurrent flooding" |
+| **drainage_backflow** | Stormwater/sewer system flooding | "storm drain", "drainage backflow", "sewer flooding", "urban coastal drainage", "gravity-flow networks" |
+| **future_erosion_hazard_zone** | Shoreline retreat rates/predictions | "erosion rate", "[X] m/year", "shoreline change", "coastal retreat" |
+| **annual_high_wave_flooding** | Wave-driven coastal flooding events | "**BOSZ**", "wave runup", "wave-driven flooding", "extreme waves", "overwash", "**GEV** analysis" |
+| **emergent_and_shallow_groundwater** | Groundwater near or at surface (depth to water table) | "shallow groundwater", "water table depth", "groundwater level", "subsurface water", "GWI modeling output" |
+
+=== LAYER SELECTION RULES ===
+1. Select ONLY layers with explicit evidence in Results/Discussion sections.
+2. Maximum **2 layers** per paper - choose the most prominent findings.
+3. If paper covers multiple aspects, prioritize quantitative results over methodology.
+4. Don't assign layers based solely on Methods - findings must be present.
+5. If uncertain between layers, choose the one with more quantitative support.
+6. Only assign a layer if you found specific keywords or evidence from the LAYER DEFINITIONS table above.
+
+=== RELEVANCE CRITERION ===
+The 'relevant' field must be set to **true** ONLY if the final confidence level is determined to be **HIGH** or **MEDIUM**.
+If the confidence is **LOW**, the paper is considered not relevant for indexing, and the field must be set to **false**.
+
+=== QUANTITATIVE DATA EXTRACTION ===
+Extract into quantitative_data object:
+- locations: List of specific Hawaiian place names mentioned
+- slr_projections: Sea level rise values and years (e.g., "0.5m by 2050")
+- measurements: Specific measurements (erosion rates, flood depths, etc.)
+- timeframes: Study periods or projection years
+
+=== TARGET JSON SCHEMA ===
+Return a JSON object with these exact fields."""  # noqa: E501
+
+_string_list = {"type": "array", "items": {"type": "string"}}
+ANALYSIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "paper_analysis",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "relevant": {"type": "boolean"},
+                "confidence": {"type": "string", "enum": ["HIGH", "MEDIUM", "LOW"]},
+                "relevant_layers": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "maxItems": 2,
+                },
+                "reasoning": {"type": "string"},
+                "key_findings": _string_list,
+                "quantitative_data": {
+                    "type": "object",
+                    "properties": {
+                        "locations": _string_list,
+                        "slr_projections": _string_list,
+                        "measurements": _string_list,
+                        "timeframes": _string_list,
+                    },
+                },
+            },
+            "required": [
+                "relevant",
+                "confidence",
+                "relevant_layers",
+                "reasoning",
+                "quantitative_data",
+            ],
+        },
+    },
+}
+
+
+def validate_layer_assignment(
+    full_text: str, assigned_layers: list[str]
+) -> dict[str, Any]:
+    """
+    Check that each assigned layer has supporting keywords in the text.
+
+    Returns:
+        Layer -> {"valid", "confidence", "found_keywords", "warning"}
+    """
+    text_lower = full_text.lower()
+    validation = {}
+    for layer in assigned_layers:
+        keywords = LAYER_EVIDENCE_KEYWORDS.get(layer, [])
+        found = [keyword for keyword in keywords if keyword in text_lower]
+        validation[layer] = {
+            "valid": bool(found),
+            "confidence": round(len(found) / len(keywords), 2) if keywords else 0.0,
+            "found_keywords": found,
+            "warning": None if found else f"No supporting keywords found for {layer}",
+        }
+    return validation
+
+
+def analysis_jobs(paper_dir: Path, max_tokens: int) -> Iterator[LLMJob]:
+    """One job per markdown paper, keyed by file name like the notebook's results"""
+    for path in sorted(paper_dir.glob("*.md")):
+        full_text = path.read_text(encoding="utf-8")
+        messages = [
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": f"=== FULL TEXT FOR ANALYSIS ===\n{full_text}",
+            },
+        ]
+        yield LLMJob(path.name, messages, max_tokens, ANALYSIS_RESPONSE_FORMAT)
+
+
+def parse_analysis(job: LLMJob, content: str) -> dict[str, Any]:
+    """Validated analysis plus layer validation against the paper text"""
+    analysis = PaperAnalysis(**json.loads(content))
+    result = analysis.model_dump()
+    full_text = job.messages[-1]["content"]
+    result["layer_validation"] = validate_layer_assignment(
+        full_text, analysis.relevant_layers
+    )
+    return result
+
+
+def export_cleaned(results_path: str | Path, cleaned_path: str | Path) -> int:
+    """
+    Write cleaned_analysis_results.json: relevant papers only, with unsupported
+    layers removed.
+
+    Returns:
+        Number of papers written
+    """
+    cleaned = {}
+    for filename, result in load_results(results_path).items():
+        if not result.get("relevant"):
+            continue
+        validation = result.get("layer_validation", {})
+        layers = [
+            layer
+            for layer in result["relevant_layers"]
+            if validation.get(layer, {}).get("valid")
+        ]
+        cleaned[filename] = {**result, "relevant_layers": layers}
+    with open(cleaned_path, "w", encoding="utf-8") as f:
+        json.dump(cleaned, f, indent=2, ensure_ascii=False)
+    return len(cleaned)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("paper_dir", help="Sanitized markdown papers")
+    parser.add_argument("output", help="Results JSON Lines file (also the checkpoint)")
+    parser.add_argument(
+        "--cleaned", help="Also write cleaned_analysis_results.json here"
+    )
+    parser.add_argument(
+        "--model", default=os.getenv("ANALYSIS_MODEL", "gemini-2.5-flash")
+    )
+    parser.add_argument(
+        "--base-url", default=os.getenv("ANALYSIS_BASE_URL", GEMINI_OPENAI_BASE_URL)
+    )
+    parser.add_argument(
+        "--api-key-env",
+        default="GEMINI_API_KEY",
+        help="Environment variable holding the API key",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=float(os.getenv("ANALYSIS_REQUESTS_PER_MINUTE", "1000")),
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=float,
+        default=float(os.getenv("ANALYSIS_TOKENS_PER_MINUTE", "1000000")),
+    )
+    parser.add_argument(
+        "--concurrency", type=int, help="Calls in flight (LLM_JOB_CONCURRENCY)"
+    )
+    parser.add_argument("--max-tokens", type=int, default=4096)
+    args = parser.parse_args()
+
+    client = AsyncOpenAI(
+        base_url=args.base_url,
+        api_key=os.getenv(args.api_key_env, "not-needed"),
+        timeout=float(os.getenv("OPENAI_TIMEOUT", "120")),
+        max_retries=0,
+    )
+    runner = LLMJobRunner(
+        client,
+        args.model,
+        RateLimiter(args.requests_per_minute, args.tokens_per_minute),
+        args.output,
+        concurrency=args.concurrency,
+    )
+    stats = asyncio.run(
+        runner.run(analysis_jobs(Path(args.paper_dir), args.max_tokens), parse_analysis)
+    )
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+    if args.cleaned:
+        written = export_cleaned(args.output, args.cleaned)
+        print(f"✅ Wrote {written} relevant papers to {args.cleaned}")
+
+
+if __name__ == "__main__":
+    main()
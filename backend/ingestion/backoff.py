@@ -0,0 +1,114 @@
+"""
+Retrying OpenAI calls that hit rate limits or transient server errors.
+
+The delay comes from the response headers when the API provides one
+(retry-after-ms, retry-after, x-ratelimit-reset-requests/-tokens such as
+"1s" or "6m0s"), and otherwise grows exponentially with jitter. Ingestion
+clients are created with max_retries=0 so these retries are the only ones.
+"""
+
+import asyncio
+import random
+import re
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+T = TypeVar("T")
+
+RESET_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> float | None:
+    """Seconds in an x-ratelimit-reset value such as "20ms", "1.5s" or "6m0s" """
+    parts = RESET_DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def header_delay(headers: httpx.Headers) -> float | None:
+    """Seconds the API asks us to wait, if its headers say"""
+    if value := headers.get("retry-after-ms"):
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    if value := headers.get("retry-after"):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    resets = [
+        parse_duration(value)
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if (value := headers.get(name))
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and (
+        error.status_code == 409 or error.status_code >= 500
+    )
+
+
+def retry_delay(
+    error: Exception, attempt: int, base_delay: float = 1.0, max_delay: float = 60.0
+) -> float:
+    """
+    Seconds to wait before retry number attempt (0-based).
+
+    Args:
+        error: The failed call's exception
+        attempt: Retries made so far
+        base_delay: First exponential delay when the headers give none
+        max_delay: Upper bound for any delay
+    """
+    delay = None
+    if isinstance(error, APIStatusError):
+        delay = header_delay(error.response.headers)
+    if delay is None:
+        delay = base_delay * 2**attempt
+    # Jitter keeps concurrent workers from retrying in lockstep
+    return min(max_delay, delay) * random.uniform(1.0, 1.25)
+
+
+async def with_backoff(
+    call: Callable[[], Awaitable[T]],
+    max_retries: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> T:
+    """
+    Await call(), retrying rate limits and transient errors.
+
+    Args:
+        call: Zero-argument coroutine factory, invoked once per attempt
+        max_retries: Retries before the last error is raised
+        base_delay: First exponential delay when the headers give none
+        max_delay: Upper bound for any delay
+
+    Returns:
+        The first successful result
+    """
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = retry_delay(e, attempt, base_delay, max_delay)
+            print(
+                f"⚠️ {type(e).__name__}, retrying in {delay:.1f}s "
+                f"({attempt + 1}/{max_retries})"
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,171 @@
+"""
+Reading chunk files and encoding them as document_chunks rows.
+
+Chunk files are what the chunking notebook writes (semantic_chunks.json): a JSON
+array, or JSON Lines with one chunk per line, of
+
+    {"chunk_id": ..., "chunk_index": ..., "text": ...,
+     "metadata": {"filename": ..., ...}}
+
+An optional "embedding" list is loaded as is instead of being embedded again.
+Both formats are read incrementally, so memory stays flat however large the file.
+"""
+
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+# Columns written by ingestion; id, text_search and confidence_rank are generated
+CHUNK_COLUMNS = (
+    "chunk_id",
+    "chunk_index",
+    "text",
+    "embedding",
+    "filename",
+    "source_file",
+    "relevant",
+    "confidence",
+    "relevant_layers",
+    "reasoning",
+    "key_findings",
+    "locations",
+    "slr_projections",
+    "measurements",
+    "timeframes",
+)
+
+ARRAY_COLUMNS = (
+    "relevant_layers",
+    "locations",
+    "slr_projections",
+    "measurements",
+    "timeframes",
+)
+
+READ_SIZE = 1 << 20
+
+
+def iter_chunks(path: str | Path) -> Iterator[dict[str, Any]]:
+    """
+    Chunks from a JSON array or JSON Lines file, one at a time.
+
+    Args:
+        path: semantic_chunks.json (array) or a .jsonl file
+
+    Yields:
+        Chunk dicts in file order
+    """
+    with open(path, encoding="utf-8") as f:
+        head = f.read(READ_SIZE)
+        if head.lstrip().startswith("["):
+            yield from _iter_array(f, head)
+            return
+        lines = (head + f.readline()).splitlines()
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _iter_array(f, buffer: str) -> Iterator[dict[str, Any]]:
+    """Decode the elements of a top-level JSON array without loading it whole"""
+    decoder = json.JSONDecoder()
+    pos = buffer.index("[") + 1
+    while True:
+        # Skip separators, reading more input when the buffer runs out
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer):
+                break
+            more = f.read(READ_SIZE)
+            if not more:
+                raise ValueError("Unterminated JSON array in chunk file")
+            buffer, pos = more, 0
+        if buffer[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            more = f.read(READ_SIZE)
+            if not more:
+                raise
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield item
+        pos = end
+
+
+def chunk_row(chunk: dict[str, Any]) -> dict[str, Any]:
+    """
+    Column values for a chunk, with the same defaults as the notebook upload.
+
+    Returns:
+        CHUNK_COLUMNS -> value; "embedding" is None unless the chunk carries one
+    """
+    metadata = chunk.get("metadata") or {}
+    embedding = chunk.get("embedding")
+    return {
+        "chunk_id": str(chunk["chunk_id"]),
+        "chunk_index": int(chunk["chunk_index"]),
+        "text": chunk["text"],
+        "embedding": np.asarray(embedding, dtype=np.float32)
+        if embedding is not None
+        else None,
+        "filename": metadata["filename"],
+        "source_file": metadata.get("source_file"),
+        "relevant": int(bool(metadata.get("relevant", True))),
+        "confidence": metadata.get("confidence"),
+        "relevant_layers": metadata.get("relevant_layers") or [],
+        "reasoning": metadata.get("reasoning"),
+        "key_findings": metadata.get("key_findings"),
+        "locations": metadata.get("locations") or [],
+        "slr_projections": metadata.get("slr_projections") or [],
+        "measurements": metadata.get("measurements") or [],
+        "timeframes": metadata.get("timeframes") or [],
+    }
+
+
+def _copy_escape(value: str) -> str:
+    """Escape a value for COPY's text format"""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _array_literal(values: list[Any]) -> str:
+    """Postgres text[] literal with every element quoted"""
+    items = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'"{item}"' for item in items) + "}"
+
+
+def vector_literal(vector: np.ndarray) -> str:
+    """pgvector text input; %.9g round-trips float32 exactly"""
+    return "[" + ",".join(f"{x:.9g}" for x in vector.tolist()) + "]"
+
+
+def copy_line(row: dict[str, Any]) -> str:
+    """One COPY text-format line for a chunk_row, columns in CHUNK_COLUMNS order"""
+    fields = []
+    for column in CHUNK_COLUMNS:
+        value = row[column]
+        if value is None:
+            fields.append("\\N")
+            continue
+        if column == "embedding":
+            value = vector_literal(value)
+        elif column in ARRAY_COLUMNS:
+            value = _array_literal(value)
+        elif column == "key_findings":
+            value = json.dumps(value, ensure_ascii=False)
+        fields.append(_copy_escape(str(value)))
+    return "\t".join(fields) + "\n"
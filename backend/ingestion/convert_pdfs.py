@@ -0,0 +1,382 @@
+"""
+PDF to markdown conversion with docling on a pool of worker processes.
+
+Layout parsing is CPU-bound, so the notebook's single-process convert_all uses
+one core. Here each worker process builds its DocumentConverter (and loads the
+layout models) once, then converts documents one at a time. The parent hands out
+work and watches every worker: a document that runs past the timeout has its
+worker killed, and a worker that dies (segfault, OOM kill) only costs the
+document it was on. Either way a fresh worker takes its place and the run
+continues. Workers are also recycled after a number of documents to bound
+memory growth.
+
+Existing markdown files are skipped unless --force is given, so an interrupted
+run resumes where it stopped. The run summary reports pages per second.
+
+Usage (from backend/, with docling installed):
+    python -m ingestion.convert_pdfs notebooks/pdf_pub notebooks/outputs/full_text_v2 \
+        --workers 32
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Any, NamedTuple
+
+
+class ConversionResult(NamedTuple):
+    """Outcome of one document"""
+
+    file: str
+    status: str  # converted, partial, failed, timeout, crashed
+    pages: int = 0
+    seconds: float = 0.0
+    error: str | None = None
+
+
+def build_converter(options: dict[str, Any]):
+    """DocumentConverter with the notebook's pipeline options"""
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+
+    pipeline_options = PdfPipelineOptions()
+    pipeline_options.do_ocr = options.get("do_ocr", False)
+    pipeline_options.do_table_structure = options.get("do_table_structure", False)
+    pipeline_options.images_scale = options.get("images_scale", 1.0)
+    # Each worker is one process of many; intra-document threads would oversubscribe
+    # the cores
+    if hasattr(pipeline_options, "accelerator_options"):
+        pipeline_options.accelerator_options.num_threads = options.get(
+            "threads_per_worker", 1
+        )
+
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+        }
+    )
+
+
+def convert_document(converter, pdf_path: str, output_path: str) -> ConversionResult:
+    """Convert one PDF and write its markdown atomically"""
+    from docling.datamodel.base_models import ConversionStatus
+
+    start = time.perf_counter()
+    result = converter.convert(pdf_path, raises_on_error=False)
+    elapsed = time.perf_counter() - start
+    name = Path(pdf_path).name
+
+    if result.status not in (
+        ConversionStatus.SUCCESS,
+        ConversionStatus.PARTIAL_SUCCESS,
+    ):
+        errors = "; ".join(str(error.error_message) for error in result.errors) or str(
+            result.status
+        )
+        return ConversionResult(name, "failed", seconds=elapsed, error=errors)
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(result.document.export_to_markdown())
+    os.replace(tmp_path, output_path)
+
+    status = "converted" if result.status == ConversionStatus.SUCCESS else "partial"
+    return ConversionResult(
+        name, status, pages=result.document.num_pages(), seconds=elapsed
+    )
+
+
+def _worker_main(conn, options: dict[str, Any]) -> None:
+    """Worker process: build the converter once, then convert what the parent sends"""
+    converter = build_converter(options)
+    conn.send("ready")
+    while (task := conn.recv()) is not None:
+        pdf_path, output_path = task
+        try:
+            result = convert_document(converter, pdf_path, output_path)
+        except Exception as e:
+            result = ConversionResult(
+                Path(pdf_path).name, "failed", error=f"{type(e).__name__}: {e}"
+            )
+        conn.send(result)
+
+
+class _Worker:
+    """Parent-side handle of one worker process"""
+
+    def __init__(self, context, options: dict[str, Any]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, options), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.task: tuple[str, str] | None = None
+        self.started = 0.0
+        self.completed = 0
+
+    def assign(self, pdf_path: Path, output_path: Path) -> None:
+        self.task = (str(pdf_path), str(output_path))
+        self.started = time.monotonic()
+        self.conn.send(self.task)
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            with contextlib.suppress(BrokenPipeError, OSError):
+                self.conn.send(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class PdfConverterPool:
+    """Converts PDFs to markdown on worker processes with per-document timeouts"""
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        timeout: float | None = None,
+        max_tasks_per_worker: int | None = None,
+        options: dict[str, Any] | None = None,
+        start_method: str = "spawn",
+    ):
+        """
+        Args:
+            workers: Worker processes (PDF_WORKERS, default the CPU count)
+            timeout: Seconds one document may take before its worker is killed
+                (PDF_TIMEOUT)
+            max_tasks_per_worker: Documents before a worker is replaced
+                (PDF_MAX_TASKS_PER_WORKER)
+            options: Pipeline options for build_converter
+            start_method: multiprocessing start method; spawn keeps model libraries
+                out of the parent
+        """
+        self.workers = workers or int(
+            os.getenv("PDF_WORKERS", str(os.cpu_count() or 1))
+        )
+        self.timeout = timeout or float(os.getenv("PDF_TIMEOUT", "600"))
+        self.max_tasks_per_worker = max_tasks_per_worker or int(
+            os.getenv("PDF_MAX_TASKS_PER_WORKER", "100")
+        )
+        self.options = options or {}
+        self.context = multiprocessing.get_context(start_method)
+
+    def convert(
+        self, pdf_files: list[Path], output_dir: Path
+    ) -> list[ConversionResult]:
+        """
+        Convert every PDF to output_dir/<stem>.md.
+
+        Returns:
+            One result per PDF, in completion order
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        queue = list(reversed(pdf_files))
+        results: list[ConversionResult] = []
+        total = len(pdf_files)
+        workers = [
+            _Worker(self.context, self.options) for _ in range(min(self.workers, total))
+        ]
+
+        def record(result: ConversionResult) -> None:
+            results.append(result)
+            icon = "✅" if result.status in ("converted", "partial") else "❌"
+            detail = (
+                f"{result.pages} pages in {result.seconds:.1f}s"
+                if result.pages
+                else result.error
+            )
+            print(
+                f"{icon} [{len(results)}/{total}] {result.file}: "
+                f"{result.status} ({detail})"
+            )
+
+        def replace(index: int, kill: bool) -> None:
+            workers[index].stop(kill=kill)
+            # Once the queue is empty, retired workers are not replaced
+            workers[index] = _Worker(self.context, self.options) if queue else None
+
+        try:
+            while len(results) < total:
+                workers = [worker for worker in workers if worker is not None]
+                for worker in workers:
+                    if worker.ready and worker.task is None and queue:
+                        pdf_path = queue.pop()
+                        worker.assign(pdf_path, output_dir / f"{pdf_path.stem}.md")
+
+                ready = wait(
+                    [w.conn for w in workers] + [w.process.sentinel for w in workers],
+                    timeout=1.0,
+                )
+                now = time.monotonic()
+                for index, worker in enumerate(list(workers)):
+                    if worker.conn in ready:
+                        try:
+                            message = worker.conn.recv()
+                        except (EOFError, OSError):
+                            # The worker is going away; give it a moment so the
+                            # exit is seen below
+                            worker.process.join(timeout=1)
+                            message = None
+                        if message == "ready":
+                            worker.ready = True
+                            continue
+                        if isinstance(message, ConversionResult):
+                            worker.task = None
+                            worker.completed += 1
+                            record(message)
+                            if worker.completed >= self.max_tasks_per_worker:
+                                replace(index, kill=False)
+                            continue
+
+                    if not worker.process.is_alive():
+                        if worker.task is not None:
+                            name = Path(worker.task[0]).name
+                            record(
+                                ConversionResult(
+                                    name,
+                                    "crashed",
+                                    seconds=now - worker.started,
+                                    error=(
+                                        "worker exited with code "
+                                        f"{worker.process.exitcode}"
+                                    ),
+                                )
+                            )
+                        elif not worker.ready:
+                            raise RuntimeError(
+                                "PDF worker failed to start "
+                                f"(exit code {worker.process.exitcode})"
+                            )
+                        replace(index, kill=True)
+                    elif (
+                        worker.task is not None and now - worker.started > self.timeout
+                    ):
+                        name = Path(worker.task[0]).name
+                        record(
+                            ConversionResult(
+                                name,
+                                "timeout",
+                                seconds=now - worker.started,
+                                error=f"exceeded {self.timeout:.0f}s",
+                            )
+                        )
+                        replace(index, kill=True)
+        finally:
+            for worker in workers:
+                if worker is not None:
+                    worker.stop(kill=worker.task is not None)
+        return results
+
+
+def summarize(
+    results: list[ConversionResult], skipped: int, elapsed: float
+) -> dict[str, Any]:
+    counts: dict[str, int] = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    pages = sum(result.pages for result in results)
+    return {
+        "documents": len(results),
+        "skipped": skipped,
+        **counts,
+        "pages": pages,
+        "seconds": round(elapsed, 1),
+        "pages_per_second": round(pages / elapsed, 2) if elapsed else 0.0,
+        "documents_per_second": round(len(results) / elapsed, 3) if elapsed else 0.0,
+        "failures": [
+            {**result._asdict(), "seconds": round(result.seconds, 1)}
+            for result in results
+            if result.status not in ("converted", "partial")
+        ],
+    }
+
+
+def convert_directory(
+    pdf_dir: str | Path,
+    output_dir: str | Path,
+    pool: PdfConverterPool | None = None,
+    force: bool = False,
+) -> dict[str, Any]:
+    """
+    Convert every PDF in a directory, skipping ones with existing markdown.
+
+    Returns:
+        Run summary, also written to output_dir/conversion_summary.json
+    """
+    pool = pool or PdfConverterPool()
+    output_dir = Path(output_dir)
+    pdf_files = sorted(Path(pdf_dir).glob("*.pdf"))
+    todo = [p for p in pdf_files if force or not (output_dir / f"{p.stem}.md").exists()]
+    print(
+        f"📄 Converting {len(todo)} PDFs "
+        f"({len(pdf_files) - len(todo)} already converted) on {pool.workers} workers"
+    )
+
+    start = time.perf_counter()
+    results = pool.convert(todo, output_dir) if todo else []
+    summary = summarize(
+        results, len(pdf_files) - len(todo), time.perf_counter() - start
+    )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "conversion_summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("pdf_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes (PDF_WORKERS, default the CPU count)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, help="Seconds per document (PDF_TIMEOUT)"
+    )
+    parser.add_argument(
+        "--max-tasks-per-worker", type=int, help="PDF_MAX_TASKS_PER_WORKER"
+    )
+    parser.add_argument(
+        "--ocr", action="store_true", help="Enable OCR (off in the notebook)"
+    )
+    parser.add_argument(
+        "--tables", action="store_true", help="Enable table structure recognition"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Convert PDFs that already have markdown"
+    )
+    args = parser.parse_args()
+
+    pool = PdfConverterPool(
+        workers=args.workers,
+        timeout=args.timeout,
+        max_tasks_per_worker=args.max_tasks_per_worker,
+        options={"do_ocr": args.ocr, "do_table_structure": args.tables},
+    )
+    summary = convert_directory(args.pdf_dir, args.output_dir, pool, args.force)
+    for key, value in summary.items():
+        if key != "failures":
+            print(f"  {key}: {value}")
+    for failure in summary["failures"]:
+        print(f"  ❌ {failure['file']}: {failure['status']} - {failure['error']}")
+
+
+if __name__ == "__main__":
+    main()
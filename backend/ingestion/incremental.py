@@ -0,0 +1,515 @@
+"""
+Incremental re-ingestion of the literature corpus.
+
+The notebook pipeline (docling conversion, Gemini sanitization, Gemini relevance
+analysis, semantic chunking, embedding) reprocesses every PDF on each run. Here
+each stage is registered with the artifact it writes per document, and a
+manifest records the content hash of every PDF and artifact along with the
+inputs each artifact was built from. A stage re-runs for a document only when
+the hash of one of its inputs, or its config string (model, prompt version,
+splitter settings), changed or its artifact is missing. A stage that reproduces
+an identical artifact stops the change from propagating further.
+
+The last stage writes the document's chunks as JSON Lines (ingestion.chunks
+format). sync_chunks then gives each chunk a stable id derived from the
+document and its text, diffs the ids against the manifest and, in one
+transaction, upserts new or changed chunks and deletes the ones that
+disappeared, including all chunks of deleted PDFs. Only a deleted PDF loses its
+manifest entry; a document that merely has no chunk file (its chunk stage
+failed) keeps the hashes and stage keys of the stages that already ran. Chunks
+whose text is unchanged keep their stored embedding, so a refresh costs
+embeddings only for new text.
+
+Wiring the notebook stages (the run functions write their output path):
+
+    out = Path("outputs")
+    stages = [
+        Stage("markdown", ("source",), lambda stem: out / f"full_text_v2/{stem}.md",
+              convert_pdf, "docling ocr=off"),
+        Stage("sanitized", ("markdown",),
+              lambda stem: out / f"cleaned_full_text_v2/{stem}.md",
+              sanitize, "gemini-2.5-flash v1"),
+        Stage("analysis", ("sanitized",), lambda stem: out / f"analysis/{stem}.json",
+              analyze, "gemini-2.5-flash v1"),
+        Stage("chunks", ("sanitized", "analysis"),
+              lambda stem: out / f"chunks/{stem}.jsonl", chunk, "semantic p95 b1"),
+    ]
+    manifest = Manifest(out / "ingestion_manifest.json")
+    pipeline = IncrementalPipeline(manifest, "pdf_pub", stages)
+    chunk_files = pipeline.run()
+    loader = ChunkLoader(create_db_engine())
+    asyncio.run(
+        sync_chunks(pipeline.manifest, chunk_files, loader, sources=pipeline.sources())
+    )
+
+With the chunk files already on disk, the database side runs on its own (from
+backend/):
+    python -m ingestion.incremental status --source-dir notebooks/pdf_pub
+    python -m ingestion.incremental sync --source-dir notebooks/pdf_pub \
+        --chunks-dir notebooks/outputs/chunks
+
+sync takes the documents from the PDFs in --source-dir, like status: the chunks
+of a PDF that is gone are deleted. Its chunk file is left in place and listed,
+unless --prune is given.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from collections.abc import Callable, Collection
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from ingestion.chunks import iter_chunks
+from ingestion.load_chunks import ChunkLoader
+from sqlalchemy import text
+
+MANIFEST_VERSION = 1
+SOURCE = "source"
+
+EXISTING_EMBEDDINGS_QUERY = text(
+    "SELECT chunk_id FROM document_chunks "
+    "WHERE chunk_id = ANY(:ids) AND embedding IS NOT NULL"
+)
+
+
+def file_hash(path: str | Path) -> str:
+    """sha256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def stable_chunk_id(stem: str, chunk_text: str, occurrence: int = 0) -> str:
+    """
+    chunk_id that survives re-chunking as long as the text is unchanged.
+
+    Args:
+        stem: Document the chunk belongs to
+        chunk_text: Chunk text
+        occurrence: How many identical texts came earlier in the same document
+    """
+    suffix = f"-{occurrence}" if occurrence else ""
+    return f"{stem[:200]}:{text_hash(chunk_text)[:32]}{suffix}"
+
+
+class Stage(NamedTuple):
+    """
+    One per-document step of the pipeline.
+
+    Attributes:
+        name: Artifact name, referenced by later stages' inputs
+        inputs: SOURCE (the PDF) and/or names of earlier stages
+        output: Document stem -> artifact path
+        run: run(stem, {input name: path}, output path) writes the artifact
+        config: Anything besides the inputs that shapes the output; changing it
+            re-runs the stage
+    """
+
+    name: str
+    inputs: tuple[str, ...]
+    output: Callable[[str], Path]
+    run: Callable[[str, dict[str, Path], Path], None]
+    config: str = ""
+
+
+class Manifest:
+    """
+    Per-document hashes, stage input keys and synced chunks, kept in a JSON file.
+
+    documents[stem] holds:
+        source: PDF path
+        hashes: artifact name -> content hash (SOURCE included)
+        keys: stage name -> hash of the inputs and config it was last built from
+        chunks_hash: hash of the chunk file last synced to document_chunks
+        chunks: chunk_id -> row hash of the synced chunks
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.documents: dict[str, dict[str, Any]] = {}
+        # False until the first sync, which replaces document_chunks wholesale
+        self.synced = False
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == MANIFEST_VERSION:
+                self.documents = data["documents"]
+                self.synced = data.get("synced", False)
+            else:
+                print(
+                    f"⚠️ Ignoring manifest {self.path} "
+                    f"with version {data.get('version')}"
+                )
+
+    def document(self, stem: str) -> dict[str, Any]:
+        return self.documents.setdefault(stem, {"hashes": {}, "keys": {}, "chunks": {}})
+
+    def save(self) -> None:
+        """Write atomically, so an interrupted run keeps the previous manifest intact"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "synced": self.synced,
+            "documents": self.documents,
+        }
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+class IncrementalPipeline:
+    """Runs the stages of every PDF whose inputs changed since the last manifest"""
+
+    def __init__(
+        self,
+        manifest: Manifest,
+        source_dir: str | Path,
+        stages: list[Stage],
+        pattern: str = "*.pdf",
+    ):
+        """
+        Args:
+            manifest: Manifest, saved after each document
+            source_dir: Directory with the PDFs
+            stages: Stages in dependency order; the last one writes the chunk file
+            pattern: Glob for the source files
+        """
+        self.manifest = manifest
+        self.source_dir = Path(source_dir)
+        self.stages = stages
+        self.pattern = pattern
+
+        known = {SOURCE}
+        for stage in stages:
+            missing = [name for name in stage.inputs if name not in known]
+            if missing:
+                raise ValueError(
+                    f"Stage '{stage.name}' depends on {missing}, "
+                    "which no earlier stage produces"
+                )
+            known.add(stage.name)
+
+        self.stage_runs: dict[str, int] = {stage.name: 0 for stage in stages}
+        self.failures: dict[str, str] = {}
+
+    def sources(self) -> dict[str, Path]:
+        return {path.stem: path for path in sorted(self.source_dir.glob(self.pattern))}
+
+    def plan(self) -> dict[str, list[str]]:
+        """
+        New, changed, unchanged and removed PDFs by content hash (stage config
+        changes not included)
+        """
+        sources = self.sources()
+        plan: dict[str, list[str]] = {
+            "new": [],
+            "changed": [],
+            "unchanged": [],
+            "removed": [],
+        }
+        for stem, path in sources.items():
+            entry = self.manifest.documents.get(stem)
+            if entry is None:
+                plan["new"].append(stem)
+            elif entry["hashes"].get(SOURCE) != file_hash(path):
+                plan["changed"].append(stem)
+            else:
+                plan["unchanged"].append(stem)
+        plan["removed"] = [
+            stem for stem in self.manifest.documents if stem not in sources
+        ]
+        return plan
+
+    def stage_key(self, stage: Stage, hashes: dict[str, str]) -> str:
+        return text_hash(
+            json.dumps([stage.config, [hashes[name] for name in stage.inputs]])
+        )
+
+    def run_document(self, stem: str, source: Path) -> Path | None:
+        """
+        Bring one document's artifacts up to date.
+
+        Returns:
+            The document's chunk file, or None if a stage failed
+        """
+        entry = self.manifest.document(stem)
+        entry["source"] = str(source)
+        hashes = {SOURCE: file_hash(source)}
+        paths = {SOURCE: source}
+
+        for stage in self.stages:
+            output = stage.output(stem)
+            key = self.stage_key(stage, hashes)
+            if entry["keys"].get(stage.name) != key or not output.exists():
+                output.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    stage.run(
+                        stem, {name: paths[name] for name in stage.inputs}, output
+                    )
+                except Exception as e:
+                    print(f"❌ {stage.name} failed for {stem}: {e}")
+                    self.failures[stem] = f"{stage.name}: {e}"
+                    return None
+                self.stage_runs[stage.name] += 1
+                entry["keys"][stage.name] = key
+            paths[stage.name] = output
+            hashes[stage.name] = file_hash(output)
+
+        entry["hashes"] = hashes
+        self.manifest.save()
+        return paths[self.stages[-1].name]
+
+    def run(self) -> dict[str, Path]:
+        """
+        Run every document, keeping the previous artifacts of documents that fail.
+
+        Returns:
+            Document stem -> chunk file, for every PDF still in source_dir
+        """
+        chunk_files = {}
+        for stem, source in self.sources().items():
+            chunk_file = self.run_document(stem, source)
+            if chunk_file is None:
+                # Keep serving the chunks synced before the failure
+                previous = self.stages[-1].output(stem)
+                if previous.exists():
+                    chunk_files[stem] = previous
+                continue
+            chunk_files[stem] = chunk_file
+        runs = ", ".join(f"{name}={count}" for name, count in self.stage_runs.items())
+        print(f"✅ Pipeline done ({runs}, {len(self.failures)} failed)")
+        return chunk_files
+
+
+def document_rows(stem: str, chunk_file: Path) -> dict[str, tuple[str, dict[str, Any]]]:
+    """
+    A chunk file's chunks under stable ids.
+
+    Returns:
+        chunk_id -> (row hash, chunk with the stable chunk_id and its chunk_index)
+    """
+    rows = {}
+    occurrences: dict[str, int] = {}
+    for index, chunk in enumerate(iter_chunks(chunk_file)):
+        chunk_text = chunk.get("text") or ""
+        occurrence = occurrences.get(chunk_text, 0)
+        occurrences[chunk_text] = occurrence + 1
+        chunk_id = stable_chunk_id(stem, chunk_text, occurrence)
+        chunk = {
+            **chunk,
+            "chunk_id": chunk_id,
+            "chunk_index": chunk.get("chunk_index", index),
+        }
+        chunk.pop("embedding", None)
+        rows[chunk_id] = (
+            text_hash(json.dumps(chunk, sort_keys=True, ensure_ascii=False)),
+            chunk,
+        )
+    return rows
+
+
+async def sync_chunks(
+    manifest: Manifest,
+    chunk_files: dict[str, Path],
+    loader: ChunkLoader,
+    maintenance_work_mem: str | None = None,
+    *,
+    sources: Collection[str],
+) -> dict[str, Any]:
+    """
+    Apply chunk file changes to document_chunks by chunk_id.
+
+    Documents whose chunk file hash matches the last sync are skipped without
+    being read. The chunks of documents in the manifest but not in chunk_files
+    are deleted; the manifest entry itself is only dropped when the document is
+    not in sources either, so the stage keys of a PDF that still exists survive.
+
+    Args:
+        manifest: Manifest holding the previously synced chunks
+        chunk_files: Document stem -> chunk file for every current document
+        loader: Loader used for the upsert, deletes and embeddings
+        maintenance_work_mem: Memory for a vector index rebuild, e.g. "1GB"
+        sources: Stems of the documents whose PDF still exists
+
+    Returns:
+        Sync statistics
+    """
+    # Before the first sync document_chunks may hold rows under the notebook's
+    # random ids
+    mode = "upsert" if manifest.synced else "replace"
+    upserts: list[dict[str, Any]] = []
+    deletes: list[str] = []
+    reused: list[str] = []
+    synced: dict[str, tuple[str, dict[str, str]]] = {}
+
+    for stem, chunk_file in chunk_files.items():
+        entry = manifest.document(stem)
+        chunks_hash = file_hash(chunk_file)
+        if mode == "upsert" and entry.get("chunks_hash") == chunks_hash:
+            continue
+        rows = document_rows(stem, chunk_file)
+        previous = entry.get("chunks", {}) if mode == "upsert" else {}
+        for chunk_id, (row_hash, chunk) in rows.items():
+            if previous.get(chunk_id) != row_hash:
+                upserts.append(chunk)
+                if chunk_id in previous:
+                    reused.append(chunk_id)
+        deletes.extend(chunk_id for chunk_id in previous if chunk_id not in rows)
+        synced[stem] = (
+            chunks_hash,
+            {chunk_id: row_hash for chunk_id, (row_hash, _) in rows.items()},
+        )
+
+    unsynced = [stem for stem in manifest.documents if stem not in chunk_files]
+    removed = [stem for stem in unsynced if stem not in sources]
+    for stem in unsynced:
+        deletes.extend(manifest.documents[stem].get("chunks", {}))
+
+    stats: dict[str, Any] = {
+        "mode": mode,
+        "documents_changed": len(synced),
+        "documents_removed": len(removed),
+        "documents_without_chunks": len(unsynced) - len(removed),
+        "upserted": len(upserts),
+        "deleted": len(deletes),
+    }
+    if upserts or deletes or mode == "replace":
+        # Only reuse embeddings that are actually stored
+        if reused:
+            with loader.engine.connect() as conn:
+                keep = {
+                    row.chunk_id
+                    for row in conn.execute(EXISTING_EMBEDDINGS_QUERY, {"ids": reused})
+                }
+        else:
+            keep = set()
+        stats["embeddings_reused"] = len(keep)
+
+        fd, changes_path = tempfile.mkstemp(suffix=".jsonl", prefix="chunk_changes_")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for chunk in upserts:
+                    f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            print(
+                f"🔄 Syncing {len(upserts)} upserts and {len(deletes)} deletes ({mode})"
+            )
+            stats["load"] = await loader.load(
+                changes_path,
+                mode,
+                maintenance_work_mem=maintenance_work_mem,
+                delete_chunk_ids=deletes if mode == "upsert" else None,
+                keep_embeddings=keep,
+            )
+        finally:
+            os.remove(changes_path)
+    else:
+        # Deleted PDFs that had no chunks still leave the manifest
+        print("✅ document_chunks is up to date")
+
+    for stem, (chunks_hash, chunks) in synced.items():
+        entry = manifest.document(stem)
+        entry["chunks_hash"] = chunks_hash
+        entry["chunks"] = chunks
+    for stem in unsynced:
+        if stem in removed:
+            del manifest.documents[stem]
+        else:
+            entry = manifest.documents[stem]
+            entry["chunks"] = {}
+            entry.pop("chunks_hash", None)
+    manifest.synced = True
+    manifest.save()
+    return stats
+
+
+def main():
+    from service.database import create_db_engine
+
+    parser = argparse.ArgumentParser(description="Incremental corpus ingestion")
+    parser.add_argument("command", choices=("status", "sync"))
+    parser.add_argument(
+        "--manifest", default="notebooks/outputs/ingestion_manifest.json"
+    )
+    parser.add_argument(
+        "--source-dir", default="notebooks/pdf_pub", help="PDFs, the current documents"
+    )
+    parser.add_argument(
+        "--chunks-dir",
+        default="notebooks/outputs/chunks",
+        help="<stem>.jsonl chunk files, for sync",
+    )
+    parser.add_argument(
+        "--maintenance-work-mem", help="e.g. 1GB, speeds up an index rebuild"
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete chunk files whose PDF is not in --source-dir",
+    )
+    args = parser.parse_args()
+
+    manifest = Manifest(args.manifest)
+    if args.command == "status":
+        plan = IncrementalPipeline(manifest, args.source_dir, []).plan()
+        for status, stems in plan.items():
+            print(f"{status}: {len(stems)}")
+            for stem in stems if status != "unchanged" else []:
+                print(f"  {stem}")
+        return
+
+    sources = IncrementalPipeline(manifest, args.source_dir, []).sources()
+    if not sources:
+        # Every document would count as deleted
+        parser.error(f"No PDFs in {args.source_dir}")
+    chunk_files, stale = {}, []
+    for path in sorted(Path(args.chunks_dir).glob("*.jsonl")):
+        if path.stem in sources:
+            chunk_files[path.stem] = path
+        else:
+            stale.append(path)
+    for stem in sources.keys() - chunk_files.keys():
+        print(
+            f"⚠️ No chunk file for {stem}, "
+            "any chunks synced for it are deleted until it has one"
+        )
+
+    engine = create_db_engine()
+    try:
+        stats = asyncio.run(
+            sync_chunks(
+                manifest,
+                chunk_files,
+                ChunkLoader(engine),
+                args.maintenance_work_mem,
+                sources=sources.keys(),
+            )
+        )
+    finally:
+        engine.dispose()
+    if stale:
+        # Only once their rows are deleted, so a failed sync can be retried
+        action = "Removing" if args.prune else "Leaving (--prune removes them)"
+        print(
+            f"🗑️ {action} {len(stale)} chunk files without a PDF in {args.source_dir}:"
+        )
+        for path in stale:
+            print(f"  {path}")
+            if args.prune:
+                path.unlink()
+    stats["stale_chunk_files"] = len(stale)
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
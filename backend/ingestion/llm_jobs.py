@@ -0,0 +1,225 @@
+"""
+Async runner for batches of LLM chat completions.
+
+Replaces the notebook's ThreadPoolExecutor + Semaphore + fixed sleep: a fixed
+number of workers pull jobs lazily, every call passes through a RateLimiter
+(requests and tokens per minute, adapting to the API's rate-limit headers),
+and each result is appended to a JSON Lines file as soon as it is parsed.
+The output file is the checkpoint: a rerun skips the ids it already holds and
+retries the ones that failed, which are listed in a separate errors file.
+
+Works with any OpenAI-compatible endpoint (OpenAI, Gemini's
+/v1beta/openai/ endpoint, or a local fake server in tests).
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from ai.context_packer import get_token_counter
+from ingestion.backoff import is_retryable, retry_delay
+from ingestion.rate_limit import RateLimiter
+from openai import AsyncOpenAI, RateLimitError
+
+
+class LLMJob(NamedTuple):
+    """
+    One chat completion.
+
+    Attributes:
+        id: Key of the result in the output file
+        messages: Chat messages
+        max_tokens: Completion token limit, also charged to the token bucket up front
+        response_format: Optional response_format (e.g. a JSON schema)
+    """
+
+    id: str
+    messages: list[dict[str, str]]
+    max_tokens: int
+    response_format: dict[str, Any] | None = None
+
+
+def load_results(path: str | Path) -> dict[str, Any]:
+    """id -> result from a runner output file, skipping a line cut short by a crash"""
+    results = {}
+    path = Path(path)
+    if not path.exists():
+        return results
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[record["id"]] = record["result"]
+    return results
+
+
+class LLMJobRunner:
+    """Runs LLMJobs concurrently under a RateLimiter, persisting each result"""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str,
+        limiter: RateLimiter,
+        output_path: str | Path,
+        concurrency: int | None = None,
+        max_retries: int | None = None,
+        temperature: float = 0.1,
+    ):
+        """
+        Args:
+            client: AsyncOpenAI client (create it with max_retries=0; retries happen
+                here)
+            model: Chat model
+            limiter: Shared request/token rate limiter
+            output_path: JSON Lines file of {"id", "result"}; errors go to
+                <stem>.errors.jsonl
+            concurrency: Calls in flight (LLM_JOB_CONCURRENCY)
+            max_retries: Retries per job on 429/5xx (LLM_JOB_MAX_RETRIES)
+            temperature: Sampling temperature
+        """
+        self.client = client
+        self.model = model
+        self.limiter = limiter
+        self.output_path = Path(output_path)
+        self.errors_path = self.output_path.with_name(
+            f"{self.output_path.stem}.errors.jsonl"
+        )
+        self.concurrency = concurrency or int(os.getenv("LLM_JOB_CONCURRENCY", "16"))
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else int(os.getenv("LLM_JOB_MAX_RETRIES", "8"))
+        )
+        self.temperature = temperature
+        self.counter = get_token_counter(model)
+
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def estimate_tokens(self, job: LLMJob) -> int:
+        prompt = sum(self.counter.count(message["content"]) for message in job.messages)
+        return prompt + job.max_tokens
+
+    async def complete(self, job: LLMJob) -> str:
+        """One completion with rate limiting and retries; returns the message content"""
+        estimate = self.estimate_tokens(job)
+        attempt = 0
+        while True:
+            await self.limiter.acquire(estimate)
+            try:
+                raw = await self.client.chat.completions.with_raw_response.create(
+                    model=self.model,
+                    messages=job.messages,
+                    max_tokens=job.max_tokens,
+                    temperature=self.temperature,
+                    **(
+                        {"response_format": job.response_format}
+                        if job.response_format
+                        else {}
+                    ),
+                )
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, attempt)
+                if isinstance(e, RateLimitError):
+                    self.limiter.on_rate_limited(delay)
+                    self.limiter.on_headers(e.response.headers)
+                print(
+                    f"⚠️ {job.id}: {type(e).__name__}, retrying in {delay:.1f}s "
+                    f"({attempt + 1}/{self.max_retries})"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            self.limiter.on_headers(raw.headers)
+            self.limiter.on_success()
+            completion = raw.parse()
+            if completion.usage:
+                self.prompt_tokens += completion.usage.prompt_tokens
+                self.completion_tokens += completion.usage.completion_tokens
+                self.limiter.record_usage(estimate, completion.usage.total_tokens)
+            return completion.choices[0].message.content or ""
+
+    async def run(
+        self, jobs: Iterable[LLMJob], parse: Callable[[LLMJob, str], Any]
+    ) -> dict[str, Any]:
+        """
+        Run every job whose id is not in the output file yet.
+
+        Args:
+            jobs: Jobs, consumed lazily so they can be built as they are needed
+            parse: parse(job, content) -> JSON-serializable result; raising marks the
+                job failed
+
+        Returns:
+            Run statistics
+        """
+        done = set(load_results(self.output_path))
+        pending: Iterator[LLMJob] = iter(jobs)
+        write_lock = asyncio.Lock()
+        start = time.perf_counter()
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        def next_job() -> LLMJob | None:
+            for job in pending:
+                if job.id in done:
+                    self.skipped += 1
+                    continue
+                return job
+            return None
+
+        async def append(f, record: dict[str, Any]) -> None:
+            async with write_lock:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        async def worker(out, errors) -> None:
+            while (job := next_job()) is not None:
+                try:
+                    result = parse(job, await self.complete(job))
+                except Exception as e:
+                    self.failed += 1
+                    print(f"❌ {job.id}: {type(e).__name__}: {e}")
+                    await append(
+                        errors, {"id": job.id, "error": f"{type(e).__name__}: {e}"}
+                    )
+                    continue
+                self.completed += 1
+                await append(out, {"id": job.id, "result": result})
+                print(f"✅ [{self.completed}] {job.id}")
+
+        # Failures are retried on every run, so only this run's are kept
+        with (
+            open(self.output_path, "a", encoding="utf-8") as out,
+            open(self.errors_path, "w", encoding="utf-8") as errors,
+        ):
+            await asyncio.gather(
+                *(worker(out, errors) for _ in range(self.concurrency))
+            )
+
+        elapsed = time.perf_counter() - start
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "seconds": round(elapsed, 1),
+            "jobs_per_minute": round(self.completed * 60 / elapsed, 1)
+            if elapsed
+            else 0.0,
+            **self.limiter.stats(),
+        }
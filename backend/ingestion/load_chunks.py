@@ -0,0 +1,391 @@
+"""
+Bulk-load chunk files into document_chunks.
+
+Replaces the notebook upload, which embedded and inserted one chunk at a time.
+The loader streams chunks from a JSON or JSON Lines file, embeds them in full
+batches with several embeddings calls in flight (retrying rate limits as the API
+headers direct), and COPYs each window of rows into a temporary staging table
+while the next window is embedding. One transaction then merges the staging
+table into document_chunks:
+
+- upsert: insert new chunk_ids and update existing ones, leaving other rows alone
+- replace: truncate document_chunks first, so the table matches the file exactly
+
+For large loads the vector index is dropped inside that transaction and rebuilt
+once afterwards (python -m ai.vector_index rebuild), which is far cheaper than
+maintaining HNSW row by row.
+
+Usage (from backend/, with DATABASE_URL and OPENAI_API_KEY set):
+    python -m ingestion.load_chunks notebooks/outputs/semantic_chunks.json
+    python -m ingestion.load_chunks chunks.jsonl --mode replace \
+        --maintenance-work-mem 1GB
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import time
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import Any
+
+from ai.embedding_batcher import EmbeddingBatcher
+from ai.vector_index import VECTOR_INDEXES_QUERY, VectorIndexManager
+from ingestion.backoff import with_backoff
+from ingestion.chunks import CHUNK_COLUMNS, chunk_row, copy_line, iter_chunks
+from openai import AsyncOpenAI
+from sqlalchemy import Engine
+
+LOAD_MODES = ("upsert", "replace")
+DEFER_INDEX_CHOICES = ("auto", "yes", "no")
+STAGING_TABLE = "document_chunks_staging"
+
+_columns = ", ".join(CHUNK_COLUMNS)
+_updates = ", ".join(
+    # A NULL staged embedding keeps the stored one (ChunkLoader.load keep_embeddings)
+    "embedding = COALESCE(EXCLUDED.embedding, document_chunks.embedding)"
+    if column == "embedding"
+    else f"{column} = EXCLUDED.{column}"
+    for column in CHUNK_COLUMNS
+    if column != "chunk_id"
+)
+# The last occurrence of a chunk_id in the file wins
+_latest = (
+    f"SELECT DISTINCT ON (chunk_id) {_columns} FROM {STAGING_TABLE} "
+    "ORDER BY chunk_id, seq DESC"
+)
+
+CREATE_STAGING_SQL = [
+    f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP "
+    f"AS SELECT {_columns} FROM document_chunks WITH NO DATA",
+    f"ALTER TABLE {STAGING_TABLE} ADD COLUMN seq BIGSERIAL",
+]
+COPY_SQL = f"COPY {STAGING_TABLE} ({_columns}) FROM STDIN"
+UPSERT_SQL = (
+    f"INSERT INTO document_chunks ({_columns}) {_latest} "
+    f"ON CONFLICT (chunk_id) DO UPDATE SET {_updates}"
+)
+REPLACE_SQL = [
+    "TRUNCATE document_chunks",
+    f"INSERT INTO document_chunks ({_columns}) {_latest}",
+]
+DELETE_SQL = "DELETE FROM document_chunks WHERE chunk_id = ANY(%s)"
+
+
+def windows(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(items)
+    while window := list(islice(iterator, size)):
+        yield window
+
+
+def should_defer_index(
+    cursor, mode: str, staged: int, defer_index: str, defer_index_ratio: float
+) -> bool:
+    if defer_index != "auto":
+        return defer_index == "yes"
+    if mode == "replace":
+        return True
+    cursor.execute("SELECT count(*) FROM document_chunks")
+    existing = cursor.fetchone()[0]
+    return staged >= existing * defer_index_ratio
+
+
+def merge_staging(
+    cursor,
+    mode: str,
+    staged: int,
+    defer_index: str = "auto",
+    defer_index_ratio: float = 0.2,
+    delete_chunk_ids: list[str] | None = None,
+) -> bool:
+    """
+    Merge the staging table into document_chunks in the cursor's transaction.
+
+    Args:
+        cursor: Cursor of the connection holding the staging table
+        mode: "upsert" or "replace"
+        staged: Staged row count, for the defer_index="auto" decision
+        defer_index: "auto", "yes" or "no"
+        defer_index_ratio: Fraction of the existing rows at which "auto" defers
+        delete_chunk_ids: Rows deleted before the merge
+
+    Returns:
+        Whether the vector index was dropped and needs finish_load to rebuild it
+    """
+    deferred = should_defer_index(cursor, mode, staged, defer_index, defer_index_ratio)
+    if deferred:
+        cursor.execute(str(VECTOR_INDEXES_QUERY))
+        for name, *_ in cursor.fetchall():
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+    if delete_chunk_ids:
+        cursor.execute(DELETE_SQL, (list(delete_chunk_ids),))
+        print(f"🗑️ Deleted {cursor.rowcount} chunks")
+    if mode == "replace":
+        for statement in REPLACE_SQL:
+            cursor.execute(statement)
+    else:
+        cursor.execute(UPSERT_SQL)
+    return deferred
+
+
+def finish_load(
+    engine: Engine, deferred: bool, maintenance_work_mem: str | None = None
+) -> None:
+    """After the merge commits: rebuild a deferred vector index or refresh statistics"""
+    if deferred:
+        VectorIndexManager(engine).rebuild(maintenance_work_mem)
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("ANALYZE document_chunks")
+
+
+class ChunkLoader:
+    """Streams a chunk file through batched embedding and COPY into document_chunks"""
+
+    def __init__(
+        self,
+        engine: Engine,
+        client: AsyncOpenAI | None = None,
+        embedding_model: str = "text-embedding-3-small",
+        batch_size: int | None = None,
+        concurrency: int | None = None,
+        max_retries: int | None = None,
+        defer_index_ratio: float | None = None,
+    ):
+        """
+        Args:
+            engine: Sync engine on the psycopg2 driver (COPY goes through its raw
+                connection)
+            client: AsyncOpenAI client (defaults to one without built-in retries)
+            embedding_model: Must match the model used for queries
+            batch_size: Inputs per embeddings call (INGEST_EMBEDDING_BATCH_SIZE)
+            concurrency: Embeddings calls in flight (INGEST_EMBEDDING_CONCURRENCY)
+            max_retries: Retries per embeddings call on rate limits and 5xx
+                (INGEST_MAX_RETRIES)
+            defer_index_ratio: With defer_index="auto", upserts of at least this
+                fraction of the existing rows defer the vector index
+                (INGEST_DEFER_INDEX_RATIO)
+        """
+        self.engine = engine
+        self.batch_size = batch_size or int(
+            os.getenv("INGEST_EMBEDDING_BATCH_SIZE", "256")
+        )
+        self.concurrency = concurrency or int(
+            os.getenv("INGEST_EMBEDDING_CONCURRENCY", "8")
+        )
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else int(os.getenv("INGEST_MAX_RETRIES", "6"))
+        )
+        self.defer_index_ratio = defer_index_ratio or float(
+            os.getenv("INGEST_DEFER_INDEX_RATIO", "0.2")
+        )
+        # Two rounds of batches per window keep every embeddings slot busy
+        self.window_size = self.batch_size * self.concurrency * 2
+
+        client = client or AsyncOpenAI(
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "60")), max_retries=0
+        )
+        self.batcher = EmbeddingBatcher(
+            client,
+            embedding_model,
+            max_batch_size=self.batch_size,
+            max_concurrent_batches=self.concurrency,
+        )
+
+        self.rows_read = 0
+        self.rows_embedded = 0
+        self.rows_skipped = 0
+
+    async def embed_rows(
+        self, rows: list[dict[str, Any]], keep_embeddings: set[str] | None = None
+    ) -> None:
+        """Fill in the embedding of every row that has none, one batch per call"""
+        keep_embeddings = keep_embeddings or set()
+        missing = [
+            row
+            for row in rows
+            if row["embedding"] is None and row["chunk_id"] not in keep_embeddings
+        ]
+        batches = [
+            missing[i : i + self.batch_size]
+            for i in range(0, len(missing), self.batch_size)
+        ]
+
+        async def embed_batch(batch: list[dict[str, Any]]) -> None:
+            texts = [row["text"] for row in batch]
+            vectors = await with_backoff(
+                lambda: self.batcher.embed_many(texts), max_retries=self.max_retries
+            )
+            for row, vector in zip(batch, vectors, strict=True):
+                row["embedding"] = vector
+
+        await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        self.rows_embedded += len(missing)
+
+    def read_rows(self, path: str) -> Iterator[dict[str, Any]]:
+        for chunk in iter_chunks(path):
+            self.rows_read += 1
+            if not (chunk.get("text") or "").strip():
+                self.rows_skipped += 1
+                continue
+            yield chunk_row(chunk)
+
+    @staticmethod
+    def copy_rows(cursor, rows: list[dict[str, Any]]) -> None:
+        buffer = io.StringIO("".join(copy_line(row) for row in rows))
+        cursor.copy_expert(COPY_SQL, buffer)
+
+    async def stage(
+        self, cursor, path: str, keep_embeddings: set[str] | None = None
+    ) -> int:
+        """
+        Embed and COPY every chunk of a file into the staging table.
+
+        COPY of one window runs in a thread while the next window embeds; the
+        connection is only ever used by one COPY at a time.
+
+        Returns:
+            Number of staged rows
+        """
+        staged = 0
+        pending_copy: asyncio.Task | None = None
+        for rows in windows(self.read_rows(path), self.window_size):
+            await self.embed_rows(rows, keep_embeddings)
+            if pending_copy is not None:
+                await pending_copy
+            pending_copy = asyncio.create_task(
+                asyncio.to_thread(self.copy_rows, cursor, rows)
+            )
+            staged += len(rows)
+            print(f"📥 Staged {staged} chunks ({self.rows_embedded} embedded)")
+        if pending_copy is not None:
+            await pending_copy
+        return staged
+
+    async def load(
+        self,
+        path: str,
+        mode: str = "upsert",
+        defer_index: str = "auto",
+        maintenance_work_mem: str | None = None,
+        delete_chunk_ids: list[str] | None = None,
+        keep_embeddings: set[str] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Load a chunk file into document_chunks.
+
+        Args:
+            path: JSON array or JSON Lines chunk file
+            mode: "upsert" or "replace"
+            defer_index: "auto", "yes" or "no" - drop the vector index during the
+                merge and rebuild it afterwards
+            maintenance_work_mem: Memory for the index rebuild, e.g. "1GB"
+            delete_chunk_ids: Rows deleted in the same transaction as the merge
+            keep_embeddings: chunk_ids whose text is unchanged; they are not
+                embedded again and upserts keep their stored embedding
+
+        Returns:
+            Load statistics
+        """
+        if mode not in LOAD_MODES:
+            raise ValueError(
+                f"Unknown load mode '{mode}', expected one of {LOAD_MODES}"
+            )
+        start = time.perf_counter()
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for statement in CREATE_STAGING_SQL:
+                cursor.execute(statement)
+            staged = await self.stage(cursor, path, keep_embeddings)
+            if not staged and not delete_chunk_ids:
+                connection.rollback()
+                print("⚠️ No chunks to load")
+                return self.stats(staged, False, time.perf_counter() - start)
+            embedded_at = time.perf_counter()
+
+            deferred = merge_staging(
+                cursor,
+                mode,
+                staged,
+                defer_index,
+                self.defer_index_ratio,
+                delete_chunk_ids,
+            )
+            connection.commit()
+            print(
+                f"✅ Merged {staged} chunks into document_chunks ({mode}) "
+                f"in {time.perf_counter() - embedded_at:.1f}s"
+            )
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        finish_load(self.engine, deferred, maintenance_work_mem)
+        return self.stats(staged, deferred, time.perf_counter() - start)
+
+    def stats(self, staged: int, deferred: bool, elapsed: float) -> dict[str, Any]:
+        return {
+            "read": self.rows_read,
+            "skipped": self.rows_skipped,
+            "embedded": self.rows_embedded,
+            "loaded": staged,
+            "index_deferred": deferred,
+            "seconds": round(elapsed, 1),
+            "rows_per_second": round(staged / elapsed, 1) if elapsed else 0.0,
+            "embedding": self.batcher.stats(),
+        }
+
+
+def main():
+    from service.database import create_db_engine
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("path", help="Chunk file (JSON array or JSON Lines)")
+    parser.add_argument("--mode", choices=LOAD_MODES, default="upsert")
+    parser.add_argument("--defer-index", choices=DEFER_INDEX_CHOICES, default="auto")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Inputs per embeddings call (INGEST_EMBEDDING_BATCH_SIZE)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Embeddings calls in flight (INGEST_EMBEDDING_CONCURRENCY)",
+    )
+    parser.add_argument("--embedding-model", default="text-embedding-3-small")
+    parser.add_argument(
+        "--maintenance-work-mem", help="e.g. 1GB, speeds up the index rebuild"
+    )
+    args = parser.parse_args()
+
+    engine = create_db_engine()
+    loader = ChunkLoader(
+        engine,
+        embedding_model=args.embedding_model,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+    )
+    try:
+        stats = asyncio.run(
+            loader.load(
+                args.path, args.mode, args.defer_index, args.maintenance_work_mem
+            )
+        )
+    finally:
+        engine.dispose()
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Client-side rate limiting for LLM APIs with request and token quotas.
+
+Providers limit both requests per minute and tokens per minute. RateLimiter
+keeps a token bucket for each: a call waits until both can cover it, so bursts
+use the whole quota and sustained load settles at the configured rates instead
+of a fixed delay per request. Buckets are charged with an estimate up front and
+corrected with the actual usage afterwards.
+
+The limiter also adapts to what the API reports:
+- x-ratelimit-remaining-* headers pull the buckets down to the server's view
+  (another process may share the key)
+- x-ratelimit-limit-* headers lower the configured rates to the real quota
+- a 429 pauses every caller for the delay the headers ask for and halves the
+  rates, which then recover additively with each success
+"""
+
+import asyncio
+import time
+
+import httpx
+
+
+class TokenBucket:
+    """Capacity refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.per_minute = per_minute
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.per_minute / 60
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until amount is available; amounts above capacity wait for a full
+        bucket
+        """
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def take(self, amount: float) -> None:
+        """Consume amount; the level may go negative, delaying later callers"""
+        self._refill()
+        self.level -= amount
+
+    def drain_to(self, level: float) -> None:
+        self._refill()
+        self.level = min(self.level, level)
+
+
+def _header_number(headers: httpx.Headers, name: str) -> float | None:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets with adaptive rates"""
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        min_scale: float = 0.1,
+        recovery: float = 0.02,
+    ):
+        """
+        Args:
+            requests_per_minute: Request quota
+            tokens_per_minute: Token quota (prompt plus completion)
+            min_scale: Lowest fraction of the quota a run of 429s can reduce the
+                rates to
+            recovery: Fraction of the quota restored per successful call
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_scale = min_scale
+        self.recovery = recovery
+        self.scale = 1.0
+
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.waited = 0.0
+        self.rate_limited = 0
+
+    def _apply_scale(self) -> None:
+        self.requests.per_minute = self.requests_per_minute * self.scale
+        self.tokens.per_minute = self.tokens_per_minute * self.scale
+
+    async def acquire(self, tokens: float) -> None:
+        """
+        Wait until a call estimated at tokens fits both quotas, then charge it.
+
+        Callers are served in arrival order: the lock is held while waiting.
+        """
+        async with self._lock:
+            while True:
+                wait = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens),
+                )
+                if wait <= 0:
+                    break
+                self.waited += wait
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+
+    def record_usage(self, estimated: float, actual: float) -> None:
+        """Correct the token bucket once the real usage is known"""
+        self.tokens.take(actual - estimated)
+
+    def on_headers(self, headers: httpx.Headers) -> None:
+        """Align with the quota and remaining budget the API reports"""
+        for bucket, limit_name, remaining_name, attribute in (
+            (
+                self.requests,
+                "x-ratelimit-limit-requests",
+                "x-ratelimit-remaining-requests",
+                "requests_per_minute",
+            ),
+            (
+                self.tokens,
+                "x-ratelimit-limit-tokens",
+                "x-ratelimit-remaining-tokens",
+                "tokens_per_minute",
+            ),
+        ):
+            limit = _header_number(headers, limit_name)
+            if limit and limit < getattr(self, attribute):
+                print(
+                    f"⚠️ API reports {limit_name}={limit:.0f}, "
+                    "lowering the configured rate"
+                )
+                setattr(self, attribute, limit)
+                bucket.capacity = min(bucket.capacity, limit)
+                self._apply_scale()
+            remaining = _header_number(headers, remaining_name)
+            if remaining is not None:
+                bucket.drain_to(remaining)
+
+    def on_success(self) -> None:
+        if self.scale < 1.0:
+            self.scale = min(1.0, self.scale + self.recovery)
+            self._apply_scale()
+
+    def on_rate_limited(self, delay: float) -> None:
+        """Pause everyone for delay seconds and halve the rates"""
+        self.rate_limited += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        self.scale = max(self.min_scale, self.scale / 2)
+        self._apply_scale()
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "rate_limited": self.rate_limited,
+            "seconds_waited": round(self.waited, 1),
+            "rate_scale": round(self.scale, 2),
+        }
@@ -0,0 +1,610 @@
+"""
+Snapshots of document_chunks for bootstrapping environments and offline tools.
+
+A snapshot is a directory of:
+
+- embeddings.npy: every embedding as one contiguous (rows, dim) float32 or
+  float16 array, memory-mappable with open_embeddings()
+- metadata.parquet: the other columns, one row per embedding row, in the same
+  order (metadata.jsonl when pyarrow is not installed)
+- manifest.json: row count, dimension, dtype, corpus version and file hashes;
+  written last, so a snapshot without it is incomplete
+
+Export reads the table in one repeatable-read transaction. Embeddings come out
+through COPY ... (FORMAT binary) and are decoded straight into the memory-mapped
+array, and import sends them back the same way into a staging table, which is
+then merged like a chunk file load (upsert or replace, with the vector index
+deferred and rebuilt). No vector is ever formatted or parsed as text.
+
+Usage (from backend/, with DATABASE_URL set):
+    python -m ingestion.snapshot export snapshots/2025-06 --dtype float16
+    python -m ingestion.snapshot import snapshots/2025-06 --mode replace \
+        --maintenance-work-mem 1GB
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import struct
+import time
+from collections.abc import Callable, Iterator
+from datetime import UTC, datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from ingestion.chunks import ARRAY_COLUMNS, CHUNK_COLUMNS
+from ingestion.load_chunks import (
+    CREATE_STAGING_SQL,
+    DEFER_INDEX_CHOICES,
+    LOAD_MODES,
+    STAGING_TABLE,
+    finish_load,
+    merge_staging,
+    windows,
+)
+from sqlalchemy import Engine
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+DTYPES = ("float32", "float16")
+
+METADATA_COLUMNS = tuple(column for column in CHUNK_COLUMNS if column != "embedding")
+
+PGCOPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+PGCOPY_HEADER = PGCOPY_SIGNATURE + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+EXPORT_EMBEDDINGS_SQL = (
+    "COPY (SELECT embedding FROM document_chunks ORDER BY id) "
+    "TO STDOUT WITH (FORMAT binary)"
+)
+EXPORT_METADATA_SQL = (
+    f"SELECT {', '.join(METADATA_COLUMNS)}, embedding IS NOT NULL AS has_embedding "
+    "FROM document_chunks ORDER BY id"
+)
+IMPORT_COPY_SQL = (
+    f"COPY {STAGING_TABLE} ({', '.join(CHUNK_COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+)
+COLUMN_TYPES_SQL = """
+    SELECT a.attname, t.typname, t.typcategory = 'A', e.typname, t.typelem
+    FROM pg_attribute a
+    JOIN pg_type t ON t.oid = a.atttypid
+    LEFT JOIN pg_type e ON e.oid = t.typelem
+    WHERE a.attrelid = 'document_chunks'::regclass
+      AND a.attnum > 0 AND NOT a.attisdropped
+"""
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(snapshot_dir: str | Path) -> dict[str, Any]:
+    path = Path(snapshot_dir) / MANIFEST_FILE
+    if not path.exists():
+        raise FileNotFoundError(
+            f"{path} not found; the snapshot is missing or its export did not finish"
+        )
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('version')}")
+    return manifest
+
+
+def open_embeddings(snapshot_dir: str | Path) -> np.ndarray:
+    """
+    The snapshot's embeddings as a read-only memory map; row i belongs to metadata
+    row i.
+
+    Nothing is read until rows are touched, so offline tools can scan or sample
+    the corpus without loading it into memory.
+    """
+    return np.load(Path(snapshot_dir) / EMBEDDINGS_FILE, mmap_mode="r")
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    return pa, pq
+
+
+def _arrow_schema(pa):
+    fields = []
+    for column in METADATA_COLUMNS:
+        if column in ARRAY_COLUMNS:
+            fields.append(pa.field(column, pa.list_(pa.string())))
+        elif column in ("chunk_index", "relevant"):
+            fields.append(pa.field(column, pa.int32()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    fields.append(pa.field("has_embedding", pa.bool_(), nullable=False))
+    return pa.schema(fields)
+
+
+class _EmbeddingSink:
+    """File-like target for a binary COPY of one vector column, decoded into an array"""
+
+    def __init__(self, out: np.ndarray):
+        self.out = out
+        self.buffer = bytearray()
+        self.header_read = False
+        self.rows = 0
+        self.done = False
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        self._parse()
+        return len(data)
+
+    def _parse(self) -> None:
+        buffer = self.buffer
+        pos = 0
+        if not self.header_read:
+            if len(buffer) < 19:
+                return
+            if buffer[:11] != PGCOPY_SIGNATURE:
+                raise ValueError("Not a binary COPY stream")
+            (extension,) = struct.unpack_from(">i", buffer, 15)
+            if len(buffer) < 19 + extension:
+                return
+            pos = 19 + extension
+            self.header_read = True
+
+        dim = self.out.shape[1]
+        while not self.done and len(buffer) - pos >= 2:
+            (fields,) = struct.unpack_from(">h", buffer, pos)
+            if fields == -1:
+                self.done = True
+                pos += 2
+                break
+            if len(buffer) - pos < 6:
+                break
+            (length,) = struct.unpack_from(">i", buffer, pos + 2)
+            if length == -1:
+                # NULL embedding: the row stays zero and metadata has_embedding is false
+                pos += 6
+                self.rows += 1
+                continue
+            if len(buffer) - pos < 6 + length:
+                break
+            (vector_dim,) = struct.unpack_from(">h", buffer, pos + 6)
+            if vector_dim != dim:
+                raise ValueError(
+                    f"Embedding of row {self.rows} has {vector_dim} dimensions, "
+                    f"expected {dim}"
+                )
+            self.out[self.rows] = np.frombuffer(
+                buffer, dtype=">f4", count=dim, offset=pos + 10
+            )
+            self.rows += 1
+            pos += 6 + length
+        del buffer[:pos]
+
+
+def export_snapshot(
+    engine: Engine,
+    snapshot_dir: str | Path,
+    dtype: str = "float32",
+    batch_size: int | None = None,
+) -> dict[str, Any]:
+    """
+    Write document_chunks to a snapshot directory.
+
+    Args:
+        engine: Sync engine on the psycopg2 driver
+        snapshot_dir: Created if missing; an existing snapshot in it is overwritten
+        dtype: "float32" (exact) or "float16" (half the size, ~3 significant digits)
+        batch_size: Metadata rows per fetch and Parquet row group (SNAPSHOT_BATCH_SIZE)
+
+    Returns:
+        The manifest
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}")
+    batch_size = batch_size or int(os.getenv("SNAPSHOT_BATCH_SIZE", "5000"))
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    (snapshot_dir / MANIFEST_FILE).unlink(missing_ok=True)
+    arrow = _pyarrow()
+    if arrow is None:
+        print(
+            "⚠️ pyarrow is not installed; "
+            "writing metadata as JSON Lines instead of Parquet"
+        )
+    metadata_file = "metadata.parquet" if arrow else "metadata.jsonl"
+    start = time.perf_counter()
+
+    connection = engine.raw_connection()
+    try:
+        # The pool's pre-ping may already have opened a transaction, and SET
+        # TRANSACTION must be its first statement. A rollback rather than
+        # set_session, so the pooled connection keeps its session defaults
+        connection.rollback()
+        cursor = connection.cursor()
+        # Both passes below read the same snapshot of the table
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cursor.execute(
+            "SELECT count(*), count(embedding), max(vector_dims(embedding)) "
+            "FROM document_chunks"
+        )
+        rows, embedded, dim = cursor.fetchone()
+        dim = dim or 1536
+        cursor.execute("SELECT to_regclass('corpus_version') IS NOT NULL")
+        corpus_version = None
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT version FROM corpus_version WHERE id = 1")
+            corpus_version = (cursor.fetchone() or (None,))[0]
+        print(
+            f"📤 Exporting {rows} chunks ({embedded} embedded, {dim} dimensions) "
+            f"to {snapshot_dir}"
+        )
+
+        embeddings = np.lib.format.open_memmap(
+            snapshot_dir / EMBEDDINGS_FILE, mode="w+", dtype=dtype, shape=(rows, dim)
+        )
+        sink = _EmbeddingSink(embeddings)
+        cursor.copy_expert(EXPORT_EMBEDDINGS_SQL, sink)
+        if not sink.done or sink.rows != rows:
+            raise RuntimeError(
+                f"Binary COPY returned {sink.rows} embeddings, expected {rows}"
+            )
+        embeddings.flush()
+        del embeddings
+        print(
+            f"✅ Wrote {rows} embeddings to {EMBEDDINGS_FILE} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+        written = _write_metadata(
+            connection, snapshot_dir / metadata_file, arrow, batch_size
+        )
+        if written != rows:
+            raise RuntimeError(f"Read {written} metadata rows, expected {rows}")
+        connection.rollback()
+    finally:
+        connection.close()
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(UTC).isoformat(),
+        "rows": rows,
+        "embedded": embedded,
+        "dim": dim,
+        "dtype": dtype,
+        "embeddings": EMBEDDINGS_FILE,
+        "metadata": metadata_file,
+        "corpus_version": corpus_version,
+        "sha256": {
+            name: file_sha256(snapshot_dir / name)
+            for name in (EMBEDDINGS_FILE, metadata_file)
+        },
+    }
+    with open(snapshot_dir / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Exported snapshot in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def _write_metadata(connection, path: Path, arrow, batch_size: int) -> int:
+    """Stream the metadata columns, in embedding order, to Parquet or JSON Lines"""
+    # A named cursor keeps the rows on the server until they are fetched
+    cursor = connection.cursor(name="snapshot_metadata")
+    cursor.itersize = batch_size
+    cursor.execute(EXPORT_METADATA_SQL)
+    names = (*METADATA_COLUMNS, "has_embedding")
+
+    def batches() -> Iterator[list[dict[str, Any]]]:
+        while records := cursor.fetchmany(batch_size):
+            rows = [dict(zip(names, record, strict=True)) for record in records]
+            for row in rows:
+                if row["key_findings"] is not None:
+                    row["key_findings"] = json.dumps(
+                        row["key_findings"], ensure_ascii=False
+                    )
+            yield rows
+
+    written = 0
+    if arrow:
+        pa, pq = arrow
+        schema = _arrow_schema(pa)
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for rows in batches():
+                writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+                written += len(rows)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            for rows in batches():
+                f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+                written += len(rows)
+    cursor.close()
+    print(f"✅ Wrote {written} metadata rows to {path.name}")
+    return written
+
+
+def iter_metadata(
+    snapshot_dir: str | Path, manifest: dict[str, Any], batch_size: int
+) -> Iterator[list[dict[str, Any]]]:
+    """Metadata rows of a snapshot in batches, in embedding order"""
+    path = Path(snapshot_dir) / manifest["metadata"]
+    if path.suffix == ".parquet":
+        arrow = _pyarrow()
+        if arrow is None:
+            raise ImportError("pyarrow is required to read metadata.parquet")
+        _, pq = arrow
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield batch.to_pylist()
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from windows(
+                (json.loads(line) for line in f if line.strip()), batch_size
+            )
+
+
+def _scalar_encoder(typname: str) -> Callable[[Any], bytes]:
+    """Binary send format of one value of a Postgres type"""
+    if typname in ("text", "varchar", "bpchar"):
+        return lambda value: str(value).encode("utf-8")
+    if typname in ("int2", "int4", "int8"):
+        fmt = {"int2": ">h", "int4": ">i", "int8": ">q"}[typname]
+        return lambda value: struct.pack(fmt, int(value))
+    if typname in ("float4", "float8"):
+        fmt = ">f" if typname == "float4" else ">d"
+        return lambda value: struct.pack(fmt, float(value))
+    if typname == "bool":
+        return lambda value: b"\x01" if value else b"\x00"
+    if typname in ("json", "jsonb"):
+        # jsonb's binary format is a version byte followed by the JSON text
+        prefix = b"\x01" if typname == "jsonb" else b""
+        return lambda value: (
+            prefix
+            + (value if isinstance(value, str) else json.dumps(value)).encode("utf-8")
+        )
+    raise ValueError(f"No binary COPY encoder for column type {typname}")
+
+
+def _array_encoder(element_typname: str, element_oid: int) -> Callable[[Any], bytes]:
+    encode = _scalar_encoder(element_typname)
+
+    def encode_array(values: list[Any]) -> bytes:
+        if not values:
+            return struct.pack(">iii", 0, 0, element_oid)
+        has_null = any(value is None for value in values)
+        parts = [struct.pack(">iiiii", 1, int(has_null), element_oid, len(values), 1)]
+        for value in values:
+            if value is None:
+                parts.append(struct.pack(">i", -1))
+                continue
+            data = encode(value)
+            parts.append(struct.pack(">i", len(data)))
+            parts.append(data)
+        return b"".join(parts)
+
+    return encode_array
+
+
+def column_encoders(cursor) -> dict[str, Callable[[Any], bytes]]:
+    """Encoders for the metadata columns, from their types in this database"""
+    cursor.execute(COLUMN_TYPES_SQL)
+    types = {name: rest for name, *rest in cursor.fetchall()}
+    encoders = {}
+    for column in METADATA_COLUMNS:
+        typname, is_array, element_typname, element_oid = types[column]
+        encoders[column] = (
+            _array_encoder(element_typname, element_oid)
+            if is_array
+            else _scalar_encoder(typname)
+        )
+    return encoders
+
+
+def encode_copy(
+    rows: list[dict[str, Any]],
+    vectors: np.ndarray,
+    encoders: dict[str, Callable[[Any], bytes]],
+) -> bytes:
+    """
+    One binary COPY stream of CHUNK_COLUMNS.
+
+    Args:
+        rows: Metadata rows
+        vectors: Their embeddings, one row each (any float dtype)
+        encoders: From column_encoders
+    """
+    # pgvector's binary format: int16 dimensions, int16 unused, big-endian float4 values
+    big_endian = np.ascontiguousarray(vectors, dtype=">f4")
+    dim = big_endian.shape[1]
+    vector_header = struct.pack(">ihh", 4 + 4 * dim, dim, 0)
+    field_count = struct.pack(">h", len(CHUNK_COLUMNS))
+    null = struct.pack(">i", -1)
+
+    parts = [PGCOPY_HEADER]
+    for row, vector in zip(rows, big_endian, strict=True):
+        parts.append(field_count)
+        for column in CHUNK_COLUMNS:
+            if column == "embedding":
+                if row["has_embedding"]:
+                    parts.append(vector_header)
+                    parts.append(vector.tobytes())
+                else:
+                    parts.append(null)
+                continue
+            value = row[column]
+            if value is None:
+                parts.append(null)
+                continue
+            data = encoders[column](value)
+            parts.append(struct.pack(">i", len(data)))
+            parts.append(data)
+    parts.append(PGCOPY_TRAILER)
+    return b"".join(parts)
+
+
+def verify_snapshot(snapshot_dir: str | Path, manifest: dict[str, Any]) -> None:
+    """Check the snapshot files against the hashes in the manifest"""
+    for name, expected in manifest["sha256"].items():
+        if file_sha256(Path(snapshot_dir) / name) != expected:
+            raise ValueError(
+                f"{name} does not match the manifest hash; "
+                "the snapshot is corrupt or was modified"
+            )
+    print("✅ Snapshot files match the manifest")
+
+
+def import_snapshot(
+    engine: Engine,
+    snapshot_dir: str | Path,
+    mode: str = "upsert",
+    defer_index: str = "auto",
+    maintenance_work_mem: str | None = None,
+    batch_size: int | None = None,
+    verify: bool = False,
+    defer_index_ratio: float | None = None,
+) -> dict[str, Any]:
+    """
+    Load a snapshot into document_chunks.
+
+    Args:
+        engine: Sync engine on the psycopg2 driver
+        snapshot_dir: Directory written by export_snapshot
+        mode: "upsert" or "replace", as for chunk file loads
+        defer_index: "auto", "yes" or "no", as for chunk file loads
+        maintenance_work_mem: For the vector index rebuild
+        batch_size: Rows per binary COPY (SNAPSHOT_BATCH_SIZE)
+        verify: Check the file hashes first
+        defer_index_ratio: See ChunkLoader (INGEST_DEFER_INDEX_RATIO)
+
+    Returns:
+        Import statistics
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"mode must be one of {LOAD_MODES}")
+    batch_size = batch_size or int(os.getenv("SNAPSHOT_BATCH_SIZE", "5000"))
+    defer_index_ratio = defer_index_ratio or float(
+        os.getenv("INGEST_DEFER_INDEX_RATIO", "0.2")
+    )
+    manifest = load_manifest(snapshot_dir)
+    if verify:
+        verify_snapshot(snapshot_dir, manifest)
+    embeddings = open_embeddings(snapshot_dir)
+    if embeddings.shape != (manifest["rows"], manifest["dim"]):
+        raise ValueError(
+            f"{EMBEDDINGS_FILE} has shape {embeddings.shape}, "
+            f"manifest says ({manifest['rows']}, {manifest['dim']})"
+        )
+    start = time.perf_counter()
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for statement in CREATE_STAGING_SQL:
+            cursor.execute(statement)
+        encoders = column_encoders(cursor)
+
+        staged = 0
+        for rows in iter_metadata(snapshot_dir, manifest, batch_size):
+            vectors = embeddings[staged : staged + len(rows)]
+            cursor.copy_expert(
+                IMPORT_COPY_SQL, io.BytesIO(encode_copy(rows, vectors, encoders))
+            )
+            staged += len(rows)
+            print(f"📥 Staged {staged}/{manifest['rows']} chunks")
+        if staged != manifest["rows"]:
+            raise ValueError(
+                f"Metadata has {staged} rows, manifest says {manifest['rows']}"
+            )
+        copied_at = time.perf_counter()
+
+        deferred = merge_staging(cursor, mode, staged, defer_index, defer_index_ratio)
+        connection.commit()
+        print(
+            f"✅ Merged {staged} chunks into document_chunks ({mode}) "
+            f"in {time.perf_counter() - copied_at:.1f}s"
+        )
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    finish_load(engine, deferred, maintenance_work_mem)
+    elapsed = time.perf_counter() - start
+    return {
+        "loaded": staged,
+        "index_deferred": deferred,
+        "corpus_version": manifest["corpus_version"],
+        "seconds": round(elapsed, 1),
+        "rows_per_second": round(staged / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main():
+    from service.database import create_db_engine
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser(
+        "export", help="Write document_chunks to a snapshot directory"
+    )
+    export_parser.add_argument("snapshot_dir")
+    export_parser.add_argument("--dtype", choices=DTYPES, default="float32")
+    export_parser.add_argument(
+        "--batch-size", type=int, help="Metadata rows per batch (SNAPSHOT_BATCH_SIZE)"
+    )
+    import_parser = commands.add_parser(
+        "import", help="Load a snapshot directory into document_chunks"
+    )
+    import_parser.add_argument("snapshot_dir")
+    import_parser.add_argument("--mode", choices=LOAD_MODES, default="upsert")
+    import_parser.add_argument(
+        "--defer-index", choices=DEFER_INDEX_CHOICES, default="auto"
+    )
+    import_parser.add_argument(
+        "--batch-size", type=int, help="Rows per binary COPY (SNAPSHOT_BATCH_SIZE)"
+    )
+    import_parser.add_argument(
+        "--maintenance-work-mem", help="e.g. 1GB, speeds up the index rebuild"
+    )
+    import_parser.add_argument(
+        "--verify", action="store_true", help="Check file hashes before loading"
+    )
+    args = parser.parse_args()
+
+    engine = create_db_engine()
+    try:
+        if args.command == "export":
+            stats = export_snapshot(
+                engine, args.snapshot_dir, args.dtype, args.batch_size
+            )
+            stats = {key: value for key, value in stats.items() if key != "sha256"}
+        else:
+            stats = import_snapshot(
+                engine,
+                args.snapshot_dir,
+                args.mode,
+                args.defer_index,
+                args.maintenance_work_mem,
+                args.batch_size,
+                args.verify,
+            )
+    finally:
+        engine.dispose()
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
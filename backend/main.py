@@ -1,18 +1,37 @@
 import json
 import os
+import uuid
+from contextlib import asynccontextmanager
 
+from ai.climate_agent import ClimateAgent
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from models.chat import ChatRequest, ChatStreamEvent
 from pydantic import ValidationError
 
-from ai.climate_agent import ClimateAgent
-from models.chat import ChatRequest
-
 load_dotenv()
 open_ai_key = os.getenv("OPENAI_API_KEY")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build one ClimateAgent per process and share it across requests."""
+    climate_agent = ClimateAgent()
+    if os.getenv("WARM_UP_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        try:
+            await climate_agent.warm_up()
+        except Exception as e:
+            print(f"⚠️ Warm-up failed: {e}")
+    app.state.climate_agent = climate_agent
+    try:
+        yield
+    finally:
+        await climate_agent.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -31,25 +50,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id"],
 )
 
-def get_climate_agent():
-    return ClimateAgent()
 
+def get_climate_agent(request: Request) -> ClimateAgent:
+    return request.app.state.climate_agent
+
+
+def get_session_id(chat_request: ChatRequest) -> str:
+    """The client's session id, or a new one for the first message of a conversation"""
+    return chat_request.session_id or uuid.uuid4().hex
+
+
+@app.get("/stats")
+async def stats(climate_agent: ClimateAgent = Depends(get_climate_agent)):
+    """Runtime counters such as the map-command fast-path hit rate"""
+    return climate_agent.get_stats()
 
 
 @app.post("/chat", status_code=201)
-async def chat(chat_request: ChatRequest, climate_agent: ClimateAgent = Depends(get_climate_agent)):
+async def chat(
+    chat_request: ChatRequest, climate_agent: ClimateAgent = Depends(get_climate_agent)
+):
     try:
         query = chat_request.query
         map_state = chat_request.map_state
+        session_id = get_session_id(chat_request)
 
+        response = await climate_agent.process_query(
+            query=query, map_state=map_state, session_id=session_id
+        )
 
-        response = await climate_agent.process_query(query=query,
-                                               map_state=map_state,
-                                               session_id="0")
-
-        return response
+        # Copy: cached responses are shared between sessions
+        return response.model_copy(update={"session_id": session_id})
 
     except json.JSONDecodeError as e:
         raise HTTPException(
@@ -64,3 +98,40 @@ async def chat(chat_request: ChatRequest, climate_agent: ClimateAgent = Depends(
         ) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail={"errors": str(e)}) from e
+
+
+@app.post("/chat/stream")
+async def chat_stream(
+    chat_request: ChatRequest, climate_agent: ClimateAgent = Depends(get_climate_agent)
+):
+    """Server-Sent Events variant of /chat.
+
+    Emits `token` events while the answer is generated, a `map_actions` event
+    once the actions are ready and a final `done` event with the full answer.
+    Failures after the stream has started are reported as an `error` event.
+    The session id is sent in the `X-Session-Id` header and the `done` event.
+    """
+    session_id = get_session_id(chat_request)
+
+    async def event_stream():
+        try:
+            async for event in climate_agent.stream_query(
+                query=chat_request.query,
+                map_state=chat_request.map_state,
+                session_id=session_id,
+            ):
+                if event.event == "done":
+                    event.data["session_id"] = session_id
+                yield event.to_sse()
+        except Exception as e:
+            yield ChatStreamEvent(event="error", data={"errors": str(e)}).to_sse()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Session-Id": session_id,
+        },
+    )
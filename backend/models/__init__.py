@@ -3,18 +3,20 @@ Models package for Climate Viewer AI Bot.
 
 This package contains data models used throughout the application:
 - Pydantic models for API requests/responses (chat.py)
-- SQLAlchemy models for database entities (document_chunk.py)
+- SQLAlchemy models for database entities (document_chunk.py, chat_session.py)
 """
 
 from .chat import (
     ChatContext,
     ChatRequest,
     ChatResponse,
+    ChatStreamEvent,
     MapBounds,
     MapCenter,
     MapState,
     Message,
 )
+from .chat_session import ChatBase, ChatMessageRecord, ChatSession
 from .document_chunk import Base, DocumentChunk
 
 __all__ = [
@@ -22,11 +24,15 @@ __all__ = [
     "ChatContext",
     "ChatRequest",
     "ChatResponse",
+    "ChatStreamEvent",
     "MapBounds",
     "MapCenter",
     "MapState",
     "Message",
     # Database models
     "Base",
+    "ChatBase",
+    "ChatMessageRecord",
+    "ChatSession",
     "DocumentChunk",
 ]
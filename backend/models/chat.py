@@ -1,3 +1,4 @@
+import json
 from typing import Any
 
 from pydantic import BaseModel, Field
@@ -7,18 +8,22 @@ class LatLng(BaseModel):
     lat: float
     lng: float
 
+
 class MapBounds(BaseModel):
     southwest: LatLng
     northeast: LatLng
 
+
 class MapCenter(BaseModel):
     lat: float
     long: float
 
+
 class AvailableLayers(BaseModel):
     normal: list[str] | None
     increment: list[str] | None
 
+
 class MapState(BaseModel):
     active_layers: list[str] | None
     available_layers: AvailableLayers | None
@@ -33,6 +38,7 @@ class MapActions(BaseModel):
     type: str
     parameters: dict[str, Any]
 
+
 class Message(BaseModel):
     id: str
     role: str
@@ -43,16 +49,33 @@ class Message(BaseModel):
 class ChatContext(BaseModel):
     session_id: str
     messages: list[Message]
+    # Older turns folded out of messages by the conversation memory
+    summary: str | None = None
 
 
 class ChatRequest(BaseModel):
     query: str
     map_state: MapState
+    # Omitted on the first message; the server then starts a session and returns its id
+    session_id: str | None = Field(
+        default=None, max_length=64, pattern=r"^[A-Za-z0-9_-]+$"
+    )
 
 
 class ChatResponse(BaseModel):
     response: str
     map_actions: list[dict[str, Any]] | None = None
+    session_id: str | None = None
+
+
+class ChatStreamEvent(BaseModel):
+    event: str
+    data: dict[str, Any]
+
+    def to_sse(self) -> str:
+        """Serialize as a Server-Sent Events frame"""
+        return f"event: {self.event}\ndata: {json.dumps(self.data)}\n\n"
+
 
 class RAGMetadata(BaseModel):
     chunks_retrieved: int
@@ -61,6 +84,12 @@ class RAGMetadata(BaseModel):
     query: str
     filters: dict[str, Any]
     auto_detected_layers: list[str] | None
+    chunks_in_prompt: int | None = None
+    # Prompt tokens per section (map_state, sources, history, instructions) and total
+    prompt_tokens: dict[str, int] | None = None
+    # Prompt tokens the provider served from its prompt cache
+    cached_prompt_tokens: int | None = None
+
 
 class RAGSource(BaseModel):
     source_number: int
@@ -72,7 +101,8 @@ class RAGSource(BaseModel):
     measurements: list[str]
     text_preview: str
 
+
 class RAGResponse(BaseModel):
     response: str
     sources: list[RAGSource]
-    metadata: RAGMetadata
\ No newline at end of file
+    metadata: RAGMetadata
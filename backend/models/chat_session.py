@@ -0,0 +1,78 @@
+"""
+SQLAlchemy models for persisted chat sessions.
+
+Messages are append-only rows; a session row holds the conversation summary,
+a version bumped on every write (for validating in-process caches) and the
+last activity time used for TTL eviction.
+"""
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import declarative_base
+
+ChatBase = declarative_base()
+
+
+class ChatSession(ChatBase):
+    """
+    One conversation.
+
+    Attributes:
+        session_id: Client-supplied or server-generated session id
+        summary: Older turns folded out of the message list
+        version: Incremented on every write to the session or its messages
+        last_active: Time of the last write, for TTL eviction
+    """
+
+    __tablename__ = "chat_sessions"
+
+    session_id = Column(String(64), primary_key=True)
+    summary = Column(Text)
+    version = Column(Integer, nullable=False, default=0)
+    last_active = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class ChatMessageRecord(ChatBase):
+    """
+    One message of a conversation, in insertion order by id.
+
+    Attributes:
+        id: Insertion order
+        session_id: Owning session
+        message_id: Message.id, unique within the session
+        role: "user" or "assistant"
+        content: Message text
+        timestamp: Message.timestamp as sent to clients
+    """
+
+    __tablename__ = "chat_messages"
+    __table_args__ = (UniqueConstraint("session_id", "message_id"),)
+
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    session_id = Column(
+        String(64),
+        ForeignKey("chat_sessions.session_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    message_id = Column(String(64), nullable=False)
+    role = Column(String(20), nullable=False)
+    content = Column(Text, nullable=False)
+    timestamp = Column(String(64), nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<ChatMessageRecord(session_id='{self.session_id}', role='{self.role}')>"
+        )
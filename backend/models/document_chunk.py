@@ -5,10 +5,19 @@ This model stores text chunks from climate literature documents along with their
 embeddings and metadata for RAG (Retrieval Augmented Generation) applications.
 """
 
-from sqlalchemy import ARRAY, JSON, Column, Integer, String, Text
-from sqlalchemy.orm import declarative_base
-
 from pgvector.sqlalchemy import Vector
+from sqlalchemy import (
+    ARRAY,
+    JSON,
+    Column,
+    Computed,
+    Integer,
+    SmallInteger,
+    String,
+    Text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
@@ -25,11 +34,14 @@ class DocumentChunk(Base):
         chunk_id: Unique identifier for the chunk
         chunk_index: Index of chunk within the source document
         text: The actual text content of the chunk
-        embedding: Vector embedding (1536 dimensions for OpenAI ada-002/text-embedding-3-small)
+        text_search: Generated full-text search vector of text (GIN indexed)
+        embedding: Vector embedding (1536 dimensions for OpenAI
+            ada-002/text-embedding-3-small)
         filename: Original document filename
         source_file: Path to the source file
         relevant: Whether the chunk is relevant (1=True, 0=False)
         confidence: Confidence level (HIGH, MEDIUM, LOW)
+        confidence_rank: Generated from confidence (HIGH=3, MEDIUM=2, LOW=1, else 0)
         relevant_layers: Array of climate layer names
         reasoning: Explanation of relevance assessment
         key_findings: JSON object with key findings
@@ -50,6 +62,10 @@ class DocumentChunk(Base):
 
     # Content
     text = Column(Text, nullable=False)
+    text_search = Column(
+        TSVECTOR,
+        Computed("to_tsvector('english', translate(text, 'ʻ''', ''))", persisted=True),
+    )
     embedding = Column(Vector(1536))  # OpenAI embedding dimension
 
     # Document metadata
@@ -59,6 +75,15 @@ class DocumentChunk(Base):
     # Relevance metadata
     relevant = Column(Integer, default=1)  # Using Integer for boolean (1=True, 0=False)
     confidence = Column(String(50), index=True)  # HIGH, MEDIUM, LOW
+    confidence_rank = Column(
+        SmallInteger,
+        Computed(
+            "CASE confidence "
+            "WHEN 'HIGH' THEN 3 WHEN 'MEDIUM' THEN 2 WHEN 'LOW' THEN 1 ELSE 0 END",
+            persisted=True,
+        ),
+        index=True,
+    )
     relevant_layers = Column(ARRAY(String), index=True)  # Array of layer names
     reasoning = Column(Text)
     key_findings = Column(JSON)
@@ -99,4 +124,4 @@ class DocumentChunk(Base):
             "slr_projections": self.slr_projections,
             "measurements": self.measurements,
             "timeframes": self.timeframes,
-        }
\ No newline at end of file
+        }
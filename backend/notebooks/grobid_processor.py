@@ -1,125 +1,371 @@
-import requests
+"""
+GROBID full-text extraction for the PDF corpus.
+
+PDFs are posted to GROBID by a bounded pool of workers, each with its own pooled
+requests.Session. Every paper is written to processed_papers.jsonl as soon as it
+finishes, so the output file doubles as the checkpoint: a rerun skips the PDFs
+already in it and retries the ones in failed_papers.jsonl. TEI responses are
+parsed incrementally from the response stream and each body section is freed
+once extracted, so memory stays flat regardless of paper or corpus size.
+After each run the JSONL is also exported as processed_papers.json, the JSON
+array the notebooks read.
+
+Usage:
+    python grobid_processor.py pdf_pub --workers 8 --url http://localhost:8070
+"""
+
+import argparse
 import json
+import os
+import tempfile
+import textwrap
+import threading
+import time
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
+TEI = "{http://www.tei-c.org/ns/1.0}"
+# GROBID answers 503 when all its workers are busy
+RETRY_STATUSES = (429, 503)
+
 
 class GrobidProcessor:
     """Minimal GROBID processor for MVP"""
 
-    def __init__(self, base_url="http://localhost:8070"):
+    def __init__(
+        self, base_url="http://localhost:8070", timeout=120, max_retries=3, pool_size=8
+    ):
+        """
+        Args:
+            base_url: GROBID server
+            timeout: Seconds to wait for GROBID to answer one PDF
+            max_retries: Retries on 503/429 and connection errors, with exponential
+                backoff
+            pool_size: Connections kept per session; match the worker count
+        """
         self.grobid_url = f"{base_url}/api/processFulltextDocument"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self._local = threading.local()
+        # Every thread's session, so close() can reach them after the workers exit
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """One keep-alive session per worker thread"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        """Close the sessions of all worker threads"""
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+        self._local = threading.local()
+
+    def _post(self, pdf_path):
+        """POST a PDF, retrying busy or unreachable servers; returns the stream"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with open(pdf_path, "rb") as f:
+                    files = {"input": (Path(pdf_path).name, f, "application/pdf")}
+                    response = self.session.post(
+                        self.grobid_url,
+                        files=files,
+                        timeout=(10, self.timeout),
+                        stream=True,
+                    )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt == self.max_retries
+                ):
+                    return response
+                response.close()
+            time.sleep(2**attempt)
 
     def process_paper(self, pdf_path):
         """Extract structured sections from PDF"""
         try:
-            with open(pdf_path, 'rb') as f:
-                files = {
-                    'input': (Path(pdf_path).name, f, 'application/pdf')
-                }
-                response = requests.post(self.grobid_url, files=files, timeout=120)
+            response = self._post(pdf_path)
         except requests.exceptions.RequestException as e:
-            print(f"  Error: {e}")
-            return None
+            raise RuntimeError(f"Request failed: {e}") from e
 
-        if response.status_code != 200:
-            print(f"  Error: GROBID returned {response.status_code}")
-            return None
-
-        try:
-            root = ET.fromstring(response.content)
-        except ET.ParseError as e:
-            print(f"  Error: Failed to parse XML - {e}")
-            return None
+        with response:
+            if response.status_code != 200:
+                raise RuntimeError(f"GROBID returned {response.status_code}")
+            response.raw.decode_content = True
+            try:
+                return self.parse_tei(response.raw)
+            except ET.ParseError as e:
+                raise RuntimeError(f"Failed to parse XML - {e}") from e
 
-        ns = {'tei': 'http://www.tei-c.org/ns/1.0'}
+    def parse_tei(self, source):
+        """
+        Paper dict from a TEI document, read incrementally.
 
+        Args:
+            source: File path or binary file-like object with GROBID TEI XML
+        """
         paper = {
-            'title': self._extract_text(root, './/tei:titleStmt/tei:title', ns),
-            'abstract': self._extract_text(root, './/tei:abstract//tei:p', ns),
-            'sections': [],
-            'metadata': {
-                'doi': self._extract_text(root, './/tei:idno[@type="DOI"]', ns),
-                'year': self._extract_year(root, ns)
-            }
+            "title": "",
+            "abstract": "",
+            "sections": [],
+            "metadata": {"doi": "", "year": None},
         }
+        # Tags of the open elements, to tell where each element sits
+        stack = []
+        in_body = False
+        # Sections are filled in when their div ends but keep document order,
+        # so each body div reserves its slot when it starts
+        slots = []
+        sections = []
 
-        for div in root.findall('.//tei:body//tei:div', ns):
-            head = div.find('tei:head', ns)
-            if head is None:
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                stack.append(elem.tag)
+                if elem.tag == f"{TEI}body":
+                    in_body = True
+                elif elem.tag == f"{TEI}div" and in_body:
+                    slots.append(len(sections))
+                    sections.append(None)
                 continue
 
-            section_title = ''.join(head.itertext()).strip()
-            paragraphs = [''.join(p.itertext()).strip() for p in div.findall('.//tei:p', ns)]
-            paragraphs = [p for p in paragraphs if p]
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if elem.tag == f"{TEI}teiHeader":
+                self._read_header(elem, paper)
+                elem.clear()
+            elif elem.tag == f"{TEI}div" and in_body:
+                sections[slots.pop()] = self._read_section(elem)
+                # Nested divs stay readable until their enclosing section is done
+                if parent == f"{TEI}body":
+                    elem.clear()
+            elif elem.tag == f"{TEI}body":
+                in_body = False
+                elem.clear()
+            elif parent in (f"{TEI}back", f"{TEI}listBibl"):
+                # References are not extracted; drop them as they stream past
+                elem.clear()
+        paper["sections"] = [section for section in sections if section]
+        return paper
 
-            if paragraphs:
-                paper['sections'].append({
-                    'title': section_title,
-                    'type': self._classify_section(section_title),
-                    'content': '\n\n'.join(paragraphs)
-                })
+    def _read_header(self, header, paper):
+        paper["title"] = self._extract_text(header, f".//{TEI}titleStmt/{TEI}title")
+        paper["abstract"] = self._extract_text(header, f".//{TEI}abstract//{TEI}p")
+        paper["metadata"]["doi"] = self._extract_text(
+            header, f'.//{TEI}idno[@type="DOI"]'
+        )
+        paper["metadata"]["year"] = self._extract_year(header)
 
-        return paper
+    def _read_section(self, div):
+        head = div.find(f"{TEI}head")
+        if head is None:
+            return None
+
+        section_title = "".join(head.itertext()).strip()
+        paragraphs = ["".join(p.itertext()).strip() for p in div.iter(f"{TEI}p")]
+        paragraphs = [p for p in paragraphs if p]
+        if not paragraphs:
+            return None
+        return {
+            "title": section_title,
+            "type": self._classify_section(section_title),
+            "content": "\n\n".join(paragraphs),
+        }
 
-    def _extract_text(self, root, xpath, ns):
+    def _extract_text(self, root, xpath):
         """Extract text from XML element, including nested elements"""
-        elem = root.find(xpath, ns)
-        return ''.join(elem.itertext()).strip() if elem is not None else ''
+        elem = root.find(xpath)
+        return "".join(elem.itertext()).strip() if elem is not None else ""
 
-    def _extract_year(self, root, ns):
+    def _extract_year(self, root):
         """Extract year from XML element"""
-        date = root.find('.//tei:publicationStmt//tei:date', ns)
-        if date is not None and 'when' in date.attrib:
-            return date.attrib['when'][:4]
+        date = root.find(f".//{TEI}publicationStmt//{TEI}date")
+        if date is not None and "when" in date.attrib:
+            return date.attrib["when"][:4]
         return None
 
     def _classify_section(self, title):
         """Quick classification of section types"""
         title_lower = title.lower()
-        if any(w in title_lower for w in ['method', 'approach', 'model']):
-            return 'methodology'
-        elif any(w in title_lower for w in ['result', 'finding']):
-            return 'results'
-        elif any(w in title_lower for w in ['discuss', 'conclusion']):
-            return 'discussion'
-        elif 'intro' in title_lower:
-            return 'introduction'
-        return 'other'
-
-
-def process_all_papers(pdf_directory):
-    """Process all papers in a directory using GROBID"""
-    processor = GrobidProcessor()
-    papers = []
-    failed = []
-
-    pdf_files = list(Path(pdf_directory).glob('*.pdf'))
-    total = len(pdf_files)
-    print(f"Processing {total} PDFs...")
-
-    for i, pdf_path in enumerate(pdf_files, 1):
-        print(f"[{i}/{total}] {pdf_path.name}", end=" ")
-        paper = processor.process_paper(pdf_path)
-        if paper:
-            papers.append(paper)
-            print(f"-> {len(paper['sections'])} sections")
-        else:
-            failed.append(pdf_path.name)
-            print("-> FAILED")
-
-    
-    output_dir = Path(pdf_directory).parent / 'outputs' / 'grobid_processed_papers'
+        if any(w in title_lower for w in ["method", "approach", "model"]):
+            return "methodology"
+        elif any(w in title_lower for w in ["result", "finding"]):
+            return "results"
+        elif any(w in title_lower for w in ["discuss", "conclusion"]):
+            return "discussion"
+        elif "intro" in title_lower:
+            return "introduction"
+        return "other"
+
+
+def completed_files(output_path):
+    """File names already in a processed_papers.jsonl checkpoint"""
+    done = set()
+    if not output_path.exists():
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["file"])
+            except (json.JSONDecodeError, KeyError):
+                # A line cut short by a crash; that PDF is processed again
+                continue
+    return done
+
+
+def load_papers(output_path):
+    """Papers from processed_papers.jsonl, one at a time"""
+    with open(output_path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def export_papers(output_path, json_path):
+    """
+    Write the papers of a processed_papers.jsonl as one JSON array.
+
+    Papers are written one at a time, in the layout json.dump(papers, f, indent=2)
+    produces, and the file is replaced atomically.
+
+    Returns:
+        Number of papers written
+    """
+    json_path = Path(json_path)
+    count = 0
+    fd, tmp = tempfile.mkstemp(dir=json_path.parent, prefix=f".{json_path.name}.")
+    with os.fdopen(fd, "w") as f:
+        f.write("[")
+        for paper in load_papers(output_path):
+            f.write(",\n" if count else "\n")
+            f.write(textwrap.indent(json.dumps(paper, indent=2), "  "))
+            count += 1
+        f.write("\n]" if count else "]")
+    os.replace(tmp, json_path)
+    return count
+
+
+def process_all_papers(
+    pdf_directory,
+    output_dir=None,
+    base_url="http://localhost:8070",
+    workers=8,
+    timeout=120,
+):
+    """
+    Process all papers in a directory using GROBID, resuming from earlier runs.
+
+    Args:
+        pdf_directory: Directory with the PDFs
+        output_dir: Where processed_papers.jsonl, processed_papers.json and
+            failed_papers.jsonl go (defaults to ../outputs/grobid_processed_papers next
+            to the PDFs)
+        base_url: GROBID server
+        workers: PDFs in flight at once; GROBID's own concurrency is the useful ceiling
+        timeout: Seconds to wait for GROBID to answer one PDF
+
+    Returns:
+        (successful, failed) counts for this run
+    """
+    processor = GrobidProcessor(base_url, timeout=timeout, pool_size=workers)
+    output_dir = (
+        Path(output_dir)
+        if output_dir
+        else Path(pdf_directory).parent / "outputs" / "grobid_processed_papers"
+    )
     output_dir.mkdir(parents=True, exist_ok=True)
-    with open(output_dir / 'processed_papers.json', 'w') as f:
-        json.dump(papers, f, indent=2)
+    output_path = output_dir / "processed_papers.jsonl"
+    failed_path = output_dir / "failed_papers.jsonl"
+
+    done = completed_files(output_path)
+    pdf_files = sorted(
+        p for p in Path(pdf_directory).glob("*.pdf") if p.name not in done
+    )
+    total = len(pdf_files)
+    print(
+        f"Processing {total} PDFs ({len(done)} already done) with {workers} workers..."
+    )
+
+    successful = failed = 0
+    start = time.perf_counter()
+    # Failures are retried on every run, so only this run's are kept
+    try:
+        with (
+            open(output_path, "a") as out,
+            open(failed_path, "w") as failures,
+            ThreadPoolExecutor(max_workers=workers) as executor,
+        ):
+            futures = {
+                executor.submit(processor.process_paper, pdf_path): pdf_path
+                for pdf_path in pdf_files
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                pdf_path = futures[future]
+                try:
+                    paper = future.result()
+                except Exception as e:
+                    failed += 1
+                    failures.write(
+                        json.dumps({"file": pdf_path.name, "error": str(e)}) + "\n"
+                    )
+                    failures.flush()
+                    print(f"[{i}/{total}] {pdf_path.name} -> FAILED: {e}")
+                    continue
+
+                successful += 1
+                out.write(json.dumps({"file": pdf_path.name, **paper}) + "\n")
+                out.flush()
+                print(
+                    f"[{i}/{total}] {pdf_path.name} -> "
+                    f"{len(paper['sections'])} sections"
+                )
+    finally:
+        processor.close()
+
+    elapsed = time.perf_counter() - start
+    rate = successful / elapsed if elapsed else 0.0
+    print(
+        f"\nDone: {successful} successful, {failed} failed "
+        f"in {elapsed:.0f}s ({rate:.2f} papers/s)"
+    )
+    exported = export_papers(output_path, output_dir / "processed_papers.json")
+    print(f"Exported {exported} papers to {output_dir / 'processed_papers.json'}")
+    return successful, failed
 
-    if failed:
-        with open(output_dir / 'failed_papers.json', 'w') as f:
-            json.dump(failed, f, indent=2)
-    
-    print(f"\nDone: {len(papers)} successful, {len(failed)} failed")
 
 if __name__ == "__main__":
     script_dir = Path(__file__).parent
-    process_all_papers(script_dir / 'pdf_pub')
+    parser = argparse.ArgumentParser(
+        description="Extract sections from PDFs with GROBID"
+    )
+    parser.add_argument("pdf_directory", nargs="?", default=script_dir / "pdf_pub")
+    parser.add_argument("--output-dir")
+    parser.add_argument("--url", default="http://localhost:8070")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--timeout", type=int, default=120)
+    args = parser.parse_args()
+    process_all_papers(
+        args.pdf_directory, args.output_dir, args.url, args.workers, args.timeout
+    )
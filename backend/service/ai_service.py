@@ -1,44 +1,134 @@
+import os
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import Generic, TypeVar
 
-from openai import OpenAI
+import httpx
+from ollama import AsyncClient, Client
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 from openai.types.chat.chat_completion import ChatCompletion
-from ollama import Client
 
 T = TypeVar("T")
 
 
+def _http_limits() -> httpx.Limits:
+    """Connection limits shared by every OpenAI client in the process."""
+    return httpx.Limits(
+        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def chat_messages(
+    prompt: str, system_prompt: str | None = None
+) -> list[dict[str, str]]:
+    """Chat messages with the static system prompt first, so it is the cached prefix"""
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """
+    Process-wide OpenAI client.
+
+    Reusing one client keeps TLS sessions and HTTP keep-alive connections open
+    between requests instead of reconnecting for every chat message.
+    """
+    return OpenAI(
+        timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+        http_client=DefaultHttpxClient(limits=_http_limits()),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_async_openai_client() -> AsyncOpenAI:
+    """Process-wide AsyncOpenAI client, the async counterpart of get_openai_client."""
+    return AsyncOpenAI(
+        timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+        http_client=DefaultAsyncHttpxClient(limits=_http_limits()),
+    )
+
+
 class AIService(ABC, Generic[T]):
     """Abstract AI Service"""
 
     @abstractmethod
-    def get_response(self, prompt: str) -> T | None:
+    def get_response(self, prompt: str, system_prompt: str | None = None) -> T | None:
         pass
 
 
 class OpenAIService(AIService):
     """Service class for handling calls to AI Endpoint."""
 
-    def __init__(self):
-        self.client = OpenAI()
+    def __init__(self, client: OpenAI | None = None):
+        self.client = client or get_openai_client()
 
-    def get_response(self, prompt: str) -> ChatCompletion:
+    def get_response(
+        self, prompt: str, system_prompt: str | None = None
+    ) -> ChatCompletion:
         response = self.client.chat.completions.create(
             model="gpt-4",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
+            messages=chat_messages(prompt, system_prompt),
+            temperature=0.7,
         )
 
         return response
 
+
 class OllamaService(AIService):
     """Service class for handling calls to Ollama."""
 
     def __init__(self):
         self.client = Client()
 
-    def get_response(self, prompt: str) -> str:
-        response = self.client.chat(model="qwen3.4b", messages=[{"role": "user", "content": prompt}])
-        return response["message"]["content"]
\ No newline at end of file
+    def get_response(self, prompt: str, system_prompt: str | None = None) -> str:
+        response = self.client.chat(
+            model="qwen3.4b", messages=chat_messages(prompt, system_prompt)
+        )
+        return response["message"]["content"]
+
+
+class AsyncAIService(ABC, Generic[T]):
+    """Abstract AI Service for use inside the event loop"""
+
+    @abstractmethod
+    async def get_response(
+        self, prompt: str, system_prompt: str | None = None
+    ) -> T | None:
+        pass
+
+
+class AsyncOpenAIService(AsyncAIService):
+    """Async service class for handling calls to AI Endpoint."""
+
+    def __init__(self, client: AsyncOpenAI | None = None):
+        self.client = client or get_async_openai_client()
+
+    async def get_response(
+        self, prompt: str, system_prompt: str | None = None
+    ) -> ChatCompletion:
+        response = await self.client.chat.completions.create(
+            model="gpt-4",
+            messages=chat_messages(prompt, system_prompt),
+            temperature=0.7,
+        )
+
+        return response
+
+
+class AsyncOllamaService(AsyncAIService):
+    """Async service class for handling calls to Ollama."""
+
+    def __init__(self):
+        self.client = AsyncClient()
+
+    async def get_response(self, prompt: str, system_prompt: str | None = None) -> str:
+        response = await self.client.chat(
+            model="qwen3.4b", messages=chat_messages(prompt, system_prompt)
+        )
+        return response["message"]["content"]
@@ -0,0 +1,167 @@
+"""
+Database engine factory for the Climate Viewer backend.
+
+Engines are created once per process and shared by every request, so the pool
+settings below decide how many Postgres connections a worker keeps open.
+All settings can be overridden through environment variables.
+"""
+
+import asyncio
+import os
+from typing import Any
+
+from sqlalchemy import Engine, create_engine, event, make_url, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_pool_options() -> dict[str, Any]:
+    """
+    Read connection pool settings from the environment.
+
+    Environment variables:
+        DB_POOL_SIZE: Connections kept open permanently (default 5)
+        DB_MAX_OVERFLOW: Extra connections allowed under burst load (default 10)
+        DB_POOL_RECYCLE: Seconds before a connection is replaced (default 1800)
+        DB_POOL_PRE_PING: Validate connections on checkout (default true)
+        DB_POOL_TIMEOUT: Seconds to wait for a free connection (default 30)
+    """
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+
+
+def get_database_url(database_url: str | None = None) -> str:
+    """Resolve the database URL from the argument or the DATABASE_URL env var."""
+    url = database_url or os.getenv("DATABASE_URL")
+    if not url:
+        raise ValueError("DATABASE_URL not provided and not found in environment")
+    return url
+
+
+def create_db_engine(database_url: str | None = None, **overrides: Any) -> Engine:
+    """
+    Create a pooled SQLAlchemy engine.
+
+    Args:
+        database_url: PostgreSQL connection URL (defaults to env var)
+        **overrides: Pool options that take precedence over the environment
+
+    Returns:
+        SQLAlchemy engine
+    """
+    options = {**get_pool_options(), **overrides}
+    return create_engine(get_database_url(database_url), **options)
+
+
+def to_async_url(database_url: str) -> str:
+    """Rewrite a postgresql:// URL to use the asyncpg driver."""
+    url = make_url(database_url)
+    return url.set(drivername="postgresql+asyncpg").render_as_string(
+        hide_password=False
+    )
+
+
+async def _register_vector_codec(conn: Any) -> None:
+    """
+    Exchange pgvector values with asyncpg in text form.
+
+    The SQLAlchemy Vector type already renders bind values as '[1.0,2.0,...]'
+    and parses the same format in results, so a text codec is all asyncpg needs.
+    """
+    await conn.set_type_codec(
+        "vector", schema="public", encoder=str, decoder=str, format="text"
+    )
+
+
+def create_async_db_engine(
+    database_url: str | None = None, **overrides: Any
+) -> AsyncEngine:
+    """
+    Create a pooled asyncpg engine with the pgvector type registered.
+
+    Args:
+        database_url: PostgreSQL connection URL (defaults to env var)
+        **overrides: Pool options that take precedence over the environment
+
+    Returns:
+        SQLAlchemy AsyncEngine
+    """
+    options = {**get_pool_options(), **overrides}
+    engine = create_async_engine(
+        to_async_url(get_database_url(database_url)), **options
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _register_vector(dbapi_connection, connection_record):
+        dbapi_connection.run_async(_register_vector_codec)
+
+    return engine
+
+
+def warm_up_pool(engine: Engine, connections: int | None = None) -> int:
+    """
+    Open pool connections ahead of the first request.
+
+    All connections are checked out at the same time so the pool really grows to
+    the requested size instead of handing the same connection back repeatedly.
+
+    Args:
+        engine: Engine whose pool should be filled
+        connections: Number of connections to open (defaults to the pool size)
+
+    Returns:
+        Number of connections that were opened
+    """
+    target = connections or int(os.getenv("DB_POOL_SIZE", "5"))
+    opened = []
+    try:
+        for _ in range(target):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            opened.append(conn)
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+async def warm_up_async_pool(
+    engine: AsyncEngine, connections: int | None = None
+) -> int:
+    """
+    Async counterpart of warm_up_pool; connections are opened concurrently.
+
+    Args:
+        engine: AsyncEngine whose pool should be filled
+        connections: Number of connections to open (defaults to the pool size)
+
+    Returns:
+        Number of connections that were opened
+    """
+    target = connections or int(os.getenv("DB_POOL_SIZE", "5"))
+    results = await asyncio.gather(
+        *(engine.connect().start() for _ in range(target)), return_exceptions=True
+    )
+    opened = [conn for conn in results if isinstance(conn, AsyncConnection)]
+    try:
+        for conn in opened:
+            await conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            await conn.close()
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors and not opened:
+        raise errors[0]
+    return len(opened)
@@ -0,0 +1,125 @@
+import json
+
+import numpy as np
+import pytest
+from ingestion.chunks import (
+    CHUNK_COLUMNS,
+    _array_literal,
+    chunk_row,
+    copy_line,
+    iter_chunks,
+)
+
+COPY_ESCAPES = {"\\": "\\", "t": "\t", "n": "\n", "r": "\r"}
+
+
+def parse_copy_line(line):
+    """Fields of a COPY text-format line, None for \\N"""
+    assert line.endswith("\n")
+    fields = []
+    for raw in line[:-1].split("\t"):
+        if raw == "\\N":
+            fields.append(None)
+            continue
+        value, i = [], 0
+        while i < len(raw):
+            if raw[i] == "\\":
+                value.append(COPY_ESCAPES[raw[i + 1]])
+                i += 2
+            else:
+                value.append(raw[i])
+                i += 1
+        fields.append("".join(value))
+    return dict(zip(CHUNK_COLUMNS, fields, strict=True))
+
+
+def parse_array_literal(literal):
+    """Elements of a text[] literal whose elements are all quoted"""
+    assert literal.startswith("{") and literal.endswith("}")
+    items, i = [], 1
+    while literal[i] != "}":
+        assert literal[i] == '"'
+        i += 1
+        item = []
+        while literal[i] != '"':
+            if literal[i] == "\\":
+                i += 1
+            item.append(literal[i])
+            i += 1
+        items.append("".join(item))
+        i += 1
+        if literal[i] == ",":
+            i += 1
+    return items
+
+
+def chunk(**metadata):
+    return {
+        "chunk_id": "paper:abc",
+        "chunk_index": 3,
+        "text": "Waikīkī\tfloods\nat king tides \\ often",
+        "metadata": {"filename": "paper.pdf", **metadata},
+    }
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [],
+        ["Honolulu"],
+        ["Hawaiʻi Kai", "Mōʻiliʻili"],
+        ['2 ft "by 2050"', "a,b", "{braces}", "NULL", "back\\slash", ""],
+    ],
+)
+def test_array_literal_round_trips(values):
+    assert parse_array_literal(_array_literal(values)) == values
+
+
+def test_copy_line_escapes_text_and_arrays():
+    row = chunk_row(
+        chunk(
+            locations=["Hawaiʻi Kai", 'the "Ewa" plain'],
+            measurements=["0.3\\0.4 m", "tab\there"],
+            key_findings={"finding": "line\nbreak"},
+        )
+    )
+    fields = parse_copy_line(copy_line(row))
+
+    assert fields["text"] == row["text"]
+    assert fields["chunk_index"] == "3"
+    assert parse_array_literal(fields["locations"]) == row["locations"]
+    assert parse_array_literal(fields["measurements"]) == row["measurements"]
+    assert json.loads(fields["key_findings"]) == row["key_findings"]
+    assert fields["relevant_layers"] == "{}"
+
+
+def test_copy_line_writes_null_for_missing_values():
+    fields = parse_copy_line(copy_line(chunk_row(chunk())))
+    assert fields["embedding"] is None
+    assert fields["source_file"] is None
+    assert fields["reasoning"] is None
+    assert fields["relevant"] == "1"
+
+
+def test_copy_line_embedding_round_trips_float32():
+    embedding = np.random.default_rng(0).standard_normal(8).astype(np.float32)
+    row = chunk_row({**chunk(), "embedding": embedding.tolist()})
+    literal = parse_copy_line(copy_line(row))["embedding"]
+    parsed = np.array(literal.strip("[]").split(","), dtype=np.float32)
+    np.testing.assert_array_equal(parsed, embedding)
+
+
+@pytest.mark.parametrize("suffix", [".json", ".jsonl"])
+def test_iter_chunks_reads_arrays_and_json_lines(tmp_path, suffix, monkeypatch):
+    # A small read size makes the array reader refill mid-element
+    monkeypatch.setattr("ingestion.chunks.READ_SIZE", 7)
+    chunks = [
+        {**chunk(), "chunk_id": f"c{i}", "chunk_index": i, "text": "x" * i}
+        for i in range(5)
+    ]
+    path = tmp_path / f"chunks{suffix}"
+    if suffix == ".json":
+        path.write_text(json.dumps(chunks, indent=2), encoding="utf-8")
+    else:
+        path.write_text("\n".join(json.dumps(c) for c in chunks), encoding="utf-8")
+    assert list(iter_chunks(path)) == chunks
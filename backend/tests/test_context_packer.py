@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import pytest
+from ai.context_packer import ContextPacker
+from models.chat import ChatContext, LatLng, MapBounds, MapState, Message
+
+
+def chunk(i, words=20):
+    return SimpleNamespace(
+        filename=f"paper_{i}.pdf",
+        confidence="HIGH",
+        relevant_layers=["groundwater_inundation"],
+        locations=["Honolulu"],
+        slr_projections=["3 ft by 2060"],
+        measurements=[],
+        key_findings={"finding": f"result {i}"},
+        text=" ".join(f"word{i}_{n}" for n in range(words)),
+    )
+
+
+def context(*contents, summary=None):
+    messages = [
+        Message(
+            id=str(i),
+            role="user" if i % 2 == 0 else "assistant",
+            content=content,
+            timestamp="2025-01-01T00:00:00",
+        )
+        for i, content in enumerate(contents)
+    ]
+    return ChatContext(session_id="s", messages=messages, summary=summary)
+
+
+@pytest.fixture(scope="module")
+def map_state():
+    return MapState(
+        active_layers=["CRC:HI_Oahu_GWI_03ft"],
+        available_layers=None,
+        foot_increment=3,
+        map_position=MapBounds(
+            southwest=LatLng(lat=21.2, lng=-158.3),
+            northeast=LatLng(lat=21.7, lng=-157.6),
+        ),
+        zoom_level=10,
+        basemap_name="light",
+        available_basemaps=["light"],
+    )
+
+
+def packer(**kwargs):
+    options = {
+        "budget": 6000,
+        "history_min_tokens": 100,
+        "history_max_tokens": 400,
+        "min_source_tokens": 60,
+    }
+    return ContextPacker("gpt-4o", **{**options, **kwargs})
+
+
+def test_everything_fits_a_large_budget(map_state):
+    chunks = [chunk(i) for i in range(3)]
+    packed = packer().pack(chunks, context("Hi", "Hello"), map_state)
+
+    assert packed.chunks == chunks
+    assert packed.truncated_chunks == 0
+    assert [f"=== SOURCE {i} ===" in packed.sources for i in (1, 2, 3)] == [True] * 3
+    assert "Locations: Honolulu" in packed.sources
+    assert "CRC:HI_Oahu_GWI_03ft" in packed.map_state
+    assert packed.history == "Chat History:\nUser: Hi\nAssistant: Hello"
+
+
+def test_sources_are_truncated_then_dropped_to_fit(map_state):
+    p = packer(budget=400)
+    chunks = [chunk(i, words=400) for i in range(3)]
+    packed = p.pack(chunks, context("What about Waikiki?"), map_state)
+
+    assert packed.chunks == chunks[:1]
+    assert packed.truncated_chunks == 1
+    assert packed.sources.rstrip().endswith("-" * 80)
+    # Compact sources keep the core metadata only
+    assert "Locations:" not in packed.sources
+    assert "…" in packed.sources
+    budget = p.budget - packed.tokens["map_state"] - p.history_min_tokens
+    assert packed.tokens["sources"] <= budget
+    # The history reserve keeps the question in the prompt
+    assert "What about Waikiki?" in packed.history
+
+
+def test_history_keeps_the_newest_messages():
+    p = packer()
+    old, new = "old " * 300, "the latest question"
+    history = p.pack_history(context(old, new), budget=50)
+    assert history.endswith(f"Assistant: {new}")
+    assert old.strip() not in history
+    assert p.counter.count(history) <= 60
+
+
+def test_summary_comes_before_recent_messages():
+    history = packer().pack_history(
+        context("Next question", summary="They asked about Waikiki."), budget=200
+    )
+    assert history.splitlines() == [
+        "Chat History:",
+        "Summary of earlier conversation: They asked about Waikiki.",
+        "User: Next question",
+    ]
+
+
+def test_empty_history():
+    assert packer().pack_history(context(), budget=200) == "Chat History: (none)"
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import numpy as np
+from ai.diversify import Diversifier, mmr_select
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_mmr_prefers_a_diverse_second_pick():
+    embeddings = np.vstack([unit(1, 0), unit(0.99, 0.14), unit(0, 1)])
+    relevance = np.array([0.9, 0.89, 0.8])
+
+    selected, duplicates = mmr_select(
+        embeddings, relevance, k=2, lambda_mult=0.5, dedup_threshold=None
+    )
+    assert selected == [0, 2]
+    assert duplicates == 0
+
+    by_relevance, _ = mmr_select(
+        embeddings, relevance, k=2, lambda_mult=1.0, dedup_threshold=None
+    )
+    assert by_relevance == [0, 1]
+
+
+def test_mmr_drops_near_copies():
+    embeddings = np.vstack([unit(1, 0), unit(1, 0.01), unit(0, 1)])
+    selected, duplicates = mmr_select(
+        embeddings, np.array([0.9, 0.9, 0.1]), k=3, lambda_mult=1.0
+    )
+    assert selected == [0, 2]
+    assert duplicates == 1
+
+
+def test_mmr_caps_selections_per_group():
+    embeddings = np.eye(4, dtype=np.float32)
+    selected, _ = mmr_select(
+        embeddings,
+        np.array([0.9, 0.8, 0.7, 0.1]),
+        k=3,
+        lambda_mult=1.0,
+        groups=np.array([0, 0, 0, 1]),
+        max_per_group=2,
+    )
+    assert selected == [0, 1, 3]
+
+
+def test_mmr_handles_empty_input_and_zero_vectors():
+    assert mmr_select(np.empty((0, 3)), np.empty(0), k=5) == ([], 0)
+    selected, _ = mmr_select(np.zeros((2, 3)), np.array([0.2, 0.4]), k=5)
+    assert sorted(selected) == [0, 1]
+
+
+def chunk(name, embedding, similarity, filename="paper.pdf"):
+    return SimpleNamespace(
+        name=name,
+        embedding=None if embedding is None else np.asarray(embedding, np.float32),
+        similarity_score=similarity,
+        fusion_score=None,
+        filename=filename,
+    )
+
+
+def diversifier(**kwargs):
+    options = {
+        "enabled": True,
+        "lambda_mult": 1.0,
+        "dedup_threshold": 0.95,
+        "max_per_file": 0,
+        "candidate_factor": 3,
+    }
+    return Diversifier(**{**options, **kwargs})
+
+
+def names(chunks):
+    return [chunk.name for chunk in chunks]
+
+
+def test_select_caps_chunks_per_file():
+    chunks = [
+        chunk("a1", unit(1, 0, 0), 0.9, "a.pdf"),
+        chunk("a2", unit(0, 1, 0), 0.8, "a.pdf"),
+        chunk("b1", unit(0, 0, 1), 0.7, "b.pdf"),
+    ]
+    assert names(diversifier(max_per_file=1).select(chunks, 2)) == ["a1", "b1"]
+
+
+def test_select_appends_chunks_without_embedding_up_to_top_k():
+    chunks = [
+        chunk("lexical", None, 0.0),
+        chunk("a", unit(1, 0), 0.9),
+        chunk("copy", unit(1, 0), 0.9),
+        chunk("b", unit(0, 1), 0.5),
+    ]
+    div = diversifier()
+    assert names(div.select(chunks, 4)) == ["a", "b", "lexical"]
+    assert names(div.select(chunks, 2)) == ["a", "b"]
+    assert div.stats()["duplicates_removed"] == 2
+
+
+def test_select_returns_top_k_unchanged_when_disabled():
+    chunks = [chunk(str(i), unit(1, i), 1 - i / 10) for i in range(5)]
+    div = diversifier(enabled=False)
+    assert names(div.select(chunks, 3)) == ["0", "1", "2"]
+    assert div.candidate_count(3) == 3
+    assert diversifier().candidate_count(3) == 9
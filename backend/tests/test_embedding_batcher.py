@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+from ai.embedding_batcher import EmbeddingBatcher
+
+
+class FakeEmbeddings:
+    """embeddings.create returning [len(text), index in the call] per input"""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def create(self, input, model):
+        self.calls.append(list(input))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("API down")
+        data = [
+            SimpleNamespace(index=i, embedding=[float(len(text)), float(i)])
+            for i, text in enumerate(input)
+        ]
+        # The API doesn't promise input order
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+def batcher(embeddings, **kwargs):
+    client = SimpleNamespace(embeddings=embeddings)
+    return EmbeddingBatcher(client, "text-embedding-3-small", **kwargs)
+
+
+def test_concurrent_texts_share_one_call():
+    embeddings = FakeEmbeddings()
+
+    async def scenario():
+        b = batcher(embeddings, max_wait_ms=5)
+        vectors = await asyncio.gather(
+            b.embed("a"), b.embed("bbb"), b.embed("a"), b.embed("cc")
+        )
+        return b, vectors
+
+    b, vectors = asyncio.run(scenario())
+    # Duplicate texts in a window are sent once
+    assert embeddings.calls == [["a", "bbb", "cc"]]
+    assert [v.tolist() for v in vectors] == [[1, 0], [3, 1], [1, 0], [2, 2]]
+    assert b.stats()["avg_batch_size"] == 4
+
+
+def test_full_batches_are_sent_without_waiting():
+    embeddings = FakeEmbeddings()
+
+    async def scenario():
+        b = batcher(embeddings, max_batch_size=2, max_wait_ms=60_000)
+        return await asyncio.wait_for(
+            asyncio.gather(*(b.embed(str(i)) for i in range(4))), timeout=1
+        )
+
+    asyncio.run(scenario())
+    assert embeddings.calls == [["0", "1"], ["2", "3"]]
+
+
+def test_api_errors_reach_every_waiter():
+    embeddings = FakeEmbeddings(fail=True)
+
+    async def scenario():
+        b = batcher(embeddings, max_wait_ms=1)
+        results = await asyncio.gather(
+            b.embed("a"), b.embed("b"), return_exceptions=True
+        )
+        return b, results
+
+    b, results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert b.stats()["api_errors"] == 1
+
+
+def test_embed_many_keeps_input_order_across_batches():
+    embeddings = FakeEmbeddings()
+    texts = ["x" * n for n in range(1, 6)]
+
+    vectors = asyncio.run(batcher(embeddings, max_batch_size=2).embed_many(texts))
+
+    assert embeddings.calls == [texts[:2], texts[2:4], texts[4:]]
+    assert vectors.dtype == np.float32
+    assert vectors[:, 0].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_embed_many_of_nothing_makes_no_call():
+    embeddings = FakeEmbeddings()
+    assert asyncio.run(batcher(embeddings).embed_many([])).shape == (0, 0)
+    assert embeddings.calls == []
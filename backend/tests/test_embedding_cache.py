@@ -0,0 +1,99 @@
+import asyncio
+
+import numpy as np
+from ai import embedding_cache
+from ai.embedding_cache import EmbeddingCache, EmbeddingStore, cache_key
+
+MODEL = "text-embedding-3-small"
+
+
+class DictStore(EmbeddingStore):
+    def __init__(self, fail=False):
+        self.rows = {}
+        self.fail = fail
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        return self.rows.get(key)
+
+    async def put(self, key, model, embedding):
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        self.rows[key] = embedding
+
+
+class Embedder:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, text):
+        self.calls.append(text)
+        return np.full(4, len(self.calls), dtype=np.float64)
+
+
+def lookup(cache, query, embedder):
+    return asyncio.run(cache.get_or_compute(query, MODEL, embedder))
+
+
+def test_cache_key_normalizes_case_and_whitespace():
+    assert cache_key("  Groundwater  Inundation ", MODEL) == cache_key(
+        "groundwater inundation", MODEL
+    )
+    assert cache_key("groundwater", MODEL) != cache_key("groundwater", "other")
+
+
+def test_memory_hit_skips_the_embedder():
+    cache, embedder = EmbeddingCache(), Embedder()
+    first = lookup(cache, "King tides", embedder)
+    second = lookup(cache, "king  tides", embedder)
+
+    assert embedder.calls == ["King tides"]
+    assert second is first
+    assert first.dtype == np.float32
+    assert not first.flags.writeable
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, embedder = EmbeddingCache(max_entries=2), Embedder()
+    for query in ["a", "b", "a", "c"]:
+        lookup(cache, query, embedder)
+    lookup(cache, "b", embedder)
+    assert embedder.calls == ["a", "b", "c", "b"]
+
+
+def test_byte_bound_evicts_entries():
+    cache = EmbeddingCache(max_bytes=40)
+    for i in range(4):
+        cache.put_local(str(i), np.zeros(4, dtype=np.float32))
+    assert len(cache) == 2
+    assert cache.stats()["bytes"] == 32
+
+
+def test_expired_entries_are_recomputed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "monotonic", lambda: now[0])
+    cache, embedder = EmbeddingCache(ttl_seconds=60), Embedder()
+    lookup(cache, "a", embedder)
+    now[0] += 61
+    lookup(cache, "a", embedder)
+    assert embedder.calls == ["a", "a"]
+
+
+def test_store_serves_memory_misses():
+    store, embedder = DictStore(), Embedder()
+    lookup(EmbeddingCache(store=store), "a", embedder)
+
+    cache = EmbeddingCache(store=store)
+    lookup(cache, "a", embedder)
+    assert embedder.calls == ["a"]
+    assert cache.stats()["store_hits"] == 1
+    assert len(cache) == 1
+
+
+def test_store_errors_fall_back_to_the_embedder():
+    cache, embedder = EmbeddingCache(store=DictStore(fail=True)), Embedder()
+    lookup(cache, "a", embedder)
+    assert embedder.calls == ["a"]
+    assert cache.stats()["store_errors"] == 2
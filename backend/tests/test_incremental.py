@@ -0,0 +1,198 @@
+import asyncio
+import json
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from ingestion.incremental import (
+    Manifest,
+    document_rows,
+    stable_chunk_id,
+    sync_chunks,
+)
+
+
+class FakeEngine:
+    """Answers EXISTING_EMBEDDINGS_QUERY with every id it is asked about"""
+
+    @contextmanager
+    def connect(self):
+        yield SimpleNamespace(
+            execute=lambda query, params: [
+                SimpleNamespace(chunk_id=chunk_id) for chunk_id in params["ids"]
+            ]
+        )
+
+
+class FakeLoader:
+    """Records what sync_chunks asks ChunkLoader.load to apply"""
+
+    def __init__(self):
+        self.engine = FakeEngine()
+        self.calls = []
+
+    async def load(self, path, mode, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f]
+        self.calls.append({"mode": mode, "chunks": chunks, **kwargs})
+        return {"rows": len(chunks)}
+
+
+def write_chunks(path, texts, **metadata):
+    chunks = [
+        {
+            "chunk_id": f"random-{i}",
+            "chunk_index": i,
+            "text": text,
+            "metadata": {"filename": path.stem, **metadata},
+        }
+        for i, text in enumerate(texts)
+    ]
+    path.write_text("\n".join(json.dumps(c) for c in chunks), encoding="utf-8")
+    return path
+
+
+def sync(manifest, chunk_files, loader, sources=None):
+    return asyncio.run(
+        sync_chunks(
+            manifest,
+            chunk_files,
+            loader,
+            sources=chunk_files.keys() if sources is None else sources,
+        )
+    )
+
+
+def test_stable_chunk_id_depends_on_document_and_text():
+    chunk_id = stable_chunk_id("paper", "Sea level rise")
+    assert chunk_id == stable_chunk_id("paper", "Sea level rise")
+    assert chunk_id != stable_chunk_id("other", "Sea level rise")
+    assert chunk_id != stable_chunk_id("paper", "Sea level rise.")
+    assert stable_chunk_id("paper", "Sea level rise", 2) == f"{chunk_id}-2"
+    assert len(stable_chunk_id("p" * 300, "text").split(":")[0]) == 200
+
+
+def test_document_rows_numbers_repeated_texts(tmp_path):
+    path = write_chunks(tmp_path / "paper.jsonl", ["a", "b", "a"])
+    rows = document_rows("paper", path)
+
+    assert list(rows) == [
+        stable_chunk_id("paper", "a"),
+        stable_chunk_id("paper", "b"),
+        stable_chunk_id("paper", "a", 1),
+    ]
+    chunks = [chunk for _, chunk in rows.values()]
+    assert [chunk["chunk_index"] for chunk in chunks] == [0, 1, 2]
+    assert all(chunk["chunk_id"] in rows for chunk in chunks)
+
+
+def test_document_rows_hash_covers_metadata_but_not_embedding(tmp_path):
+    path = write_chunks(tmp_path / "paper.jsonl", ["a"], confidence="HIGH")
+    [(row_hash, chunk)] = document_rows("paper", path).values()
+
+    with_embedding = json.loads(path.read_text(encoding="utf-8"))
+    with_embedding["embedding"] = [0.1, 0.2]
+    path.write_text(json.dumps(with_embedding), encoding="utf-8")
+    [(same_hash, same_chunk)] = document_rows("paper", path).values()
+    assert same_hash == row_hash
+    assert "embedding" not in same_chunk
+
+    write_chunks(path, ["a"], confidence="LOW")
+    [(changed_hash, changed)] = document_rows("paper", path).values()
+    assert changed_hash != row_hash
+    assert changed["chunk_id"] == chunk["chunk_id"]
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return Manifest(tmp_path / "manifest.json")
+
+
+def test_first_sync_replaces_everything(tmp_path, manifest):
+    loader = FakeLoader()
+    files = {
+        "a": write_chunks(tmp_path / "a.jsonl", ["a1", "a2"]),
+        "b": write_chunks(tmp_path / "b.jsonl", ["b1"]),
+    }
+    stats = sync(manifest, files, loader)
+
+    assert stats["mode"] == "replace"
+    assert stats["upserted"] == 3
+    [call] = loader.calls
+    assert call["mode"] == "replace"
+    assert call["delete_chunk_ids"] is None
+    assert manifest.synced
+    assert Manifest(manifest.path).documents["a"]["chunks_hash"]
+
+
+def test_unchanged_chunk_files_are_not_loaded(tmp_path, manifest):
+    loader = FakeLoader()
+    files = {"a": write_chunks(tmp_path / "a.jsonl", ["a1", "a2"])}
+    sync(manifest, files, loader)
+    stats = sync(manifest, files, loader)
+
+    assert len(loader.calls) == 1
+    assert stats["documents_changed"] == 0
+    assert stats["upserted"] == stats["deleted"] == 0
+
+
+def test_changed_document_upserts_and_deletes_by_chunk_id(tmp_path, manifest):
+    loader = FakeLoader()
+    files = {"a": write_chunks(tmp_path / "a.jsonl", ["kept", "edited", "dropped"])}
+    sync(manifest, files, loader)
+    write_chunks(files["a"], ["kept", "edited!", "added"])
+    stats = sync(manifest, files, loader)
+
+    call = loader.calls[-1]
+    assert call["mode"] == "upsert"
+    # "kept" has the same text and position, so only the new texts are loaded
+    assert [chunk["text"] for chunk in call["chunks"]] == ["edited!", "added"]
+    assert sorted(call["delete_chunk_ids"]) == sorted(
+        [stable_chunk_id("a", "edited"), stable_chunk_id("a", "dropped")]
+    )
+    assert stats["embeddings_reused"] == 0
+    assert set(manifest.documents["a"]["chunks"]) == {
+        stable_chunk_id("a", text) for text in ["kept", "edited!", "added"]
+    }
+
+
+def test_metadata_change_reuses_stored_embeddings(tmp_path, manifest):
+    loader = FakeLoader()
+    files = {"a": write_chunks(tmp_path / "a.jsonl", ["a1"], confidence="HIGH")}
+    sync(manifest, files, loader)
+    write_chunks(files["a"], ["a1"], confidence="MEDIUM")
+    stats = sync(manifest, files, loader)
+
+    chunk_id = stable_chunk_id("a", "a1")
+    assert stats["embeddings_reused"] == 1
+    assert loader.calls[-1]["keep_embeddings"] == {chunk_id}
+    assert loader.calls[-1]["delete_chunk_ids"] == []
+
+
+def test_missing_chunk_file_keeps_manifest_entry_of_existing_pdf(tmp_path, manifest):
+    loader = FakeLoader()
+    files = {
+        "a": write_chunks(tmp_path / "a.jsonl", ["a1"]),
+        "b": write_chunks(tmp_path / "b.jsonl", ["b1"]),
+        "c": write_chunks(tmp_path / "c.jsonl", ["c1"]),
+    }
+    sync(manifest, files, loader)
+    manifest.documents["b"]["keys"] = {"markdown": "key"}
+
+    # b's chunk stage failed, c's PDF was deleted
+    stats = sync(manifest, {"a": files["a"]}, loader, sources={"a", "b"})
+
+    assert stats["documents_removed"] == 1
+    assert stats["documents_without_chunks"] == 1
+    assert sorted(loader.calls[-1]["delete_chunk_ids"]) == sorted(
+        [stable_chunk_id("b", "b1"), stable_chunk_id("c", "c1")]
+    )
+    saved = Manifest(manifest.path).documents
+    assert "c" not in saved
+    assert saved["b"]["keys"] == {"markdown": "key"}
+    assert saved["b"]["chunks"] == {}
+    assert "chunks_hash" not in saved["b"]
+
+    # Once the chunk file is back, b is loaded again even though it didn't change
+    sync(manifest, {"a": files["a"], "b": files["b"]}, loader, sources={"a", "b"})
+    assert [chunk["text"] for chunk in loader.calls[-1]["chunks"]] == ["b1"]
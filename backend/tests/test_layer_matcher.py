@@ -0,0 +1,85 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from ai.data_catalog import DataCatalog
+from ai.layer_matcher import LayerMatcher, normalize
+
+KEYWORDS = {
+    "groundwater_inundation": ["groundwater inundation", "groundwater"],
+    "passive_marine_flooding": ["marine flooding", "flooding"],
+    "future_erosion_hazard_zone": ["erosion"],
+}
+
+
+@pytest.fixture
+def matcher(tmp_path):
+    path = tmp_path / "documentation.json"
+    path.write_text(
+        json.dumps(
+            {
+                "groundwater_inundation": {
+                    "title": "Groundwater Inundation",
+                    "terms": ["soggy areas", "water table"],
+                },
+                "future_erosion_hazard_zone": {
+                    "title": "Future Erosion Hazard Zone",
+                    "terms": ["FEHZ"],
+                },
+            }
+        ),
+        encoding="utf-8",
+    )
+    return LayerMatcher(KEYWORDS, DataCatalog(path), match_ratio=0.5)
+
+
+def test_normalize_strips_okina_diacritics_and_punctuation():
+    assert normalize("Hawaiʻi\u2019s Kāneʻohe-Bay!") == "hawaiis kaneohe bay "
+
+
+def test_catalog_terms_are_only_hints(matcher):
+    assert matcher.match("Show me the soggy areas") == ["groundwater_inundation"]
+    assert matcher.match("Show me the soggy areas", hints=False) == []
+    assert matcher.match("Where is the FEHZ?") == ["future_erosion_hazard_zone"]
+    # Titles and keys are matched either way
+    assert matcher.match("future erosion hazard zone maps", hints=False) == [
+        "future_erosion_hazard_zone"
+    ]
+
+
+def test_longest_phrase_wins_and_plurals_match(matcher):
+    scores = matcher.score("Groundwater inundation and floodings")
+    assert scores == {"groundwater_inundation": 2.0, "passive_marine_flooding": 1.0}
+    assert matcher.score("groundwaters") == {"groundwater_inundation": 1.0}
+    assert matcher.score("floodwater") == {}
+
+
+def test_layers_below_the_match_ratio_are_dropped(matcher):
+    query = "groundwater inundation raises groundwater, marine flooding and erosion"
+    assert matcher.match(query) == [
+        "groundwater_inundation",
+        "passive_marine_flooding",
+    ]
+    matcher.match_ratio = 0.1
+    assert matcher.match(query)[-1] == "future_erosion_hazard_zone"
+
+
+def test_classify_uses_the_nearest_centroids(matcher):
+    matcher.load_centroids(
+        [
+            SimpleNamespace(layer="groundwater_inundation", centroid="[1,0,0]"),
+            SimpleNamespace(layer="passive_marine_flooding", centroid=[0.99, 0.1, 0]),
+            SimpleNamespace(layer="future_erosion_hazard_zone", centroid=[0, 0, 1]),
+            SimpleNamespace(layer="empty", centroid=[0, 0, 0]),
+        ]
+    )
+    assert matcher.stats()["centroids"] == 3
+    assert matcher.classify(np.array([2.0, 0, 0])) == [
+        "groundwater_inundation",
+        "passive_marine_flooding",
+    ]
+    assert matcher.classify([0, 0.2, 1]) == ["future_erosion_hazard_zone"]
+    # Too far from every centroid
+    assert matcher.classify([0, 1, 0]) == []
+    assert matcher.classify([0, 0, 0]) == []
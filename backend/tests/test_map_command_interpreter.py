@@ -0,0 +1,103 @@
+import pytest
+from ai.data_catalog import get_data_catalog
+from ai.map_command_interpreter import LOCATIONS, MapCommandInterpreter
+from models.chat import AvailableLayers, LatLng, MapBounds, MapState
+
+
+@pytest.fixture(scope="module")
+def interpreter():
+    return MapCommandInterpreter()
+
+
+def map_state(active_layers=None, foot_increment=0):
+    catalog = get_data_catalog()
+    increment = [
+        name
+        for layer in catalog.layers.values()
+        for name in layer.scenario_layers.values()
+    ]
+    return MapState(
+        active_layers=active_layers or [],
+        available_layers=AvailableLayers(normal=[], increment=increment),
+        foot_increment=foot_increment,
+        map_position=MapBounds(
+            southwest=LatLng(lat=21.2, lng=-158.3),
+            northeast=LatLng(lat=21.7, lng=-157.6),
+        ),
+        zoom_level=10,
+        basemap_name="light",
+        available_basemaps=["light", "satellite", "hybrid"],
+    )
+
+
+def action_types(response):
+    return [action["type"] for action in response.map_actions]
+
+
+def test_show_layer_at_foot_increment(interpreter):
+    response = interpreter.interpret("show groundwater inundation at 3 ft", map_state())
+    assert action_types(response) == ["set_foot_increment", "add_layer"]
+    assert response.map_actions[1]["parameters"]["layer_name"] == "CRC:HI_Oahu_GWI_03ft"
+
+
+def test_zoom_to_location(interpreter):
+    response = interpreter.interpret("zoom to Waikiki", map_state())
+    assert action_types(response) == ["set_bounds"]
+    assert (
+        response.map_actions[0]["parameters"]["bounds"]["southwest"]
+        == LOCATIONS["waikiki"][0]
+    )
+
+
+def test_clear_all_layers(interpreter):
+    response = interpreter.interpret(
+        "clear all layers", map_state(active_layers=["CRC:HI_Oahu_GWI_00ft"])
+    )
+    assert action_types(response) == ["clear_layers"]
+
+
+def test_clear_named_layer_only_removes_it(interpreter):
+    state = map_state(
+        active_layers=["CRC:HI_Oahu_GWI_00ft", "CRC:HI_State_80prob_00ft_SCI"]
+    )
+    response = interpreter.interpret("clear the groundwater layer", state)
+    assert action_types(response) == ["remove_layer"]
+    assert response.map_actions[0]["parameters"]["layer_name"] == "CRC:HI_Oahu_GWI_00ft"
+
+
+def test_clear_then_add_layer(interpreter):
+    response = interpreter.interpret(
+        "clear the map and show groundwater inundation", map_state()
+    )
+    assert action_types(response) == ["clear_layers", "add_layer"]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "hide waikiki",
+        "remove kailua",
+        "add 2040 intermediate high",
+        "show 3 ft",
+        "clear all layers and hide the groundwater layer",
+    ],
+)
+def test_verb_without_layer_falls_through(interpreter, query):
+    assert (
+        interpreter.interpret(query, map_state(active_layers=["CRC:HI_Oahu_GWI_00ft"]))
+        is None
+    )
+
+
+def test_remove_inactive_layer_falls_through(interpreter):
+    assert interpreter.interpret("hide groundwater inundation", map_state()) is None
+
+
+def test_question_falls_through(interpreter):
+    assert interpreter.interpret("what is groundwater inundation?", map_state()) is None
+
+
+def test_year_without_verb_sets_foot_increment(interpreter):
+    response = interpreter.interpret("2040 intermediate high", map_state())
+    assert action_types(response) == ["set_foot_increment"]
+    assert response.map_actions[0]["parameters"]["foot_increment"] == 1
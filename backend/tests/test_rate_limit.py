@@ -0,0 +1,62 @@
+import pytest
+from ingestion import rate_limit
+from ingestion.rate_limit import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_starts_full(clock):
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+
+def test_bucket_refills_at_the_per_minute_rate(clock):
+    bucket = TokenBucket(per_minute=120)
+    bucket.take(120)
+    clock.now += 15
+    assert bucket.wait_time(30) == 0
+    assert bucket.wait_time(40) == pytest.approx(5.0)
+
+
+def test_bucket_level_is_capped_at_capacity(clock):
+    bucket = TokenBucket(per_minute=60, capacity=10)
+    clock.now += 3600
+    assert bucket.wait_time(10) == 0
+    bucket.take(10)
+    assert bucket.wait_time(10) == pytest.approx(10.0)
+
+
+def test_amounts_above_capacity_wait_for_a_full_bucket(clock):
+    bucket = TokenBucket(per_minute=60, capacity=10)
+    bucket.take(5)
+    assert bucket.wait_time(100) == pytest.approx(5.0)
+
+
+def test_overdraft_delays_later_callers(clock):
+    bucket = TokenBucket(per_minute=60, capacity=10)
+    bucket.take(25)
+    assert bucket.level == -15
+    assert bucket.wait_time(1) == pytest.approx(16.0)
+
+
+def test_drain_to_only_lowers_the_level(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.drain_to(20)
+    assert bucket.level == 20
+    bucket.drain_to(50)
+    assert bucket.level == 20
@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+import pytest
+from ai.response_cache import SemanticResponseCache
+from models.chat import RAGMetadata, RAGResponse
+
+
+def response(text):
+    return RAGResponse(
+        response=text,
+        sources=[],
+        metadata=RAGMetadata(
+            chunks_retrieved=0,
+            model="gpt-4o",
+            embedding_model="text-embedding-3-small",
+            query=text,
+            filters={},
+            auto_detected_layers=None,
+        ),
+    )
+
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_similar_query_in_the_same_scope_hits():
+    cache = SemanticResponseCache(threshold=0.95)
+    answer = response("Groundwater rises with the sea")
+    cache.put(vector(1, 0, 0), "scope", answer)
+
+    assert cache.lookup(vector(0.99, 0.05, 0), "scope") is answer
+    assert cache.lookup(vector(0.7, 0.7, 0), "scope") is None
+    assert cache.lookup(vector(1, 0, 0), "other scope") is None
+    assert cache.stats()["hit_rate"] == pytest.approx(1 / 3, abs=1e-4)
+
+
+def test_least_recently_used_slot_is_replaced():
+    cache = SemanticResponseCache(max_entries=2)
+    cache.put(vector(1, 0), "a", response("a"))
+    cache.put(vector(0, 1), "b", response("b"))
+    cache.lookup(vector(1, 0), "a")
+    cache.put(vector(1, 1), "c", response("c"))
+
+    assert cache.lookup(vector(1, 0), "a") is not None
+    assert cache.lookup(vector(0, 1), "b") is None
+    assert len(cache) == 2
+
+
+def test_scope_is_dropped_with_its_last_slot():
+    cache = SemanticResponseCache(max_entries=2)
+    for i in range(10):
+        cache.put(vector(1, i), f"scope {i}", response(str(i)))
+    assert cache.stats()["scopes"] == 2
+    assert cache.lookup(vector(1, 9), "scope 9") is not None
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("ai.response_cache.time.monotonic", lambda: now[0])
+    cache = SemanticResponseCache(ttl_seconds=60)
+    cache.put(vector(1, 0), "scope", response("a"))
+    now[0] += 61
+    assert cache.lookup(vector(1, 0), "scope") is None
+
+
+def test_put_from_before_an_invalidation_is_rejected():
+    cache = SemanticResponseCache()
+    generation = cache.generation
+    cache.invalidate()
+    cache.put(vector(1, 0), "scope", response("stale"), generation=generation)
+
+    assert len(cache) == 0
+    assert cache.stats()["stale_puts"] == 1
+    cache.put(vector(1, 0), "scope", response("fresh"), generation=cache.generation)
+    assert cache.lookup(vector(1, 0), "scope").response == "fresh"
+
+
+def test_corpus_version_change_clears_the_cache():
+    versions = iter([1, 1, 2])
+
+    async def version_source():
+        return next(versions)
+
+    async def scenario():
+        cache = SemanticResponseCache(
+            version_source=version_source, version_check_interval=0
+        )
+        await cache.ensure_fresh()
+        cache.put(vector(1, 0), "scope", response("a"))
+        await cache.ensure_fresh()
+        kept = len(cache)
+        await cache.ensure_fresh()
+        return cache, kept
+
+    cache, kept = asyncio.run(scenario())
+    assert kept == 1
+    assert len(cache) == 0
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["scopes"] == 0
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from ai.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        runs = 0
+
+        async def work():
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.01)
+            return runs
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return flight, runs, results
+
+    flight, runs, results = asyncio.run(scenario())
+    assert runs == 1
+    assert results == [1] * 5
+    assert flight.stats()["deduplicated"] == 4
+    assert flight.in_flight == 0
+
+
+def test_different_keys_and_later_calls_run_again():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work(key):
+            calls.append(key)
+            await asyncio.sleep(0)
+            return key
+
+        await asyncio.gather(
+            flight.do("a", lambda: work("a")), flight.do("b", lambda: work("b"))
+        )
+        await flight.do("a", lambda: work("a"))
+        return calls
+
+    assert asyncio.run(scenario()) == ["a", "b", "a"]
+
+
+def test_exceptions_are_shared_and_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+        attempts = 0
+
+        async def failing():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flight.do("key", failing),
+            flight.do("key", failing),
+            return_exceptions=True,
+        )
+        with pytest.raises(RuntimeError):
+            await flight.do("key", failing)
+        return attempts, results
+
+    attempts, results = asyncio.run(scenario())
+    assert attempts == 2
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_work():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        return first, await second
+
+    first, result = asyncio.run(scenario())
+    assert first.cancelled()
+    assert result == "done"
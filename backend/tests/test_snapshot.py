@@ -0,0 +1,170 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+from ingestion.chunks import CHUNK_COLUMNS
+from ingestion.snapshot import (
+    PGCOPY_HEADER,
+    PGCOPY_TRAILER,
+    _array_encoder,
+    _EmbeddingSink,
+    _scalar_encoder,
+    encode_copy,
+)
+
+VARCHAR_OID = 1043
+
+COLUMN_TYPES = {
+    "chunk_id": "varchar",
+    "chunk_index": "int4",
+    "text": "text",
+    "filename": "varchar",
+    "source_file": "varchar",
+    "relevant": "int4",
+    "confidence": "varchar",
+    "reasoning": "text",
+    "key_findings": "json",
+}
+ARRAY_COLUMNS = (
+    "relevant_layers",
+    "locations",
+    "slr_projections",
+    "measurements",
+    "timeframes",
+)
+
+
+@pytest.fixture
+def encoders():
+    return {
+        **{
+            column: _scalar_encoder(typname) for column, typname in COLUMN_TYPES.items()
+        },
+        **{column: _array_encoder("varchar", VARCHAR_OID) for column in ARRAY_COLUMNS},
+    }
+
+
+def metadata_row(i, has_embedding=True):
+    return {
+        "chunk_id": f"paper:{i}",
+        "chunk_index": i,
+        "text": f"Chunk {i} about Hawaiʻi",
+        "filename": "paper.pdf",
+        "source_file": None,
+        "relevant": 1,
+        "confidence": "HIGH",
+        "relevant_layers": ["groundwater_inundation"],
+        "reasoning": None,
+        "key_findings": {"rise": f"{i} ft"},
+        "locations": ["Honolulu", None],
+        "slr_projections": [],
+        "measurements": ["0.3 m"],
+        "timeframes": ["2050"],
+        "has_embedding": has_embedding,
+    }
+
+
+def read_tuples(data):
+    """Field values (bytes, None for NULL) of each tuple of a binary COPY stream"""
+    assert data.startswith(PGCOPY_HEADER)
+    assert data.endswith(PGCOPY_TRAILER)
+    pos, tuples = len(PGCOPY_HEADER), []
+    while True:
+        (count,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if count == -1:
+            break
+        fields = []
+        for _ in range(count):
+            (length,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            if length == -1:
+                fields.append(None)
+                continue
+            fields.append(data[pos : pos + length])
+            pos += length
+        tuples.append(dict(zip(CHUNK_COLUMNS, fields, strict=True)))
+    assert pos == len(data)
+    return tuples
+
+
+def read_text_array(data):
+    ndim, has_null, element_oid = struct.unpack_from(">iii", data)
+    if ndim == 0:
+        return []
+    assert element_oid == VARCHAR_OID
+    (length, _) = struct.unpack_from(">ii", data, 12)
+    pos, items = 20, []
+    for _ in range(length):
+        (size,) = struct.unpack_from(">i", data, pos)
+        pos += 4
+        if size == -1:
+            items.append(None)
+            continue
+        items.append(data[pos : pos + size].decode("utf-8"))
+        pos += size
+    assert bool(has_null) == (None in items)
+    return items
+
+
+def embedding_stream(tuples):
+    """A single-column binary COPY of the embeddings, like EXPORT_EMBEDDINGS_SQL's"""
+    parts = [PGCOPY_HEADER]
+    for fields in tuples:
+        value = fields["embedding"]
+        parts.append(struct.pack(">h", 1))
+        parts.append(struct.pack(">i", -1 if value is None else len(value)))
+        parts.append(value or b"")
+    parts.append(PGCOPY_TRAILER)
+    return b"".join(parts)
+
+
+def test_encode_copy_encodes_metadata_columns(encoders):
+    rows = [metadata_row(i) for i in range(3)]
+    vectors = np.zeros((3, 4), dtype=np.float32)
+    tuples = read_tuples(encode_copy(rows, vectors, encoders))
+
+    assert len(tuples) == 3
+    for row, fields in zip(rows, tuples, strict=True):
+        assert fields["chunk_id"].decode() == row["chunk_id"]
+        assert struct.unpack(">i", fields["chunk_index"])[0] == row["chunk_index"]
+        assert fields["text"].decode() == row["text"]
+        assert fields["source_file"] is None
+        assert json.loads(fields["key_findings"]) == row["key_findings"]
+        for column in ARRAY_COLUMNS:
+            assert read_text_array(fields[column]) == row[column]
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+@pytest.mark.parametrize("piece", [1, 7, 1 << 20])
+def test_encode_copy_embeddings_round_trip_through_sink(encoders, dtype, piece):
+    vectors = np.random.default_rng(1).standard_normal((5, 6)).astype(dtype)
+    rows = [metadata_row(i, has_embedding=i != 2) for i in range(5)]
+    stream = embedding_stream(read_tuples(encode_copy(rows, vectors, encoders)))
+
+    out = np.full((5, 6), np.nan, dtype=np.float32)
+    out[2] = 0
+    sink = _EmbeddingSink(out)
+    # COPY TO STDOUT hands the data over in arbitrary pieces
+    for start in range(0, len(stream), piece):
+        sink.write(stream[start : start + piece])
+
+    assert sink.done
+    assert sink.rows == 5
+    expected = vectors.astype(np.float32)
+    expected[2] = 0
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_sink_rejects_wrong_dimensions(encoders):
+    stream = embedding_stream(
+        read_tuples(encode_copy([metadata_row(0)], np.ones((1, 3)), encoders))
+    )
+    with pytest.raises(ValueError, match="3 dimensions, expected 4"):
+        _EmbeddingSink(np.zeros((1, 4), dtype=np.float32)).write(stream)
+
+
+def test_sink_rejects_text_copy():
+    with pytest.raises(ValueError, match="Not a binary COPY stream"):
+        _EmbeddingSink(np.zeros((1, 4), dtype=np.float32)).write(b"x" * 32)
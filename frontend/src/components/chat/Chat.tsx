@@ -52,6 +52,7 @@ const Chat = ({ activeLayers, toggleLayer, mapPosition, zoomLevel, setMapPositio
     }
   ])
   const [inputMessage, setInputMessage] = useState('')
+  const [sessionId, setSessionId] = useState<string | null>(null)
   
   // Add refs for scrolling
   const messagesEndRef = useRef<HTMLDivElement>(null)
@@ -128,9 +129,12 @@ const Chat = ({ activeLayers, toggleLayer, mapPosition, zoomLevel, setMapPositio
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ query: inputMessage, map_state: mapState })
+      body: JSON.stringify({ query: inputMessage, map_state: mapState, session_id: sessionId })
     })
     const data = await response.json()
+    if (data.session_id) {
+      setSessionId(data.session_id)
+    }
 
     handleMapActions(data.map_actions);
 
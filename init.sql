@@ -38,11 +38,15 @@ CREATE TABLE IF NOT EXISTS public.document_chunks (
     chunk_id VARCHAR(255) UNIQUE NOT NULL,
     chunk_index INTEGER NOT NULL,
     text TEXT NOT NULL,
+    text_search tsvector GENERATED ALWAYS AS (to_tsvector('english', translate(text, 'ʻ''', ''))) STORED,
     embedding vector(1536),
     filename VARCHAR(500) NOT NULL,
     source_file VARCHAR(500),
     relevant INTEGER DEFAULT 1,
     confidence VARCHAR(50),
+    confidence_rank SMALLINT GENERATED ALWAYS AS (
+        CASE confidence WHEN 'HIGH' THEN 3 WHEN 'MEDIUM' THEN 2 WHEN 'LOW' THEN 1 ELSE 0 END
+    ) STORED,
     relevant_layers TEXT[],
     reasoning TEXT,
     key_findings JSONB,
@@ -55,5 +59,58 @@ CREATE TABLE IF NOT EXISTS public.document_chunks (
 CREATE INDEX ON document_chunks (chunk_id);
 CREATE INDEX ON document_chunks (filename);
 CREATE INDEX ON document_chunks (confidence);
+CREATE INDEX document_chunks_confidence_rank_idx ON document_chunks (confidence_rank);
 CREATE INDEX ON document_chunks USING gin (relevant_layers);
-CREATE INDEX ON document_chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+CREATE INDEX document_chunks_text_search_idx ON document_chunks USING gin (text_search);
+-- HNSW can be built on an empty table; switch type or rebuild with python -m ai.vector_index
+CREATE INDEX document_chunks_embedding_idx ON document_chunks USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Persistent tier of the query embedding cache, shared by all API workers
+CREATE TABLE IF NOT EXISTS public.query_embedding_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    embedding BYTEA NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_used TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS ix_query_embedding_cache_last_used ON query_embedding_cache (last_used);
+
+-- Corpus version, bumped by every write to document_chunks so caches can invalidate
+CREATE TABLE IF NOT EXISTS public.corpus_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+INSERT INTO corpus_version (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_corpus_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE corpus_version SET version = version + 1, updated_at = NOW() WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS document_chunks_version ON document_chunks;
+CREATE TRIGGER document_chunks_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON document_chunks
+FOR EACH STATEMENT EXECUTE FUNCTION bump_corpus_version();
+
+-- Chat sessions (CONTEXT_STORE=sql), shared by all API workers
+CREATE TABLE IF NOT EXISTS public.chat_sessions (
+    session_id VARCHAR(64) PRIMARY KEY,
+    summary TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    last_active TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_chat_sessions_last_active ON chat_sessions (last_active);
+
+CREATE TABLE IF NOT EXISTS public.chat_messages (
+    id BIGSERIAL PRIMARY KEY,
+    session_id VARCHAR(64) NOT NULL REFERENCES chat_sessions (session_id) ON DELETE CASCADE,
+    message_id VARCHAR(64) NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    content TEXT NOT NULL,
+    timestamp VARCHAR(64) NOT NULL,
+    UNIQUE (session_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS ix_chat_messages_session_id ON chat_messages (session_id);